@@ -0,0 +1,228 @@
+r'''
+Blocked GNU zip format
+======================
+
+.. currentmodule:: micronota.bgzf
+
+This module (:mod:`micronota.bgzf`) reads and writes BGZF files, the
+blocked gzip format used by samtools and tabix. A BGZF file is a series
+of gzip members of at most 64 KB of uncompressed data each, so it can
+be decompressed by any gzip reader while a position in it can be
+addressed with a virtual offset::
+
+    virtual offset = compressed offset of the block << 16 | offset in the block
+
+and be read directly by decompressing only the block there.
+'''
+
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, micronota development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import struct
+import zlib
+
+
+# the maximal uncompressed size of a block; same as htslib
+_BLOCK_SIZE = 0xff00
+# the maximal compressed size of a block (BSIZE is uint16)
+_MAX_BLOCK = 0x10000
+# gzip header with the "BC" extra subfield; it is followed by BSIZE
+_HEADER = b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00'
+_HEADER_SIZE = len(_HEADER) + 2
+# the empty block marking the end of the file
+_EOF = bytes.fromhex('1f8b08040000000000ff0600424302001b0003000000000000000000')
+
+
+def make_voffset(coffset, uoffset):
+    '''Return the virtual offset of a position in a BGZF file.
+
+    Examples
+    --------
+    >>> make_voffset(100, 3)
+    6553603
+    >>> split_voffset(6553603)
+    (100, 3)
+    '''
+    return (coffset << 16) | uoffset
+
+
+def split_voffset(voffset):
+    '''Return the block offset and the offset in the block.'''
+    return voffset >> 16, voffset & 0xffff
+
+
+def _compress_block(data, level):
+    c = zlib.compressobj(level, zlib.DEFLATED, -15)
+    cdata = c.compress(data) + c.flush()
+    return b''.join([_HEADER,
+                     struct.pack('<H', len(cdata) + _HEADER_SIZE + 8 - 1),
+                     cdata,
+                     struct.pack('<II', zlib.crc32(data), len(data))])
+
+
+class BgzfWriter:
+    '''Write a BGZF file.
+
+    Parameters
+    ----------
+    fp : str
+        output file path
+    level : int
+        compression level
+
+    Examples
+    --------
+    >>> import gzip, tempfile, os
+    >>> fp = os.path.join(tempfile.mkdtemp(), 'a.gz')
+    >>> with BgzfWriter(fp) as f:
+    ...     f.write(b'a\\n')
+    ...     v = f.tell()
+    ...     f.write(b'b\\n')
+    >>> with gzip.open(fp) as f:
+    ...     f.read()
+    b'a\\nb\\n'
+    >>> with BgzfReader(fp) as f:
+    ...     f.seek(v)
+    ...     f.readline()
+    b'b\\n'
+    '''
+    def __init__(self, fp, level=6):
+        self._fh = open(fp, 'wb')
+        self._level = level
+        self._buf = bytearray()
+        # the compressed offset of the block being filled
+        self._coffset = 0
+
+    def tell(self):
+        '''Return the virtual offset of the next byte to write.'''
+        return make_voffset(self._coffset, len(self._buf))
+
+    def write(self, data):
+        self._buf += data
+        while len(self._buf) >= _BLOCK_SIZE:
+            self._flush_block()
+
+    def _flush_block(self):
+        size = min(len(self._buf), _BLOCK_SIZE)
+        while True:
+            block = _compress_block(bytes(self._buf[:size]), self._level)
+            if len(block) <= _MAX_BLOCK:
+                break
+            # incompressible data can grow; put less into the block
+            size -= 1024
+        self._fh.write(block)
+        self._coffset += len(block)
+        del self._buf[:size]
+
+    def flush(self):
+        while self._buf:
+            self._flush_block()
+
+    def close(self):
+        if self._fh.closed:
+            return
+        self.flush()
+        self._fh.write(_EOF)
+        self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class BgzfReader:
+    '''Read a BGZF file by virtual offsets.
+
+    Only the blocks read are decompressed.
+
+    Parameters
+    ----------
+    fp : str
+        input file path
+    '''
+    def __init__(self, fp):
+        self._fh = open(fp, 'rb')
+        self._block = b''
+        self._coffset = None
+        # the compressed offset of the next block
+        self._next = 0
+        self._pos = 0
+
+    def _load(self, coffset):
+        self._fh.seek(coffset)
+        header = self._fh.read(_HEADER_SIZE)
+        if not header:
+            # end of file
+            self._block = b''
+            self._coffset = self._next = coffset
+            self._pos = 0
+            return
+        if len(header) < _HEADER_SIZE or header[:4] != _HEADER[:4] or header[12:14] != b'BC':
+            raise ValueError('Not a BGZF block at offset %d.' % coffset)
+        bsize, = struct.unpack('<H', header[16:18])
+        data = self._fh.read(bsize + 1 - _HEADER_SIZE)
+        self._block = zlib.decompress(data[:-8], -15)
+        self._coffset = coffset
+        self._next = coffset + bsize + 1
+        self._pos = 0
+
+    def seek(self, voffset):
+        coffset, uoffset = split_voffset(voffset)
+        if coffset != self._coffset:
+            self._load(coffset)
+        self._pos = uoffset
+
+    def tell(self):
+        '''Return the virtual offset of the next byte to read.'''
+        if self._pos >= len(self._block) and self._coffset is not None:
+            return make_voffset(self._next, 0)
+        return make_voffset(self._coffset or 0, self._pos)
+
+    def readline(self):
+        '''Return the next line (with the line break) or ``b''`` at the end.'''
+        if self._coffset is None:
+            self._load(0)
+        parts = []
+        while True:
+            if self._pos >= len(self._block):
+                if self._next == self._coffset:
+                    break
+                self._load(self._next)
+                continue
+            i = self._block.find(b'\n', self._pos)
+            if i == -1:
+                parts.append(self._block[self._pos:])
+                self._pos = len(self._block)
+            else:
+                parts.append(self._block[self._pos:i + 1])
+                self._pos = i + 1
+                break
+        return b''.join(parts)
+
+    def read(self):
+        '''Return the rest of the file.'''
+        parts = []
+        while True:
+            line = self.readline()
+            if not line:
+                return b''.join(parts)
+            parts.append(line)
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+    def close(self):
+        self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,222 @@
+r'''
+Columnar dataset
+================
+
+.. currentmodule:: micronota.columnar
+
+This module (:mod:`micronota.columnar`) writes the integrated
+annotation as a Parquet dataset for analytics over many genomes. The
+dataset has two tables, each partitioned by genome::
+
+    <out_dir>/features/genome=<genome>/part-0.parquet
+    <out_dir>/sequences/genome=<genome>/part-0.parquet
+
+The features table has one row per feature and the sequences table has
+one row per sequence with the summary stats of ``summarize``. They can
+be read with ``pyarrow.dataset``, pandas, Spark or DuckDB and only the
+columns queried are read.
+
+It requires the optional dependency pyarrow.
+'''
+
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, micronota development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from os import makedirs
+from os.path import join
+from logging import getLogger
+
+import numpy as np
+
+from .summarize import summarize
+
+
+logger = getLogger(__name__)
+
+
+# the metadata stored in their own columns of string type
+_STRING_COLUMNS = ('type', 'source', 'strand', 'product', 'ID')
+# the metadata stored in their own columns of other types
+_OTHER_COLUMNS = ('score', 'db_xref')
+# the feature types counted in the sequences table
+_TYPES = ('CDS', 'ncRNA', 'rRNA', 'tRNA', 'tandem_repeat', 'terminator', 'CRISPR')
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError('pyarrow is required to write the columnar dataset. '
+                          'Install it with "pip install pyarrow".')
+    return pa, pq
+
+
+def _schemas(pa):
+    dict_str = pa.dictionary(pa.int32(), pa.string())
+    features = pa.schema(
+        [('seq_id', dict_str),
+         ('start', pa.int64()),
+         ('end', pa.int64()),
+         ('bounds', pa.list_(pa.struct([('start', pa.int64()), ('end', pa.int64())])))] +
+        [(k, dict_str) for k in _STRING_COLUMNS[:-1]] +
+        [('ID', pa.string()),
+         ('score', pa.float64()),
+         ('db_xref', pa.list_(pa.string())),
+         ('attributes', pa.map_(pa.string(), pa.string()))])
+    sequences = pa.schema(
+        [('seq_id', pa.string()),
+         ('length', pa.int64()),
+         ('nuc_freq', pa.map_(pa.string(), pa.int64()))] +
+        [(t, pa.int64()) for t in _TYPES])
+    return features, sequences
+
+
+def _str(v):
+    if isinstance(v, (list, tuple)):
+        return ','.join(map(str, v))
+    return str(v)
+
+
+def _float(v):
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def _categorical(fs, key, convert=_str):
+    '''Return the values of the features picked from the converted categories.'''
+    codes, cat = fs.codes(key)
+    strs = np.array([convert(v) for v in cat] + [None], dtype=object)
+    return strs[codes]
+
+
+def _bounds(pa, fs):
+    n = len(fs)
+    counts = np.ones(n, dtype=np.int64)
+    irregular = fs.irregular
+    bounds = {i: fs.bounds(i) for i in irregular}
+    for i in irregular:
+        counts[i] = len(bounds[i])
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    if irregular:
+        start = np.repeat(fs.start, counts)
+        end = np.repeat(fs.end, counts)
+        for i in irregular:
+            s, e = zip(*bounds[i])
+            start[offsets[i]:offsets[i + 1]] = s
+            end[offsets[i]:offsets[i + 1]] = e
+    else:
+        start, end = fs.start, fs.end
+    regions = pa.StructArray.from_arrays([pa.array(start), pa.array(end)], ['start', 'end'])
+    return pa.ListArray.from_arrays(pa.array(offsets), regions)
+
+
+def _attributes(pa, fs):
+    '''Return the other metadata as a map array.'''
+    n = len(fs)
+    skip = set(_STRING_COLUMNS + _OTHER_COLUMNS)
+    rows, keys, items = [np.zeros(0, dtype=np.int64)], [], []
+    for k in sorted(fs.keys - skip):
+        values = _categorical(fs, k)
+        present = np.flatnonzero(values != None)  # noqa: E711
+        rows.append(present)
+        keys.append(np.full(len(present), k, dtype=object))
+        items.append(values[present])
+    rows = np.concatenate(rows)
+    # group the key value pairs by feature; keys stay sorted in each group
+    order = np.argsort(rows, kind='stable')
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=offsets[1:])
+    if keys:
+        keys = np.concatenate(keys)[order]
+        items = np.concatenate(items)[order]
+    return pa.MapArray.from_arrays(pa.array(offsets), pa.array(keys, pa.string()),
+                                   pa.array(items, pa.string()))
+
+
+def _feature_table(pa, schema, seq_id, fs):
+    n = len(fs)
+    columns = [pa.DictionaryArray.from_arrays(pa.array(np.zeros(n, dtype=np.int32)),
+                                              pa.array([seq_id], pa.string())),
+               pa.array(fs.start),
+               pa.array(fs.end),
+               _bounds(pa, fs)]
+    for k in _STRING_COLUMNS[:-1]:
+        codes, cat = fs.codes(k)
+        columns.append(pa.DictionaryArray.from_arrays(
+            pa.array(codes, mask=codes < 0),
+            pa.array([_str(v) for v in cat], pa.string())))
+    columns.append(pa.array(_categorical(fs, 'ID'), pa.string()))
+    columns.append(pa.array(_categorical(fs, 'score', _float), pa.float64()))
+    xref = _categorical(fs, 'db_xref',
+                        lambda v: [v] if isinstance(v, str) else [str(i) for i in v])
+    columns.append(pa.array(xref, pa.list_(pa.string())))
+    columns.append(_attributes(pa, fs))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def _partition(out_dir, table, genome):
+    d = join(out_dir, table, 'genome=%s' % genome)
+    makedirs(d, exist_ok=True)
+    return join(d, 'part-0.parquet')
+
+
+def write_columnar(seqs, features, out_dir, genome, batch_size=1000000):
+    '''Write the annotation of a genome to the Parquet dataset.
+
+    Parameters
+    ----------
+    seqs : Iterable of ``Sequence``
+        the sequences of the genome (or metagenome)
+    features : dict
+        seq_id as key and ``FeatureStore`` as value
+    out_dir : str
+        the root directory of the dataset shared by the genomes
+    genome : str
+        the genome name to partition the tables by
+    batch_size : int
+        the minimal number of features in each row group
+
+    Returns
+    -------
+    tuple of str
+        the files written for the features and the sequences tables
+    '''
+    pa, pq = _import_pyarrow()
+    feature_schema, seq_schema = _schemas(pa)
+    feature_fp = _partition(out_dir, 'features', genome)
+    seq_fp = _partition(out_dir, 'sequences', genome)
+    rows = []
+    with pq.ParquetWriter(feature_fp, feature_schema) as writer:
+        batch = []
+        size = 0
+        for seq in seqs:
+            seq_id = seq.metadata['id']
+            fs = features[seq_id]
+            stats = summarize(seq, ('length', 'nuc_freq') + _TYPES, fs)
+            stats[1] = sorted((str(k), int(v)) for k, v in stats[1].items())
+            rows.append([seq_id] + stats)
+            if len(fs) == 0:
+                continue
+            batch.append(_feature_table(pa, feature_schema, seq_id, fs))
+            size += len(fs)
+            if size >= batch_size:
+                writer.write_table(pa.concat_tables(batch))
+                batch = []
+                size = 0
+        if batch:
+            writer.write_table(pa.concat_tables(batch))
+    columns = list(zip(*rows)) if rows else [[] for _ in seq_schema]
+    pq.write_table(pa.Table.from_arrays([pa.array(c, f.type) for c, f in zip(columns, seq_schema)],
+                                        schema=seq_schema),
+                   seq_fp)
+    logger.info('Wrote the columnar dataset of %s to %s' % (genome, out_dir))
+    return feature_fp, seq_fp
@@ -6,12 +6,12 @@
 # The full license is in the file COPYING.txt, distributed with this software.
 # ----------------------------------------------------------------------------
 
-from os.path import join
+from shutil import copyfile
 from logging import getLogger
 
 import click
 
-from ..database.rfam import filter_models
+from ..database.rfam import CMLibrary, kingdom_subset, PRESSED
 
 
 logger = getLogger(__name__)
@@ -20,27 +20,26 @@ logger = getLogger(__name__)
 # keep this command hidden from help msg
 # this option is only available in click v7
 @click.command()
-@click.option('--operation', type=click.Choice(['bacteria', 'archaea', 'eukarya', 'default']),
+@click.option('--operation', type=click.Choice(['bacteria', 'archaea', 'eukarya', 'default', 'custom']),
               default='default', required=True,
-              help='Keep bacteria/archaea/eukarya rRNA models or filter away tRNA, tmRNA, rRNA models (default)')
-@click.argument('infile', type=click.File('r'), nargs=1)
+              help=('Keep bacteria/archaea/eukarya rRNA models, filter away tRNA, tmRNA, rRNA models (default) '
+                    'or keep the models given with --model (custom)'))
+@click.option('-m', '--model', 'models', multiple=True,
+              help='Accession or name of a model to keep for the custom operation (can be used multiple times).')
+@click.option('--press/--no-press', default=True,
+              help='Press the output with cmpress.')
+@click.argument('infile', type=click.Path(exists=True, dir_okay=False), nargs=1)
 @click.argument('outfile', type=click.Path(),  nargs=1, default='rfam_filtered.cm')
 @click.pass_context
-def cli(ctx, operation, infile, outfile):
+def cli(ctx, operation, models, press, infile, outfile):
     '''Create rfam database for micronota usage.'''
-    kingdom_models = {'bacteria': {('RF00001', '5S_rRNA'),
-                                   ('RF00177', 'SSU_rRNA_bacteria'),
-                                   ('RF02541', 'LSU_rRNA_bacteria')},
-                      'archaea': {('RF00001', '5S_rRNA'),
-                                  ('RF01959', 'SSU_rRNA_archaea'),
-                                  ('RF02540', 'LSU_rRNA_archaea')},
-                      'eukarya': {('RF00001', '5S_rRNA'),
-                                  ('RF00002', '5_8S_rRNA'),
-                                  ('RF01960', 'SSU_rRNA_eukarya'),
-                                  ('RF02543', 'LSU_rRNA_eukarya')}}
-    if operation == 'default':
-        with open(join(outfile), 'w') as out:
-            filter_models(infile, out)
+    lib = CMLibrary(infile)
+    if operation == 'custom':
+        if not models:
+            raise click.UsageError('No model is given with --model.')
+        fp = lib.subset(models, press=press)
     else:
-        with open(outfile, 'w') as out:
-            filter_models(infile, out, negate=True, models=kingdom_models[kingdom])
+        fp = kingdom_subset(lib, operation, press=press)
+    # the subset is cached next to the library; copy it to the output
+    for ext in ('',) + (PRESSED if press else ()):
+        copyfile(fp + ext, outfile + ext)
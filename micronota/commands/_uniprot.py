@@ -6,12 +6,12 @@
 # The full license is in the file COPYING.txt, distributed with this software.
 # ----------------------------------------------------------------------------
 
-import gzip
 from logging import getLogger
 
 import click
 
 from ..database.uniprot import add_metadata
+from ..compress import open_file
 
 
 logger = getLogger(__name__)
@@ -31,10 +31,7 @@ def cli(ctx, infile, outfile):
     click.echo('=======+')
     n = 0
     for fp in infile:
-        if fp.endswith('.gz'):
-            with gzip.open(fp) as f:
-                n += add_metadata(f, outfile)
-        else:
-            with open(fp) as f:
-                n += add_metadata(f, outfile)
+        # the compressed files are decompressed on multiple cores
+        with open_file(fp, 'rb') as f:
+            n += add_metadata(f, outfile)
     logger.info('Parsed %d records from %r' % (n, infile))
@@ -0,0 +1,48 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, micronota development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from os.path import exists
+
+import click
+
+from ..matrix import CountMatrix, build_matrices
+
+
+@click.command()
+@click.option('-i', '--in-file', 'in_files',
+              type=click.Path(exists=True, dir_okay=False),
+              multiple=True,
+              help='GFF3 output of a genome (can be used multiple times).')
+@click.option('--columnar',
+              type=click.Path(exists=True, file_okay=False),
+              help='Read the genomes from this columnar dataset.')
+@click.option('-o', '--out-prefix',
+              required=True,
+              help='Output prefix of the feature type (.types.npz) and function (.functions.npz) matrices.')
+@click.option('--db', 'dbs',
+              multiple=True,
+              help='Only count the cross references of this database, eg KEGG or Pfam (can be used multiple times).')
+@click.option('--append', is_flag=True,
+              help='Append the new genomes to the existing matrices.')
+@click.option('--cpus', type=int, default=1,
+              help='Number of processes to read the genomes.')
+@click.pass_context
+def cli(ctx, in_files, columnar, out_prefix, dbs, append, cpus):
+    '''Aggregate the annotation of genomes into count matrices.'''
+    if not in_files and columnar is None:
+        raise click.UsageError('No input genomes.')
+    types_fp = out_prefix + '.types.npz'
+    functions_fp = out_prefix + '.functions.npz'
+    types = functions = None
+    if append and exists(types_fp):
+        types = CountMatrix.load(types_fp)
+        functions = CountMatrix.load(functions_fp)
+    types, functions = build_matrices(
+        in_files, columnar, set(dbs) if dbs else None, cpus, types, functions)
+    types.save(types_fp)
+    functions.save(functions_fp)
@@ -46,10 +46,13 @@ from ..workflow import annotate
               help='whether to compute the quality score for the sequence/annotation')
 @click.option('--config', type=click.Path(exists=True, dir_okay=False),
               help='yaml file to config annotation workflow.')
+@click.option('--bins', type=click.Path(exists=True, dir_okay=False),
+              help='tab delimited file of contig ID and bin ID to compute '
+                   'the quality scores of each metagenome bin.')
 @click.argument('task', type=str, nargs=-1)
 @click.pass_context
 def cli(ctx, in_seq, in_fmt, min_len, out_dir, out_fmt, gcode, kingdom, mode, task,
-        cpu, force, dry_run, quality, config):
+        cpu, force, dry_run, quality, config, bins):
     '''Annotate genomic sequences.'''
     if gcode is None:
         if kingdom == 'eukarya':
@@ -60,4 +63,4 @@ def cli(ctx, in_seq, in_fmt, min_len, out_dir, out_fmt, gcode, kingdom, mode, ta
     annotate(in_seq, in_fmt, min_len,
              out_dir, out_fmt,
              gcode, kingdom, mode, task,
-             cpu, force, dry_run, quality, config)
+             cpu, force, dry_run, quality, config, bins)
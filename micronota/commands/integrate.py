@@ -12,7 +12,8 @@ import os
 from pkg_resources import resource_filename
 import yaml
 
-from ..workflow import integrate, summarize
+from ..workflow import integrate
+from ..summarize import SummaryWriter
 
 
 @click.command()
@@ -31,15 +32,24 @@ from ..workflow import integrate, summarize
 @click.option('--protein-xref', type=click.Path(exists=True, dir_okay=False),
               default=None, required=False,
               help='sqlite file that stores protein cross-ref info.')
+@click.option('--lazy', is_flag=True, default=False,
+              help='Keep heavy metadata (repeat and hairpin sequences) on disk until output.')
+@click.option('--index', is_flag=True, default=False,
+              help='Write BGZF compressed GFF3 with region and ID indexes for random access.')
+@click.option('--columnar', type=click.Path(file_okay=False), default=None,
+              help='Also write the annotation to this Parquet dataset (requires pyarrow).')
+@click.option('--cpu', type=int, default=1,
+              help='Number of processes to format the GenBank output.')
 @click.pass_context
-def cli(ctx, in_seq, out_file, annot_dir, out_fmt, protein_xref):
+def cli(ctx, in_seq, out_file, annot_dir, out_fmt, protein_xref, lazy, index, columnar, cpu):
     '''Integrate annotations into final output.
 
     Example:
     micronota -vvv integrate -i input.fna -d annot_dir -o output.gff
     micronota -vvv integrate -i input.fna -d annot_dir -o output.gff --protein-xref ~/databases/uniprot.sqlite
     '''
-    seqs = integrate(in_seq, annot_dir, protein_xref, out_file,  out_fmt)
     out_prefix = out_file.rsplit('.', 1)[0]
     with open(out_prefix + '.summary.txt', 'w') as out:
-        summarize(seqs.values(), out)
+        # the summary rows are computed from the seqs integrate reads
+        integrate(in_seq, annot_dir, protein_xref, out_file, out_fmt=out_fmt, lazy=lazy, cpus=cpu,
+                  index=index, columnar=columnar, summary=SummaryWriter(out))
@@ -0,0 +1,53 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, micronota development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import click
+
+from ..index import IndexedGFF3
+
+
+def _parse_region(region):
+    '''Parse the region string of "seq_id[:beg[-end]]" (1-based, inclusive).
+
+    Examples
+    --------
+    >>> _parse_region('seq1:1,001-2,000'), _parse_region('seq1')
+    (('seq1', 1000, 2000), ('seq1', 0, None))
+    '''
+    seq_id, _, coords = region.rpartition(':')
+    if not seq_id:
+        return region, 0, None
+    beg, _, end = coords.replace(',', '').partition('-')
+    return seq_id, int(beg) - 1, int(end) if end else None
+
+
+@click.command()
+@click.option('-i', '--in-file', type=click.Path(exists=True, dir_okay=False),
+              required=True,
+              help='Indexed GFF3 file written by "integrate --index".')
+@click.option('-r', '--region', multiple=True,
+              help='Region of "seq_id:beg-end" (1-based, inclusive) to fetch features from.')
+@click.option('--id', 'feature_id', multiple=True,
+              help='ID of the feature to fetch.')
+@click.pass_context
+def cli(ctx, in_file, region, feature_id):
+    '''Fetch features from the indexed annotation file.
+
+    Example:
+    micronota query -i output.gff3.gz -r contig_1:1000-5000
+    micronota query -i output.gff3.gz --id contig_1_3
+    '''
+    with IndexedGFF3(in_file) as gff:
+        for r in region:
+            for line in gff.fetch(*_parse_region(r)):
+                click.echo(line)
+        for i in feature_id:
+            line = gff.get(i)
+            if line is None:
+                raise click.BadParameter('feature %r is not found.' % i, param_hint='--id')
+            click.echo(line)
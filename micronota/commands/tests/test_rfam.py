@@ -1,5 +1,6 @@
-from unittest import TestCase, main, mock
-import gzip
+from unittest import TestCase, main
+from shutil import copyfile
+from os.path import join, dirname, abspath
 
 from click.testing import CliRunner
 
@@ -7,15 +8,24 @@ from micronota.commands._rfam import cli
 
 
 class Tests(TestCase):
-    @mock.patch('micronota.commands._rfam.filter_models', return_value=9)
-    def test(self, mock_add_metadata):
+    def test(self):
         runner = CliRunner()
+        rfam = join(dirname(abspath(__file__)), '..', '..', 'database', 'tests', 'data', 'rfam.cm')
+        exp = {'bacteria': ['RF00001'], 'archaea': ['RF00001'],
+               'eukarya': ['RF00001', 'RF00002'], 'default': ['RF00003']}
         with runner.isolated_filesystem():
-            with open('rfam.cm', 'w')  as f:
-                f.write('>abc\nATGC')
+            copyfile(rfam, 'rfam.cm')
             for op in ['bacteria', 'archaea', 'eukarya', 'default']:
-                result = runner.invoke(cli, ['rfam.cm', '--operation', op, 'outfile'])
+                result = runner.invoke(cli, ['rfam.cm', '--operation', op, '--no-press', 'outfile'])
+                self.assertEqual(result.exit_code, 0)
+                with open('outfile') as f:
+                    obs = [line.split()[1] for line in f if line.startswith('ACC ')]
+                self.assertEqual(obs, [i for i in exp[op] for _ in range(2)])
+            result = runner.invoke(cli, ['rfam.cm', '--operation', 'custom', '--no-press',
+                                         '-m', 'U1', 'outfile'])
             self.assertEqual(result.exit_code, 0)
+            result = runner.invoke(cli, ['rfam.cm', '--operation', 'custom', 'outfile'])
+            self.assertNotEqual(result.exit_code, 0)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,328 @@
+r'''
+Compressed file I/O
+===================
+
+.. currentmodule:: micronota.compress
+
+This module (:mod:`micronota.compress`) opens gzip and bzip2 files and
+(de)compresses them on multiple cores, so reading the input sequences
+or the UniProt files and writing the annotation are not bound to the
+speed of one core.
+
+* gzip output is compressed by ``pigz`` if it is installed; otherwise it
+  is written in BGZF blocks compressed by a pool of threads. Either is
+  a valid gzip file.
+* gzip input in BGZF (eg written by micronota or ``bgzip``) is
+  decompressed block by block in a pool of threads. The other gzip
+  input is decompressed by ``pigz`` if it is installed or by a
+  background thread otherwise.
+* bzip2 output is written as independent streams compressed by a pool
+  of threads; bzip2 input is decompressed by a background thread.
+
+zlib and bz2 release the GIL while (de)compressing, so threads run on
+multiple cores.
+'''
+
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, micronota development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import bz2
+import gzip
+import io
+import struct
+import subprocess
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from os import cpu_count
+from queue import Queue
+from shutil import which
+from threading import Thread, Event
+from logging import getLogger
+
+from .bgzf import _BLOCK_SIZE, _HEADER, _HEADER_SIZE, _EOF, _compress_block
+
+
+logger = getLogger(__name__)
+
+
+# the size of a bzip2 block with the highest compression level
+_BZ2_BLOCK_SIZE = 900000
+# the size of the chunks read by the background thread
+_CHUNK_SIZE = 1 << 20
+
+
+def _pigz():
+    return which('pigz')
+
+
+def open_file(fp, mode='r', threads=None):
+    '''Open a file, (de)compressing it in parallel if it is compressed.
+
+    Parameters
+    ----------
+    fp : str
+        file path. It is compressed if it ends with ".gz" or ".bz2".
+    mode : str
+        "r", "rb", "w" or "wb"
+    threads : int, optional
+        the number of threads to (de)compress with. Default is the
+        number of CPUs.
+
+    Returns
+    -------
+    file object
+        text or binary file object according to ``mode``
+
+    Examples
+    --------
+    >>> import os, gzip, tempfile
+    >>> fp = os.path.join(tempfile.mkdtemp(), 'a.txt.gz')
+    >>> with open_file(fp, 'w') as f:
+    ...     _ = f.write('ACGT\\n' * 100000)
+    >>> with gzip.open(fp, 'rt') as f:
+    ...     len(f.read())
+    500000
+    >>> with open_file(fp) as f:
+    ...     f.readline()
+    'ACGT\\n'
+    '''
+    if mode not in {'r', 'rb', 'w', 'wb'}:
+        raise ValueError('Unsupported mode: %r' % mode)
+    if fp.endswith('.gz'):
+        kind = 'gzip'
+    elif fp.endswith('.bz2'):
+        kind = 'bzip2'
+    else:
+        return open(fp, mode)
+    if threads is None:
+        threads = cpu_count() or 1
+    if mode[0] == 'r':
+        raw = io.BufferedReader(_reader(fp, kind, threads), _CHUNK_SIZE)
+    else:
+        raw = io.BufferedWriter(_writer(fp, kind, threads), _CHUNK_SIZE)
+    if 'b' in mode:
+        return raw
+    return io.TextIOWrapper(raw, encoding='utf-8')
+
+
+def _reader(fp, kind, threads):
+    if kind == 'gzip':
+        if is_bgzf(fp):
+            return _ChunkReader(_bgzf_chunks(fp, threads))
+        pigz = _pigz()
+        if pigz is not None:
+            return _ProcessReader([pigz, '-dc', '-p', str(threads), fp])
+        return _ChunkReader(_background_chunks(lambda: gzip.open(fp, 'rb')))
+    return _ChunkReader(_background_chunks(lambda: bz2.open(fp, 'rb')))
+
+
+def _writer(fp, kind, threads):
+    if kind == 'gzip':
+        pigz = _pigz()
+        if pigz is not None:
+            return _ProcessWriter([pigz, '-c', '-p', str(threads)], fp)
+        return _BlockWriter(fp, _compress_block, _BLOCK_SIZE, threads, level=6, tail=_EOF)
+    return _BlockWriter(fp, bz2.compress, _BZ2_BLOCK_SIZE, threads, level=9)
+
+
+def is_bgzf(fp):
+    '''Return whether a gzip file is in BGZF.'''
+    with open(fp, 'rb') as fh:
+        header = fh.read(_HEADER_SIZE)
+    return len(header) == _HEADER_SIZE and header[:4] == _HEADER[:4] and header[12:14] == b'BC'
+
+
+def _bgzf_blocks(fh):
+    '''Yield the raw deflate data of each block in a BGZF file.'''
+    while True:
+        header = fh.read(_HEADER_SIZE)
+        if not header:
+            return
+        if len(header) < _HEADER_SIZE or header[12:14] != b'BC':
+            raise ValueError('Not a BGZF block at offset %d.' % (fh.tell() - len(header)))
+        bsize, = struct.unpack('<H', header[16:18])
+        yield fh.read(bsize + 1 - _HEADER_SIZE)[:-8]
+
+
+def _inflate(data):
+    return zlib.decompress(data, -15)
+
+
+def _ordered_map(pool, func, iterable, ahead):
+    '''Like ``pool.map`` but only submits ``ahead`` tasks in advance.'''
+    pending = deque()
+    for i in iterable:
+        pending.append(pool.submit(func, i))
+        if len(pending) >= ahead:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _bgzf_chunks(fp, threads):
+    with open(fp, 'rb') as fh, ThreadPoolExecutor(threads) as pool:
+        yield from _ordered_map(pool, _inflate, _bgzf_blocks(fh), 4 * threads)
+
+
+def _background_chunks(opener):
+    '''Decompress in a background thread while the chunks are consumed.'''
+    queue = Queue(maxsize=16)
+    stop = Event()
+
+    def run():
+        try:
+            with opener() as fh:
+                while not stop.is_set():
+                    chunk = fh.read(_CHUNK_SIZE)
+                    queue.put(chunk)
+                    if not chunk:
+                        return
+        except Exception as e:
+            queue.put(e)
+
+    thread = Thread(target=run, daemon=True)
+    thread.start()
+    try:
+        while True:
+            chunk = queue.get()
+            if isinstance(chunk, Exception):
+                raise chunk
+            if not chunk:
+                return
+            yield chunk
+    finally:
+        stop.set()
+        # unblock the thread if it is waiting on the full queue
+        while thread.is_alive():
+            while not queue.empty():
+                queue.get_nowait()
+            thread.join(0.01)
+
+
+class _ChunkReader(io.RawIOBase):
+    '''Raw binary file reading from an iterable of bytes.'''
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._chunk = memoryview(b'')
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._chunk:
+            try:
+                self._chunk = memoryview(next(self._chunks))
+            except StopIteration:
+                return 0
+        n = min(len(b), len(self._chunk))
+        b[:n] = self._chunk[:n]
+        self._chunk = self._chunk[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._chunks.close()
+        super().close()
+
+
+class _BlockWriter(io.RawIOBase):
+    '''Raw binary file compressing blocks independently in a thread pool.
+
+    The compressed blocks are written in order, so the file is a series
+    of gzip members or bzip2 streams.
+    '''
+    def __init__(self, fp, compress, block_size, threads, level, tail=b''):
+        self._fh = open(fp, 'wb')
+        self._compress = compress
+        self._block_size = block_size
+        self._level = level
+        self._tail = tail
+        self._pool = ThreadPoolExecutor(threads)
+        self._ahead = 4 * threads
+        self._pending = deque()
+        self._buf = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._buf += b
+        size = self._block_size
+        while len(self._buf) >= size:
+            self._submit(bytes(self._buf[:size]))
+            del self._buf[:size]
+        return len(b)
+
+    def _submit(self, block):
+        self._pending.append(self._pool.submit(self._compress, block, self._level))
+        while len(self._pending) >= self._ahead:
+            self._fh.write(self._pending.popleft().result())
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._buf:
+                self._submit(bytes(self._buf))
+                self._buf = bytearray()
+            while self._pending:
+                self._fh.write(self._pending.popleft().result())
+            self._fh.write(self._tail)
+        finally:
+            self._pool.shutdown()
+            self._fh.close()
+            super().close()
+
+
+class _ProcessReader(io.RawIOBase):
+    '''Raw binary file reading from the output of a decompression command.'''
+    def __init__(self, cmd):
+        self._cmd = cmd
+        self._proc = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        return self._proc.stdout.readinto(b)
+
+    def close(self):
+        if self.closed:
+            return
+        self._proc.stdout.close()
+        code = self._proc.wait()
+        super().close()
+        # a negative code is a signal, eg SIGPIPE when closed before the end
+        if code > 0:
+            raise IOError('%r failed with exit code %d.' % (self._cmd, code))
+
+
+class _ProcessWriter(io.RawIOBase):
+    '''Raw binary file writing to the input of a compression command.'''
+    def __init__(self, cmd, fp):
+        self._cmd = cmd
+        self._fh = open(fp, 'wb')
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=self._fh)
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._proc.stdin.write(b)
+        return len(b)
+
+    def close(self):
+        if self.closed:
+            return
+        self._proc.stdin.close()
+        code = self._proc.wait()
+        self._fh.close()
+        super().close()
+        if code != 0:
+            raise IOError('%r failed with exit code %d.' % (self._cmd, code))
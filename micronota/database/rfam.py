@@ -6,6 +6,11 @@
 # The full license is in the file COPYING.txt, distributed with this software.
 # ----------------------------------------------------------------------------
 
+import subprocess
+from hashlib import sha1
+from mmap import mmap, ACCESS_READ
+from os import makedirs, replace
+from os.path import exists, getmtime, getsize, join, dirname, basename, splitext, abspath
 from logging import getLogger
 
 from ..util import split, SplitterTail
@@ -14,31 +19,50 @@ from ..util import split, SplitterTail
 logger = getLogger(__name__)
 
 
-def filter_models(ifile, ofile, negate=False, models={('RF00001', '5S_rRNA'),
-                                                      ('RF00002', '5_8S_rRNA'),
-                                                      # Permuted mitochondrial genome encoded 5S rRNA
-                                                      ('RF02547', 'mtPerm_5S'),
-                                                      ('RF01118', 'PK-G12rRNA'),
-                                                      ('RF00177', 'SSU_rRNA_bacteria'),
-                                                      ('RF01959', 'SSU_rRNA_archaea'),
-                                                      ('RF01960', 'SSU_rRNA_eukarya'),
-                                                      ('RF02542', 'SSU_rRNA_microsporidia'),
-                                                      ('RF02540', 'LSU_rRNA_archaea'),
-                                                      ('RF02541', 'LSU_rRNA_bacteria'),
-                                                      ('RF02543', 'LSU_rRNA_eukarya'),
-                                                      # Trypanosomatid mitochondrial rRNA
-                                                      ('RF02545', 'SSU_trypano_mito'),
-                                                      ('RF02546', 'LSU_trypano_mito'),
-                                                      ('RF00005', 'tRNA'),
-                                                      ('RF01852', 'tRNA-Sec'),
-                                                      # Mitochondrion encoded tmRNA
-                                                      ('RF02544', 'mt_tmRNA'),
-                                                      # Alphaproteobacteria transfer messenger RNA
-                                                      ('RF01849', 'alpha_tmRNA'),
-                                                      # Betaproteobacteria transfer messenger RNA
-                                                      ('RF01850', 'beta_tmRNA'),
-                                                      # Cyanobacteria transfer messenger RNA
-                                                      ('RF01851', 'cyano_tmRNA')}):
+# tRNA, tmRNA, and 5S/5.8S/16S/18S/23S/28S rRNA models
+RNA_MODELS = {('RF00001', '5S_rRNA'),
+              ('RF00002', '5_8S_rRNA'),
+              # Permuted mitochondrial genome encoded 5S rRNA
+              ('RF02547', 'mtPerm_5S'),
+              ('RF01118', 'PK-G12rRNA'),
+              ('RF00177', 'SSU_rRNA_bacteria'),
+              ('RF01959', 'SSU_rRNA_archaea'),
+              ('RF01960', 'SSU_rRNA_eukarya'),
+              ('RF02542', 'SSU_rRNA_microsporidia'),
+              ('RF02540', 'LSU_rRNA_archaea'),
+              ('RF02541', 'LSU_rRNA_bacteria'),
+              ('RF02543', 'LSU_rRNA_eukarya'),
+              # Trypanosomatid mitochondrial rRNA
+              ('RF02545', 'SSU_trypano_mito'),
+              ('RF02546', 'LSU_trypano_mito'),
+              ('RF00005', 'tRNA'),
+              ('RF01852', 'tRNA-Sec'),
+              # Mitochondrion encoded tmRNA
+              ('RF02544', 'mt_tmRNA'),
+              # Alphaproteobacteria transfer messenger RNA
+              ('RF01849', 'alpha_tmRNA'),
+              # Betaproteobacteria transfer messenger RNA
+              ('RF01850', 'beta_tmRNA'),
+              # Cyanobacteria transfer messenger RNA
+              ('RF01851', 'cyano_tmRNA')}
+
+# the rRNA models of each kingdom
+KINGDOM_MODELS = {'bacteria': {('RF00001', '5S_rRNA'),
+                               ('RF00177', 'SSU_rRNA_bacteria'),
+                               ('RF02541', 'LSU_rRNA_bacteria')},
+                  'archaea': {('RF00001', '5S_rRNA'),
+                              ('RF01959', 'SSU_rRNA_archaea'),
+                              ('RF02540', 'LSU_rRNA_archaea')},
+                  'eukarya': {('RF00001', '5S_rRNA'),
+                              ('RF00002', '5_8S_rRNA'),
+                              ('RF01960', 'SSU_rRNA_eukarya'),
+                              ('RF02543', 'LSU_rRNA_eukarya')}}
+
+# the files written by cmpress
+PRESSED = ('.i1m', '.i1i', '.i1f', '.i1p')
+
+
+def filter_models(ifile, ofile, negate=False, models=RNA_MODELS):
     '''Filter away some cm models.
 
     Parameters
@@ -72,3 +96,196 @@ def filter_models(ifile, ofile, negate=False, models={('RF00001', '5S_rRNA'),
             for line in record:
                 ofile.write(line)
     logger.debug('Processed %d and filtered %d cm and hmm models' % (i, j))
+
+
+def index_models(fp, index_fp=None):
+    '''Index the models in a CM file.
+
+    Each model is its CM record followed by its HMM filter record (both
+    ended with "//"). The index is a tab delimited file with a line per
+    model of its accession, name, byte offset and byte length in the file.
+
+    Parameters
+    ----------
+    fp : str
+        the CM file (eg Rfam.cm)
+    index_fp : str, optional
+        Default is ``fp`` with the suffix ".idx".
+    '''
+    if index_fp is None:
+        index_fp = fp + '.idx'
+    with open(index_fp, 'w') as out:
+        for accn, name, offset, length in _scan(fp):
+            out.write('%s\t%s\t%d\t%d\n' % (accn, name, offset, length))
+
+
+def _scan(fp):
+    '''Yield the accession, name, offset and length of each model.'''
+    if getsize(fp) == 0:
+        return
+    with open(fp, 'rb') as fh, mmap(fh.fileno(), 0, access=ACCESS_READ) as mm:
+        size = len(mm)
+        model = None
+        beg = 0
+        while beg < size:
+            end = mm.find(b'\n//\n', beg)
+            end = size if end == -1 else end + 4
+            accn = name = None
+            # the NAME and ACC lines are in the first lines of a record
+            for line in mm[beg:min(end, beg + 1024)].split(b'\n')[1:]:
+                if line.startswith(b'NAME '):
+                    name = line.split()[1].decode()
+                elif line.startswith(b'ACC '):
+                    accn = line.split()[1].decode()
+                if name is not None and accn is not None:
+                    break
+            if model is not None and tuple(model[:2]) == (accn, name):
+                # the HMM filter of the CM
+                model[3] = end - model[2]
+            else:
+                if model is not None:
+                    yield tuple(model)
+                model = [accn, name, beg, end - beg]
+            beg = end
+        if model is not None:
+            yield tuple(model)
+
+
+class CMLibrary:
+    '''The models in a CM file, indexed by accession and name.
+
+    A subset of models is extracted by slicing the memory mapped file at
+    the offsets in the index, instead of parsing the whole file. The index
+    is written if it does not exist or is older than the CM file.
+
+    Parameters
+    ----------
+    fp : str
+        the CM file (eg Rfam.cm)
+    '''
+    def __init__(self, fp):
+        self.fp = fp
+        index_fp = fp + '.idx'
+        if not exists(index_fp) or getmtime(index_fp) < getmtime(fp):
+            logger.debug('index the CM file %s' % fp)
+            index_models(fp, index_fp)
+        self._models = []
+        self._lookup = {}
+        with open(index_fp) as fh:
+            for line in fh:
+                accn, name, offset, length = line.rstrip('\n').split('\t')
+                self._lookup[accn] = self._lookup[name] = len(self._models)
+                self._models.append((accn, name, int(offset), int(length)))
+
+    def __len__(self):
+        return len(self._models)
+
+    def __contains__(self, key):
+        return key in self._lookup
+
+    @property
+    def models(self):
+        '''list of (accession, name) of the models, in the order of the file.'''
+        return [m[:2] for m in self._models]
+
+    def select(self, models, negate=False):
+        '''Return the positions of the models, in the order of the file.
+
+        Parameters
+        ----------
+        models : Iterable
+            the accessions, names or (accession, name) of the models. The
+            ones not in the library are ignored.
+        negate : bool
+            select all the other models instead.
+        '''
+        selected = set()
+        for m in models:
+            if isinstance(m, tuple):
+                m = m[0]
+            i = self._lookup.get(m)
+            if i is not None:
+                selected.add(i)
+        if negate:
+            selected = set(range(len(self._models))) - selected
+        return sorted(selected)
+
+    def extract(self, models, out_fp, negate=False):
+        '''Write the selected models to a new CM file.
+
+        Returns
+        -------
+        int
+            the number of models written
+        '''
+        positions = self.select(models, negate)
+        with open(self.fp, 'rb') as fh, open(out_fp, 'wb') as out:
+            if positions:
+                with mmap(fh.fileno(), 0, access=ACCESS_READ) as mm:
+                    for i in positions:
+                        _, _, offset, length = self._models[i]
+                        out.write(mm[offset:offset + length])
+        logger.debug('Extracted %d of %d models into %s' % (len(positions), len(self), out_fp))
+        return len(positions)
+
+    def subset(self, models, negate=False, cache_dir=None, press=True):
+        '''Return the CM file of the selected models, cached and pressed.
+
+        The subset file is named after the library and the digest of the
+        selected models, so it is only extracted and pressed with
+        ``cmpress`` the first time the model set is asked for.
+
+        Parameters
+        ----------
+        models : Iterable
+            see ``select``
+        negate : bool
+            see ``select``
+        cache_dir : str, optional
+            the directory of the cached subsets. Default is the directory
+            of the library.
+        press : bool
+            whether to ``cmpress`` the subset.
+
+        Returns
+        -------
+        str
+            the file path of the subset
+        '''
+        positions = self.select(models, negate)
+        key = sha1()
+        # a change of the library invalidates its cached subsets
+        key.update(('%s\t%d\t%f\n' % (abspath(self.fp), getsize(self.fp), getmtime(self.fp))).encode())
+        for i in positions:
+            key.update(('%s\n' % self._models[i][0]).encode())
+        if cache_dir is None:
+            cache_dir = dirname(abspath(self.fp))
+        makedirs(cache_dir, exist_ok=True)
+        stem = splitext(basename(self.fp))[0]
+        fp = join(cache_dir, '%s.%s.cm' % (stem, key.hexdigest()[:12]))
+        if not exists(fp):
+            # extract into a temp file so a partial subset is never cached
+            tmp = fp + '.tmp'
+            self.extract([self._models[i][0] for i in positions], tmp)
+            replace(tmp, fp)
+        if press and not all(exists(fp + ext) for ext in PRESSED):
+            logger.debug('cmpress %s' % fp)
+            subprocess.run(['cmpress', '-F', fp], check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return fp
+
+
+def kingdom_subset(lib, operation, cache_dir=None, press=True):
+    '''Return the cached subset of the Rfam models for an operation.
+
+    Parameters
+    ----------
+    lib : ``CMLibrary``
+    operation : str
+        "default" for all the models except tRNA, tmRNA and rRNA (see
+        ``RNA_MODELS``) or a kingdom ("bacteria", "archaea" or "eukarya")
+        for its rRNA models (see ``KINGDOM_MODELS``).
+    '''
+    if operation == 'default':
+        return lib.subset(RNA_MODELS, negate=True, cache_dir=cache_dir, press=press)
+    return lib.subset(KINGDOM_MODELS[operation], cache_dir=cache_dir, press=press)
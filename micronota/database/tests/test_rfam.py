@@ -7,11 +7,14 @@
 # ----------------------------------------------------------------------------
 
 from unittest import TestCase, main
+from tempfile import mkdtemp
+from shutil import rmtree, copyfile
+from os.path import join, exists
 import io
 
 from skbio.util import get_data_path
 
-from micronota.database.rfam import filter_models
+from micronota.database.rfam import filter_models, CMLibrary
 
 
 class Tests(TestCase):
@@ -47,5 +50,45 @@ class Tests(TestCase):
         self.assertEqual(obs, exp)
 
 
+class LibraryTests(TestCase):
+    def setUp(self):
+        self.tmpd = mkdtemp()
+        self.i = join(self.tmpd, 'rfam.cm')
+        copyfile(get_data_path('rfam.cm'), self.i)
+        self.lib = CMLibrary(self.i)
+
+    def tearDown(self):
+        rmtree(self.tmpd)
+
+    def test_index(self):
+        self.assertTrue(exists(self.i + '.idx'))
+        self.assertEqual(self.lib.models,
+                         [('RF00001', '5S_rRNA'), ('RF00002', '5_8S_rRNA'), ('RF00003', 'U1')])
+        self.assertIn('U1', self.lib)
+        self.assertEqual(self.lib.select(['U1', ('RF00001', '5S_rRNA'), 'RF99999']), [0, 2])
+        self.assertEqual(self.lib.select(['U1'], negate=True), [0, 1])
+
+    def test_extract(self):
+        # the same as parsing the whole file
+        for negate in (False, True):
+            out_fp = join(self.tmpd, 'out.cm')
+            self.lib.extract(['RF00001', '5_8S_rRNA'], out_fp, negate=negate)
+            with io.StringIO() as ofile, open(self.i) as ifile:
+                filter_models(ifile, ofile, not negate,
+                              {('RF00001', '5S_rRNA'), ('RF00002', '5_8S_rRNA')})
+                exp = ofile.getvalue()
+            with open(out_fp) as f:
+                self.assertEqual(f.read(), exp)
+
+    def test_subset(self):
+        cache = join(self.tmpd, 'cache')
+        fp = self.lib.subset(['U1'], cache_dir=cache, press=False)
+        self.assertTrue(fp.startswith(join(cache, 'rfam.')))
+        # the same model set is cached in the same file
+        self.assertEqual(self.lib.subset(['RF00003'], cache_dir=cache, press=False), fp)
+        self.assertNotEqual(self.lib.subset(['U1'], negate=True, cache_dir=cache, press=False), fp)
+        self.assertEqual(CMLibrary(fp).models, [('RF00003', 'U1')])
+
+
 if __name__ == '__main__':
     main()
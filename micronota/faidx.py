@@ -0,0 +1,192 @@
+r'''
+FASTA index
+===========
+
+.. currentmodule:: micronota.faidx
+
+This module (:mod:`micronota.faidx`) writes and reads the ``.fai``
+index of a FASTA file in the format of ``samtools faidx``. It has a
+line per sequence of 5 tab delimited columns:
+
+1. the sequence ID;
+2. the sequence length;
+3. the byte offset of the sequence in the file;
+4. the number of bases on each line;
+5. the number of bytes in each line, including the line break.
+
+With the index, the lengths of the sequences are known without reading
+the FASTA file and a subsequence is read from its offset.
+'''
+
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, micronota development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from collections.abc import Mapping
+from mmap import mmap, ACCESS_READ
+from os.path import exists, getmtime, getsize
+from logging import getLogger
+
+import numpy as np
+from skbio import DNA
+
+
+logger = getLogger(__name__)
+
+
+def write_fai(fp, fai_fp=None):
+    '''Index a FASTA file.
+
+    Parameters
+    ----------
+    fp : str
+        the uncompressed FASTA file
+    fai_fp : str, optional
+        the index file. Default is ``fp`` with the suffix ".fai".
+
+    Raises
+    ------
+    ValueError
+        if the lines of a sequence (except the last) differ in length.
+    '''
+    if fai_fp is None:
+        fai_fp = fp + '.fai'
+    with open(fai_fp, 'w') as out:
+        for row in _scan(fp):
+            out.write('%s\t%d\t%d\t%d\t%d\n' % row)
+
+
+def _scan(fp):
+    if getsize(fp) == 0:
+        return
+    with open(fp, 'rb') as fh, mmap(fh.fileno(), 0, access=ACCESS_READ) as mm:
+        size = len(mm)
+        beg = mm.find(b'>')
+        while beg != -1:
+            line_end = mm.find(b'\n', beg)
+            if line_end == -1:
+                line_end = size
+            header = mm[beg + 1:line_end].rstrip()
+            seq_id = header.split(None, 1)[0].decode() if header.strip() else ''
+            offset = line_end + 1
+            nxt = mm.find(b'\n>', line_end)
+            end = size if nxt == -1 else nxt + 1
+            data = mm[offset:end]
+            first = data.find(b'\n')
+            if first == -1:
+                first = len(data)
+                width = len(data)
+            else:
+                width = first + 1
+            bases = len(data[:first].rstrip(b'\r'))
+            # the line breaks of all the lines except the last one
+            breaks = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == 10)
+            if data.endswith(b'\n'):
+                breaks = breaks[:-1]
+            last = len(data.rstrip(b'\r\n')) - (breaks[-1] + 1 if len(breaks) else 0)
+            if np.any(np.diff(breaks) != width) or last > bases:
+                raise ValueError('The lines of sequence %r are of different lengths.' % seq_id)
+            length = len(data) - data.count(b'\n') - data.count(b'\r')
+            yield seq_id, length, offset, bases, width
+            beg = -1 if nxt == -1 else nxt + 1
+
+
+class FastaIndex(Mapping):
+    '''Sequences in an indexed FASTA file, loaded on access.
+
+    It is a read-only mapping of seq ID to ``DNA``. The index is written
+    if it does not exist or is older than the FASTA file.
+
+    Parameters
+    ----------
+    fp : str
+        the uncompressed FASTA file
+
+    Examples
+    --------
+    >>> import os, tempfile
+    >>> fp = os.path.join(tempfile.mkdtemp(), 'a.fna')
+    >>> with open(fp, 'w') as f:
+    ...     _ = f.write('>s1 contig 1\\nACGTA\\nCGTAC\\nGT\\n>s2\\nAAA\\n')
+    >>> seqs = FastaIndex(fp)
+    >>> seqs.lengths
+    {'s1': 12, 's2': 3}
+    >>> seqs.fetch('s1', 3, 9)
+    'TACGTA'
+    >>> seq = seqs['s1']
+    >>> str(seq), seq.metadata['description']
+    ('ACGTACGTACGT', 'contig 1')
+    '''
+    def __init__(self, fp):
+        self.fp = fp
+        fai_fp = fp + '.fai'
+        if not exists(fai_fp) or getmtime(fai_fp) < getmtime(fp):
+            logger.debug('index the sequence file %s' % fp)
+            write_fai(fp, fai_fp)
+        self._index = {}
+        with open(fai_fp) as fh:
+            for line in fh:
+                items = line.rstrip('\n').split('\t')
+                self._index[items[0]] = tuple(int(i) for i in items[1:5])
+
+    @property
+    def lengths(self):
+        '''dict of seq ID to length, in the order of the file.'''
+        return {k: v[0] for k, v in self._index.items()}
+
+    def length(self, seq_id):
+        return self._index[seq_id][0]
+
+    def __len__(self):
+        return len(self._index)
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __contains__(self, seq_id):
+        return seq_id in self._index
+
+    def fetch(self, seq_id, start=0, end=None):
+        '''Return the subsequence of 0-based [start, end) as str.'''
+        length, offset, bases, width = self._index[seq_id]
+        if end is None or end > length:
+            end = length
+        if start >= end:
+            return ''
+        beg = offset + start // bases * width + start % bases
+        stop = offset + (end - 1) // bases * width + (end - 1) % bases + 1
+        with open(self.fp, 'rb') as fh:
+            fh.seek(beg)
+            data = fh.read(stop - beg)
+        if width != bases:
+            data = data.translate(None, b'\r\n')
+        return data.decode('ascii')
+
+    def _header(self, seq_id):
+        length, offset, bases, width = self._index[seq_id]
+        # the header line ends right before the sequence; read back to its start
+        end = offset - 1
+        size = 1024
+        with open(self.fp, 'rb') as fh:
+            while True:
+                beg = max(end - size, 0)
+                fh.seek(beg)
+                head = fh.read(end - beg)
+                i = head.rfind(b'\n')
+                if i != -1 or beg == 0:
+                    break
+                size *= 2
+        line = head[i + 1:].rstrip(b'\r').decode()
+        items = line[1:].split(None, 1)
+        return items[1].rstrip() if len(items) > 1 else ''
+
+    def __getitem__(self, seq_id):
+        '''Load the sequence as ``DNA``.'''
+        if seq_id not in self._index:
+            raise KeyError(seq_id)
+        return DNA(self.fetch(seq_id), lowercase=True,
+                   metadata={'id': seq_id, 'description': self._header(seq_id)})
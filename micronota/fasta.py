@@ -0,0 +1,173 @@
+r'''
+Fast FASTA reader
+=================
+
+.. currentmodule:: micronota.fasta
+
+This module (:mod:`micronota.fasta`) reads the input FASTA file as raw
+bytes. The records are split, measured and filtered by length before
+any of them is decoded, so only the surviving records become
+``Sequence`` objects. An uncompressed file is memory mapped and cut
+into byte ranges at record boundaries that are scanned by parallel
+processes.
+'''
+
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, micronota development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from mmap import mmap, ACCESS_READ
+from multiprocessing import Pool
+from os.path import getsize
+from logging import getLogger
+
+from skbio import DNA
+
+from .compress import open_file
+
+
+logger = getLogger(__name__)
+
+
+# the bytes removed from the sequence lines: white spaces and gaps
+_REMOVE = b' \t\r\n\v\f-.'
+# the size of the chunks to read from the compressed file
+_CHUNK_SIZE = 1 << 24
+
+
+def _records(buf, beg, end, min_len):
+    '''Return the records starting in ``buf[beg:end]`` that are long enough.
+
+    ``beg`` must be at the start of a record.
+
+    Returns
+    -------
+    list of tuple of bytes
+        the header (without ">") and the degapped sequence of each record
+    '''
+    records = []
+    while beg < end:
+        nxt = buf.find(b'\n>', beg, end)
+        nxt = end if nxt == -1 else nxt + 1
+        line_end = buf.find(b'\n', beg, nxt)
+        if line_end == -1:
+            line_end = nxt
+        seq = buf[line_end:nxt].translate(None, _REMOVE)
+        if not seq and not buf[line_end:nxt].strip():
+            raise ValueError('Found header without sequence data: %r' % bytes(buf[beg:line_end]))
+        if len(seq) >= min_len:
+            records.append((buf[beg + 1:line_end].rstrip(), seq))
+        beg = nxt
+    return records
+
+
+def _start(buf, end):
+    '''Return the position of the first record.'''
+    beg = 0
+    while beg < end and buf[beg:beg + 1].isspace():
+        beg += 1
+    if beg < end and buf[beg:beg + 1] != b'>':
+        raise ValueError('The FASTA file does not start with ">".')
+    return beg
+
+
+def _boundaries(mm, n):
+    '''Cut the file into ``n`` byte ranges at the starts of records.'''
+    size = len(mm)
+    cuts = [_start(mm, size)]
+    for i in range(1, n):
+        pos = max(size * i // n, cuts[-1])
+        nxt = mm.find(b'\n>', pos)
+        cuts.append(size if nxt == -1 else nxt + 1)
+    cuts.append(size)
+    return [(beg, end) for beg, end in zip(cuts[:-1], cuts[1:]) if beg < end]
+
+
+def _scan_range(args):
+    fp, beg, end, min_len = args
+    with open(fp, 'rb') as fh, mmap(fh.fileno(), 0, access=ACCESS_READ) as mm:
+        return _records(mm, beg, end, min_len)
+
+
+def _scan_file(fp, min_len, cpus):
+    if getsize(fp) == 0:
+        return
+    with open(fp, 'rb') as fh, mmap(fh.fileno(), 0, access=ACCESS_READ) as mm:
+        if cpus <= 1:
+            yield from _records(mm, _start(mm, len(mm)), len(mm), min_len)
+            return
+        ranges = _boundaries(mm, cpus * 4)
+    with Pool(cpus) as pool:
+        for records in pool.imap(_scan_range, [(fp, b, e, min_len) for b, e in ranges]):
+            yield from records
+
+
+def _scan_stream(fh, min_len):
+    '''Scan the file chunk by chunk, keeping the last partial record.'''
+    buf = b''
+    first = True
+    while True:
+        chunk = fh.read(_CHUNK_SIZE)
+        buf += chunk
+        if first:
+            buf = buf[_start(buf, len(buf)):]
+            first = not buf
+        if not chunk:
+            yield from _records(buf, 0, len(buf), min_len)
+            return
+        cut = buf.rfind(b'\n>')
+        if cut > 0:
+            yield from _records(buf, 0, cut + 1, min_len)
+            buf = buf[cut + 1:]
+
+
+def read_fasta(fp, min_len=0, cpus=1):
+    '''Read the DNA sequences at least ``min_len`` long from a FASTA file.
+
+    It reads the same sequences as ``skbio.read(fp, format='fasta',
+    constructor=DNA, lowercase=True)`` followed by ``degap()``, except
+    that the short records are dropped without being decoded.
+
+    Parameters
+    ----------
+    fp : str
+        FASTA file path. It can be gzip or bzip2 compressed.
+    min_len : int
+        the minimal length of the degapped sequences to keep
+    cpus : int
+        the number of processes to scan an uncompressed file
+
+    Yields
+    ------
+    ``DNA``
+
+    Examples
+    --------
+    >>> import os, tempfile
+    >>> fp = os.path.join(tempfile.mkdtemp(), 'a.fna')
+    >>> with open(fp, 'w') as f:
+    ...     _ = f.write('>s1 a contig\\nACGT\\nac--gt\\n>s2\\nAC\\n')
+    >>> for seq in read_fasta(fp, min_len=3):
+    ...     print(seq.metadata, seq)
+    {'id': 's1', 'description': 'a contig'} ACGTACGT
+    '''
+    if fp.endswith(('.gz', '.bz2')):
+        with open_file(fp, 'rb') as fh:
+            records = _scan_stream(fh, min_len)
+            yield from _to_dna(records)
+    else:
+        yield from _to_dna(_scan_file(fp, min_len, cpus))
+
+
+def _to_dna(records):
+    for header, seq in records:
+        items = header.decode().split(None, 1)
+        if items:
+            metadata = {'id': items[0], 'description': items[1] if len(items) > 1 else ''}
+        else:
+            metadata = {'id': '', 'description': ''}
+        yield DNA(seq.decode('ascii'), metadata=metadata, lowercase=True)
@@ -0,0 +1,409 @@
+r'''
+Compact feature storage
+=======================
+
+.. currentmodule:: micronota.features
+
+This module (:mod:`micronota.features`) provides a column store for the
+interval features annotated on a sequence. Feature bounds are kept in
+NumPy arrays and each metadata key is a dictionary-encoded column, so the
+values repeated across features (eg ``'type': 'tRNA'`` or
+``'source': 'Aragorn'``) are stored only once.
+'''
+
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, micronota development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import numpy as np
+from skbio.metadata import IntervalMetadata
+
+from .util import LazyString
+
+
+def _hashable(v):
+    '''Return the key to intern the metadata value with.'''
+    if isinstance(v, list):
+        return (list, tuple(v))
+    if isinstance(v, LazyString):
+        # do not read the string from file just to hash it
+        return (LazyString, v.fp, v.offset, v.length, v.sep)
+    # include type so that eg 1 and '1' are different values
+    return (type(v), v)
+
+
+class _Column:
+    '''Dictionary-encoded values of a metadata key.
+
+    ``codes`` is the index into ``categories`` for each feature; -1 for
+    the features that do not have this key.
+    '''
+    __slots__ = ('codes', 'categories')
+
+    def __init__(self, codes, categories):
+        self.codes = codes
+        self.categories = categories
+
+    def take(self, positions):
+        return _Column(self.codes[positions], self.categories)
+
+
+class FeatureStore:
+    r'''Column store of the interval features on one sequence.
+
+    Parameters
+    ----------
+    upper_bound : int, optional
+        the length of the sequence.
+
+    Attributes
+    ----------
+    start : 1-D ``numpy.ndarray`` of int
+        the start (0-based, inclusive) of each feature
+    end : 1-D ``numpy.ndarray`` of int
+        the end (exclusive) of each feature
+
+    Notes
+    -----
+    A feature spanning multiple regions (or with fuzzy bounds) has
+    ``start`` and ``end`` covering all the regions; its exact bounds
+    are kept aside so it can be converted back losslessly.
+
+    Examples
+    --------
+    >>> from skbio.metadata import IntervalMetadata
+    >>> imd = IntervalMetadata(100)
+    >>> _ = imd.add([(0, 10)], metadata={'type': 'tRNA', 'source': 'Aragorn'})
+    >>> _ = imd.add([(20, 30)], metadata={'type': 'tRNA', 'source': 'Aragorn'})
+    >>> _ = imd.add([(40, 90)], metadata={'type': 'CDS', 'ID': '1_1'})
+    >>> fs = FeatureStore.from_interval_metadata(imd)
+    >>> len(fs)
+    3
+    >>> fs.where({'type': 'tRNA'})
+    array([0, 1])
+    >>> fs.count('type') == {'tRNA': 2, 'CDS': 1}
+    True
+    >>> fs.to_interval_metadata() == imd
+    True
+    '''
+    def __init__(self, upper_bound=None):
+        self.upper_bound = upper_bound
+        self.start = np.zeros(0, dtype=np.int64)
+        self.end = np.zeros(0, dtype=np.int64)
+        self._columns = {}
+        # position -> (bounds, fuzzy) for the features that are not
+        # a single region with exact bounds
+        self._regions = {}
+        # metadata key -> {value key: positions}; see ``index``
+        self._index = {}
+
+    @classmethod
+    def from_features(cls, features, upper_bound=None):
+        '''Create from an iterable of ``(bounds, fuzzy, metadata)``.'''
+        store = cls(upper_bound)
+        start, end = [], []
+        codes = {}
+        categories = {}
+        lookup = {}
+        for i, (bounds, fuzzy, md) in enumerate(features):
+            start.append(bounds[0][0])
+            end.append(bounds[-1][-1])
+            if len(bounds) > 1 or (fuzzy is not None and any(any(f) for f in fuzzy)):
+                store._regions[i] = (list(bounds), fuzzy)
+            for k, v in md.items():
+                if k not in codes:
+                    codes[k] = []
+                    categories[k] = []
+                    lookup[k] = {}
+                h = _hashable(v)
+                c = lookup[k].get(h)
+                if c is None:
+                    c = lookup[k][h] = len(categories[k])
+                    categories[k].append(v)
+                codes[k].append((i, c))
+        n = len(start)
+        store.start = np.array(start, dtype=np.int64)
+        store.end = np.array(end, dtype=np.int64)
+        for k, pairs in codes.items():
+            col = np.full(n, -1, dtype=np.int32)
+            idx, val = zip(*pairs)
+            col[list(idx)] = val
+            store._columns[k] = _Column(col, categories[k])
+        return store
+
+    @classmethod
+    def from_interval_metadata(cls, imd):
+        '''Create from ``skbio.metadata.IntervalMetadata``.'''
+        return cls.from_features(
+            ((i.bounds, i.fuzzy, i.metadata) for i in imd._intervals),
+            imd.upper_bound)
+
+    def to_interval_metadata(self):
+        '''Convert to ``skbio.metadata.IntervalMetadata``.'''
+        imd = IntervalMetadata(self.upper_bound)
+        for bounds, fuzzy, md in self.features():
+            imd.add(bounds, fuzzy, md)
+        return imd
+
+    def __len__(self):
+        return len(self.start)
+
+    def __repr__(self):
+        return '%s(%d features, upper_bound=%r)' % (
+            type(self).__name__, len(self), self.upper_bound)
+
+    def features(self, positions=None):
+        '''Yield ``(bounds, fuzzy, metadata)`` of the features.
+
+        Parameters
+        ----------
+        positions : Iterable of int, optional
+            the positions of the features to yield. Default is all.
+        '''
+        if positions is None:
+            positions = range(len(self))
+        # convert to lists once; indexing numpy arrays item by item is slow
+        columns = [(k, c.codes.tolist(), c.categories) for k, c in self._columns.items()]
+        start = self.start.tolist()
+        end = self.end.tolist()
+        for i in positions:
+            if i in self._regions:
+                bounds, fuzzy = self._regions[i]
+            else:
+                bounds, fuzzy = [(start[i], end[i])], None
+            md = {k: cat[codes[i]] for k, codes, cat in columns if codes[i] != -1}
+            yield bounds, fuzzy, md
+
+    def metadata(self, i):
+        '''Return the metadata dict of the feature at position ``i``.'''
+        return {k: c.categories[c.codes[i]]
+                for k, c in self._columns.items() if c.codes[i] != -1}
+
+    def bounds(self, i):
+        '''Return the list of bounds of the feature at position ``i``.'''
+        if i in self._regions:
+            return self._regions[i][0]
+        return [(int(self.start[i]), int(self.end[i]))]
+
+    @property
+    def irregular(self):
+        '''The sorted positions of the features with multiple or fuzzy bounds.
+
+        The bounds of the other features are ``[(start, end)]``.
+        '''
+        return sorted(self._regions)
+
+    @property
+    def keys(self):
+        '''The metadata keys present on any of the features.'''
+        return set(self._columns)
+
+    def codes(self, key):
+        '''Return the codes and the categories of a metadata key.
+
+        Returns
+        -------
+        tuple of 1-D ``numpy.ndarray`` and list
+            The code is -1 for the features without this key.
+        '''
+        col = self._columns.get(key)
+        if col is None:
+            return np.full(len(self), -1, dtype=np.int32), []
+        return col.codes, col.categories
+
+    def values(self, key, positions=None, default=None):
+        '''Return the list of values of a metadata key.'''
+        codes, cat = self.codes(key)
+        if positions is not None:
+            codes = codes[positions]
+        return [default if c == -1 else cat[c] for c in codes.tolist()]
+
+    def index(self, key):
+        '''Return the positions of the features for each value of a key.
+
+        The index is built with one pass over the column the first time
+        it is requested and is reused until the store is modified.
+
+        Parameters
+        ----------
+        key : str
+            metadata key, eg "type", "product" or "source"
+
+        Returns
+        -------
+        dict
+            the key is the value hashed with ``_hashable`` and the value
+            is the 1-D ``numpy.ndarray`` of the positions in ascending order.
+        '''
+        idx = self._index.get(key)
+        if idx is None:
+            codes, cat = self.codes(key)
+            order = np.argsort(codes, kind='stable')
+            # the boundary of each code in the sorted codes
+            edges = np.searchsorted(codes[order], np.arange(len(cat) + 1)).tolist()
+            idx = self._index[key] = {
+                _hashable(v): order[edges[c]:edges[c + 1]]
+                for c, v in enumerate(cat) if edges[c] < edges[c + 1]}
+        return idx
+
+    def mask(self, key, value):
+        '''Return the boolean mask of the features with ``key == value``.'''
+        mask = np.zeros(len(self), dtype=bool)
+        mask[self.where({key: value})] = True
+        return mask
+
+    def where(self, metadata):
+        '''Return the positions of the features matching all the metadata.
+
+        Parameters
+        ----------
+        metadata : dict
+            the key and value pairs the features must have
+
+        Returns
+        -------
+        1-D ``numpy.ndarray`` of int
+        '''
+        found = None
+        empty = np.zeros(0, dtype=np.int64)
+        for k, v in metadata.items():
+            pos = self.index(k).get(_hashable(v), empty)
+            found = pos if found is None else np.intersect1d(found, pos, assume_unique=True)
+        if found is None:
+            return np.arange(len(self))
+        return found
+
+    def count(self, key):
+        '''Return the number of features for each value of a metadata key.'''
+        _, cat = self.codes(key)
+        idx = self.index(key)
+        counts = {}
+        for v in cat:
+            pos = idx.get(_hashable(v))
+            if pos is not None:
+                counts[v] = len(pos)
+        return counts
+
+    def take(self, positions):
+        '''Return a new store with the features at the given positions.'''
+        positions = np.asarray(positions, dtype=np.int64)
+        store = type(self)(self.upper_bound)
+        store.start = self.start[positions]
+        store.end = self.end[positions]
+        store._columns = {k: c.take(positions) for k, c in self._columns.items()}
+        if self._regions:
+            old = positions.tolist()
+            store._regions = {new: self._regions[i]
+                              for new, i in enumerate(old) if i in self._regions}
+        return store
+
+    def sort(self):
+        '''Return a new store with the features sorted by their bounds.'''
+        return self.take(_position_order(self.start, self.end))
+
+    @classmethod
+    def concat(cls, stores, upper_bound=None, sort=False):
+        '''Concatenate the features of multiple stores into a new store.
+
+        Each column is copied only once no matter how many stores there are.
+
+        Parameters
+        ----------
+        stores : Iterable of ``FeatureStore``
+        upper_bound : int, optional
+            Default is the first upper bound of the stores that is not ``None``.
+        sort : bool
+            whether to sort the features by their bounds. The features from
+            each store are usually (nearly) sorted already; the sort merges
+            these runs instead of sorting from scratch.
+
+        Returns
+        -------
+        ``FeatureStore``
+        '''
+        stores = list(stores)
+        if upper_bound is None:
+            upper_bound = next((s.upper_bound for s in stores if s.upper_bound is not None), None)
+        store = cls(upper_bound)
+        if not stores:
+            return store
+        offsets = np.cumsum([0] + [len(s) for s in stores]).tolist()
+        start = np.concatenate([s.start for s in stores])
+        end = np.concatenate([s.end for s in stores])
+        order = None
+        if sort:
+            order = _position_order(start, end)
+            start, end = start[order], end[order]
+        store.start, store.end = start, end
+
+        keys = set()
+        for s in stores:
+            keys.update(s._columns)
+        for k in keys:
+            cat = []
+            lookup = {}
+            parts = []
+            for s in stores:
+                codes, scat = s.codes(k)
+                # translate the codes of each store into the merged categories
+                remap = np.empty(len(scat) + 1, dtype=np.int32)
+                remap[-1] = -1
+                for c, v in enumerate(scat):
+                    h = _hashable(v)
+                    if h not in lookup:
+                        lookup[h] = len(cat)
+                        cat.append(v)
+                    remap[c] = lookup[h]
+                parts.append(remap[codes])
+            codes = np.concatenate(parts)
+            if order is not None:
+                codes = codes[order]
+            store._columns[k] = _Column(codes, cat)
+
+        regions = {}
+        for s, offset in zip(stores, offsets):
+            regions.update({i + offset: r for i, r in s._regions.items()})
+        if regions and order is not None:
+            new = np.empty(len(order), dtype=np.int64)
+            new[order] = np.arange(len(order))
+            regions = {int(new[i]): r for i, r in regions.items()}
+        store._regions = regions
+        return store
+
+    def merge(self, other):
+        '''Append the features of another store in place.
+
+        Parameters
+        ----------
+        other : ``FeatureStore``
+
+        Returns
+        -------
+        ``FeatureStore``
+            self
+        '''
+        merged = self.concat([self, other], self.upper_bound)
+        self.upper_bound = merged.upper_bound
+        self.start = merged.start
+        self.end = merged.end
+        self._columns = merged._columns
+        self._regions = merged._regions
+        self._index = {}
+        return self
+
+
+def _position_order(start, end):
+    '''Return the order to sort the features by start and then end.'''
+    if len(start) == 0:
+        return np.zeros(0, dtype=np.int64)
+    m = int(end.max()) + 1
+    if m > 2 ** 31:
+        # the combined key below could overflow
+        return np.lexsort((end, start))
+    # combine into one key so numpy can use its stable sort, which takes
+    # advantage of the sorted runs in the data
+    return np.argsort(start * m + end, kind='stable')
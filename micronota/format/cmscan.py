@@ -6,40 +6,86 @@ from ..util import split, SplitterID
 
 cmscan = create_format('cmscan')
 
+# Rfam families of rRNA and the product names they map to
+# the products are named as by RNAmmer
+_RRNA = {'RF00001': '5s_rRNA',
+         'RF00002': '8s_rRNA',
+         'RF00177': '16s_rRNA',
+         'RF01959': '16s_rRNA',
+         'RF01960': '18s_rRNA',
+         'RF02540': '23s_rRNA',
+         'RF02541': '23s_rRNA',
+         'RF02543': '28s_rRNA'}
+
 
 @cmscan.reader(None)
-def _generator(fh):
+def _generator(fh, evalue=None, score=None, types=None, seq_ids=None):
+    '''Parse the cmscan tabular output.
+
+    The filtering parameters are applied to the raw columns of each hit
+    before any interval is created for it.
+
+    Parameters
+    ----------
+    fh : file object
+        the tabular output (``--tblout``) of cmscan
+    evalue : float, optional
+        only keep the hits with E-value not larger than this
+    score : float, optional
+        only keep the hits with bit score not smaller than this
+    types : set of str, optional
+        only keep the hits of these feature types (eg "rRNA", "ncRNA")
+    seq_ids : set of str, optional
+        only parse the hits on these sequences
+
+    Yield
+    -----
+    tuple of str and IntervalMetadata
+        seq_id and interval metadata
+    '''
+    if types is not None:
+        types = set(types)
+    if seq_ids is not None:
+        seq_ids = set(seq_ids)
     splitter = split(SplitterID(lambda s: s.split()[2]),
                      ignore=lambda s: s.startswith('#'))
     for lines in splitter(fh):
-        yield _parse_record(lines)
+        seq_id = lines[0].split()[2]
+        if seq_ids is not None and seq_id not in seq_ids:
+            continue
+        yield _parse_record(lines, evalue, score, types)
 
 
-def _parse_record(lines):
+def _parse_record(lines, evalue=None, score=None, types=None):
     '''Return interval metadata'''
     imd = IntervalMetadata(None)
     seq_id = lines[0].split()[2]
     for line in lines:
-        bounds, md = _parse_line(line)
+        items = line.split()
+        if evalue is not None and float(items[15]) > evalue:
+            continue
+        if score is not None and float(items[14]) < score:
+            continue
+        if types is not None and _type(items[1]) not in types:
+            continue
+        bounds, md = _parse_line(items)
         imd.add(bounds, metadata=md)
     return seq_id, imd
 
 
-def _parse_line(line):
-    items = line.split()
+def _type(fam_id):
+    if fam_id in _RRNA:
+        return 'rRNA'
+    return 'ncRNA'
+
+
+def _parse_line(items):
     fam_id = items[1]
-    md = {'source': 'Rfam', 'ncRNA_class': items[0], 'db_xref': fam_id}
-    if fam_id in {'RF00001', 'RF00177', 'RF02541', 'RF01959',
-                  'RF02540', 'RF00001', 'RF00002', 'RF01960', 'RF02543'}:
-        md['type'] = 'rRNA'
-        if fam_id == 'RF00001':
-            md['product'] = '5s_rRNA'
-        elif fam_id in {'RF00177', 'RF01959'}:
-            md['product'] = '16s_rRNA'
-        elif fam_id in {'RF02541', 'RF02540'}:
-            md['product'] = '23s_rRNA'
-    else:
-        md['type'] = 'ncRNA'
+    md = {'source': 'Rfam', 'ncRNA_class': items[0], 'db_xref': fam_id, 'score': items[14]}
+    md['type'] = _type(fam_id)
+    product = _RRNA.get(fam_id)
+    if product is not None:
+        md['product'] = product
 
     strand = items[9]
     md['strand'] = strand
@@ -50,6 +96,5 @@ def _parse_line(line):
         start = int(items[8]) - 1
         end = int(items[7])
     else:
-        raise ValueError('Unknown strand for the ncRNA: %s' % line)
+        raise ValueError('Unknown strand for the ncRNA: %s' % ' '.join(items))
     return [(start, end)], md
-
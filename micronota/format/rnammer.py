@@ -18,38 +18,58 @@ rnammer = create_format('rnammer')
 
 
 @rnammer.reader(None)
-def _generator(fh):
+def _generator(fh, score=None, types=None, seq_ids=None):
     '''Parse the annotation and add it to interval metadata.
 
+    The filtering parameters are applied to the raw columns of each
+    prediction before any interval is created for it.
+
     Parameters
     ----------
     fn : str
         the file name from RNAmmer prediction
+    score : float, optional
+        only keep the predictions with score not smaller than this
+    types : set of str, optional
+        only keep the predictions of these feature types
+    seq_ids : set of str, optional
+        only parse the predictions on these sequences
 
     Yield
     -----
     tuple of str and IntervalMetadata
         seq_id and interval metadata
     '''
+    if types is not None:
+        types = set(types)
+    if seq_ids is not None:
+        seq_ids = set(seq_ids)
     splitter = split(SplitterID(lambda s: s.split('\t')[0]),
                      construct=lambda s: s.strip(),
                      ignore=lambda s: s.startswith('#'))
     for lines in splitter(fh):
-        yield _parse_record(lines)
+        seq_id = lines[0].split('\t')[0]
+        if seq_ids is not None and seq_id not in seq_ids:
+            continue
+        yield _parse_record(lines, score, types)
 
 
-def _parse_record(lines):
+def _parse_record(lines, score=None, types=None):
     imd = IntervalMetadata(None)
     seq_id = lines[0].split('\t')[0]
     for line in lines:
-        bounds, md = _parse_line(line)
+        items = line.split('\t')
+        if score is not None and float(items[5]) < score:
+            continue
+        if types is not None and items[2] not in types:
+            continue
+        bounds, md = _parse_line(items)
         imd.add(bounds, metadata=md)
     return seq_id, imd
 
 
-def _parse_line(line):
+def _parse_line(items):
     md = {}
-    items = line.split('\t')
     md['source'] = items[1]
     md['type'] = items[2]
     md['score'] = items[5]
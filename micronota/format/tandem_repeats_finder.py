@@ -6,44 +6,53 @@
 # The full license is in the file COPYING.txt, distributed with this software.
 # ----------------------------------------------------------------------------
 
+from os.path import abspath
+
 from skbio.metadata import IntervalMetadata
 from skbio.io import create_format
 
-from ..util import split, split_head
+from ..util import split, split_head, offset_lines, LazyString
 
 
 tandem_repeats_finder = create_format('tandem_repeats_finder')
 
 @tandem_repeats_finder.reader(None)
-def _generator(fh):
+def _generator(fh, lazy=False):
     '''Parse the annotation and add it to interval metadata.
 
     Parameters
     ----------
     fp : str
         the file path from Tandem Repeat Finder prediction
+    lazy : bool
+        whether to store the repeat as a ``LazyString`` referencing the
+        file instead of reading it into memory.
 
     Yield
     -----
     tuple of str and IntervalMetadata
         seq_id and interval metadata
     '''
+    fp = None
+    if lazy:
+        fp = abspath(fh.name)
+        fh = offset_lines(fh)
     splitter = split(split_head, is_head=lambda line: line.startswith('@'))
     for lines in splitter(fh):
         sid = lines[0].split(None, 1)[0][1:]
-        yield sid, _parse_record(lines[1:])
+        yield sid, _parse_record(lines[1:], fp)
 
 
-def _parse_record(lines):
+def _parse_record(lines, fp=None):
     '''Return interval metadata.'''
     imd = IntervalMetadata(None)
     for line in lines:
-        bounds, md = _parse_line(line)
+        bounds, md = _parse_line(line, fp)
         imd.add(bounds, metadata=md)
     return imd
 
 
-def _parse_line(line):
+def _parse_line(line, fp=None):
     # the table has following columns:
     # Indices of the repeat relative to the start of the sequence.
     # Period size of the repeat.
@@ -58,7 +67,13 @@ def _parse_line(line):
     # the actual sequence has all the repeats
     # left and right flanking sequences
     items = line.split(' ')
-    md = {'repeat': items[13], 'type': 'tandem_repeat', 'source': 'Tandem_Repeats_Finder'}
+    if fp is None:
+        repeat = items[13]
+    else:
+        # the columns are separated by single spaces
+        offset = line.offset + sum(len(i) for i in items[:13]) + 13
+        repeat = LazyString(fp, offset, len(items[13]))
+    md = {'repeat': repeat, 'type': 'tandem_repeat', 'source': 'Tandem_Repeats_Finder'}
     start = int(items[0]) - 1
     end = int(items[1])
     return [(start, end)], md
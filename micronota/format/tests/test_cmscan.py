@@ -19,18 +19,18 @@ class Tests(TestCase):
         imd1 = IntervalMetadata(None)
         imd1.add(bounds=[(3588441, 3588818)],
                  metadata={'ncRNA_class': 'RNaseP_bact_a', 'type': 'ncRNA', 'strand': '-',
-                           'db_xref': 'RF00010', 'source': 'Rfam'})
+                           'db_xref': 'RF00010', 'source': 'Rfam', 'score': '312.6'})
         imd1.add(bounds=[(3355449, 3355633)],
                  metadata={'ncRNA_class': '5S_rRNA', 'type': 'rRNA', 'strand': '+',
-                           'product': '5s_rRNA', 'db_xref': 'RF00001', 'source': 'Rfam'})
+                           'product': '5s_rRNA', 'db_xref': 'RF00001', 'source': 'Rfam', 'score': '129.5'})
         imd2 = IntervalMetadata(None)
         imd2.add(bounds=[(85215, 85384)],
                  metadata={'ncRNA_class': 'LSU_rRNA_bacteria', 'type': 'rRNA', 'strand': '+',
-                           'product': '23s_rRNA', 'db_xref': 'RF02541', 'source': 'Rfam'})
+                           'product': '23s_rRNA', 'db_xref': 'RF02541', 'source': 'Rfam', 'score': '27.1'})
         imd3 = IntervalMetadata(None)
         imd3.add(bounds=[(8739, 8777)],
                  metadata={'ncRNA_class': 'SSU_rRNA_bacteria', 'type': 'rRNA', 'strand': '+',
-                           'product': '16s_rRNA', 'db_xref': 'RF00177', 'source': 'Rfam'})
+                           'product': '16s_rRNA', 'db_xref': 'RF00177', 'source': 'Rfam', 'score': '6.3'})
         exp = (('NC_016822.1', imd1),
                ('NC_016833.1', imd2),
                ('NC_016834.1', imd3))
@@ -42,6 +42,19 @@ class Tests(TestCase):
             self.assertEqual(exp_id, obs_id)
             self.assertEqual(exp_imd, obs_imd)
 
+    def test_parse_filter(self):
+        fp = get_data_path('cmscan.txt')
+        obs = {sid: imd.num_interval_features
+               for sid, imd in _generator(fp, evalue=0.01)}
+        self.assertEqual(obs, {'NC_016822.1': 2, 'NC_016833.1': 1, 'NC_016834.1': 0})
+
+        obs = {sid: imd.num_interval_features
+               for sid, imd in _generator(fp, score=100, types={'rRNA'})}
+        self.assertEqual(obs, {'NC_016822.1': 1, 'NC_016833.1': 0, 'NC_016834.1': 0})
+
+        obs = [sid for sid, _ in _generator(fp, seq_ids={'NC_016833.1'})]
+        self.assertEqual(obs, ['NC_016833.1'])
+
 
 if __name__ == '__main__':
     main()
@@ -38,6 +38,16 @@ class ParseTests(TestCase):
             self.assertEqual(exp_id, obs_id)
             self.assertEqual(exp_imd, obs_imd)
 
+    def test_parse_filter(self):
+        fp = get_data_path('rnammer.gff')
+        obs = {sid: imd.num_interval_features
+               for sid, imd in _generator(fp, score=100)}
+        self.assertEqual(obs, {'NZ_JXDA01000005.1': 1, 'NZ_JXDA01000001.1': 1})
+
+        obs = {sid: imd.num_interval_features
+               for sid, imd in _generator(fp, seq_ids={'NZ_JXDA01000005.1'})}
+        self.assertEqual(obs, {'NZ_JXDA01000005.1': 2})
+
 
 if __name__ == '__main__':
     main()
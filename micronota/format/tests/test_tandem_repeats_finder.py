@@ -12,6 +12,7 @@ from skbio.util import get_data_path
 from skbio.metadata import IntervalMetadata
 
 from micronota.format.tandem_repeats_finder import _generator
+from micronota.util import LazyString
 
 
 class Tests(TestCase):
@@ -33,6 +34,16 @@ class Tests(TestCase):
             self.assertEqual(exp_id, obs_id)
             self.assertEqual(exp_imd, obs_imd)
 
+    def test_parse_lazy(self):
+        fp = get_data_path('tandem_repeats_finder.txt')
+        with open(fp) as fh:
+            obs = list(_generator(fh, lazy=True))
+        for (exp_id, exp_imd), (obs_id, obs_imd) in zip(_generator(fp), obs):
+            self.assertEqual(exp_id, obs_id)
+            self.assertEqual(exp_imd, obs_imd)
+            for intvl in obs_imd._intervals:
+                self.assertIsInstance(intvl.metadata['repeat'], LazyString)
+
 
 if __name__ == '__main__':
     main()
@@ -12,6 +12,7 @@ from skbio.util import get_data_path
 from skbio.metadata import IntervalMetadata
 
 from micronota.format.transtermhp import _generator
+from micronota.util import LazyString
 
 
 class ParseTests(TestCase):
@@ -51,6 +52,26 @@ class ParseTests(TestCase):
                               'type': 'terminator'})
         self.assertEqual(exp_imd, imd)
 
+    def test_parse_lazy(self):
+        fp = get_data_path('transtermhp.tt')
+        with open(fp) as fh:
+            obs = list(_generator(fh, lazy=True))
+        for (exp_id, exp_imd), (obs_id, obs_imd) in zip(_generator(fp), obs):
+            self.assertEqual(exp_id, obs_id)
+            self.assertEqual(exp_imd, obs_imd)
+            for intvl in obs_imd._intervals:
+                self.assertIsInstance(intvl.metadata['sequence'], LazyString)
+
+    def test_parse_filter(self):
+        fp = get_data_path('transtermhp.tt')
+        obs = [(sid, imd.num_interval_features)
+               for sid, imd in _generator(fp, confidence=100)]
+        self.assertEqual(obs, [('gi|556503834|ref|NC_000913.3|1', 7),
+                               ('gi|556503834|ref|NC_000913.3|2', 2)])
+
+        obs = [sid for sid, _ in _generator(fp, seq_ids={'gi|556503834|ref|NC_000913.3|2'})]
+        self.assertEqual(obs, ['gi|556503834|ref|NC_000913.3|2'])
+
 
 if __name__ == '__main__':
     main()
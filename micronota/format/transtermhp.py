@@ -7,30 +7,47 @@
 # ----------------------------------------------------------------------------
 
 import re
+from os.path import abspath
 
 from skbio.metadata import IntervalMetadata
 from skbio.io import create_format
 
-from ..util import split, split_head
+from ..util import split, split_head, offset_lines, LazyString
 
 
 transtermhp = create_format('transtermhp')
 
 
 @transtermhp.reader(None)
-def _generator(fh):
+def _generator(fh, confidence=None, seq_ids=None, lazy=False):
     '''Parse the annotation and add it to interval metadata.
 
+    The filtering parameters are applied to the raw columns of each
+    terminator before any interval is created for it.
+
     Parameters
     ----------
     f : str
         the file path from prediction
+    confidence : int, optional
+        only keep the terminators with confidence not smaller than this
+    seq_ids : set of str, optional
+        only parse the terminators on these sequences
+    lazy : bool
+        whether to store the hairpin sequence as a ``LazyString``
+        referencing the file instead of reading it into memory.
 
     Yield
     -----
     tuple of str and IntervalMetadata
         seq_id and interval metadata
     '''
+    if seq_ids is not None:
+        seq_ids = set(seq_ids)
+    fp = None
+    if lazy:
+        fp = abspath(fh.name)
+        fh = offset_lines(fh)
     p = re.compile(r'Genes are interspersed, and start the first column.')
     p2 = re.compile(r'SEQUENCE ')
     splitter = split(split_head, ignore=lambda s: not s.strip(),
@@ -40,10 +57,12 @@ def _generator(fh):
         if p.match(line):
             break
     for lines in splitter(fh):
-        yield _parse_record(lines)
+        if seq_ids is not None and lines[0].split()[1] not in seq_ids:
+            continue
+        yield _parse_record(lines, confidence, fp)
 
 
-def _parse_record(lines):
+def _parse_record(lines, confidence=None, fp=None):
     sid = lines[0].split()[1]
     splitter = split(split_head,
                      is_head=lambda s: not s.startswith('  '))
@@ -56,9 +75,16 @@ def _parse_record(lines):
         it = iter(gene[1:])
         for term in it:
             items = term.split()
-            term_id = '%s_%s' % (items[0], items[1])
             hair_pin_seq = next(it)
-            hair_pin_seq = '/'.join(hair_pin_seq.split())
+            if confidence is not None and int(items[7]) < confidence:
+                continue
+            term_id = '%s_%s' % (items[0], items[1])
+            if fp is None:
+                hair_pin_seq = '/'.join(hair_pin_seq.split())
+            else:
+                indent = len(hair_pin_seq) - len(hair_pin_seq.lstrip())
+                hair_pin_seq = LazyString(fp, hair_pin_seq.offset + indent,
+                                          len(hair_pin_seq.strip()), sep='/')
             start, end = int(items[2]), int(items[4])
             strand = items[5]
             if strand == '-':
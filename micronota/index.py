@@ -0,0 +1,286 @@
+r'''
+Indexed annotation
+==================
+
+.. currentmodule:: micronota.index
+
+This module (:mod:`micronota.index`) indexes the BGZF compressed,
+coordinate sorted GFF3 output for random access. Two indexes are
+written next to the GFF3 file:
+
+1. ``<file>.tbi``: the region index in the tabix format. The features
+   of each sequence are binned by position and each bin points to the
+   blocks of the file containing its features, so the tabix command
+   line and the other htslib based tools can also query the file.
+2. ``<file>.ids``: the virtual offsets of the features by their IDs, a
+   BGZF compressed tab delimited text file.
+
+:class:`IndexedGFF3` uses them to fetch the features in a region or
+of an ID without decompressing the whole file.
+'''
+
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, micronota development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import struct
+from logging import getLogger
+
+from .bgzf import BgzfWriter, BgzfReader
+
+
+logger = getLogger(__name__)
+
+
+# the size of the windows (16 kb) of the linear index
+_LINEAR_SHIFT = 14
+# the first bin and the bit shift at each of the 6 levels of bins
+_LEVELS = ((0, 29), (1, 26), (9, 23), (73, 20), (585, 17), (4681, 14))
+# the tabix preset of GFF: generic format; seq, start and end columns; "#" for comments
+_GFF_PRESET = (0, 1, 4, 5, ord('#'), 0)
+
+
+def reg2bin(beg, end):
+    '''Return the smallest bin containing the 0-based region [beg, end).
+
+    Examples
+    --------
+    >>> reg2bin(0, 100), reg2bin(16000, 17000), reg2bin(0, 2 ** 29)
+    (4681, 585, 0)
+    '''
+    end -= 1
+    for offset, shift in reversed(_LEVELS):
+        if beg >> shift == end >> shift:
+            return offset + (beg >> shift)
+    return 0
+
+
+def reg2bins(beg, end):
+    '''Return all the bins possibly overlapping the 0-based region [beg, end).'''
+    end -= 1
+    bins = []
+    for offset, shift in _LEVELS:
+        bins.extend(range(offset + (beg >> shift), offset + (end >> shift) + 1))
+    return bins
+
+
+class _RefIndex:
+    '''The bins and the linear index of the features on a sequence.'''
+    __slots__ = ('bins', 'linear')
+
+    def __init__(self, bins=None, linear=None):
+        self.bins = {} if bins is None else bins
+        self.linear = [] if linear is None else linear
+
+    def add(self, beg, end, vbeg, vend):
+        '''Add a feature at [beg, end) written at [vbeg, vend) of the file.'''
+        chunks = self.bins.setdefault(reg2bin(beg, end), [])
+        if chunks and chunks[-1][1] == vbeg:
+            # merge with the previous chunk if they are adjacent
+            chunks[-1][1] = vend
+        else:
+            chunks.append([vbeg, vend])
+        linear = self.linear
+        last = (end - 1) >> _LINEAR_SHIFT
+        if len(linear) <= last:
+            linear.extend([None] * (last + 1 - len(linear)))
+        for w in range(beg >> _LINEAR_SHIFT, last + 1):
+            if linear[w] is None or linear[w] > vbeg:
+                linear[w] = vbeg
+
+    def finish(self):
+        '''Fill the empty windows of the linear index.'''
+        linear = self.linear
+        prev = next((v for v in linear if v is not None), 0)
+        for i, v in enumerate(linear):
+            if v is None:
+                linear[i] = prev
+            else:
+                prev = v
+
+
+class TabixIndexer:
+    '''Build the tabix index of a coordinate sorted BGZF file.
+
+    Call :meth:`add` for each feature in the order they are written.
+    '''
+    def __init__(self):
+        self.names = []
+        self.refs = []
+
+    def add(self, seq_id, beg, end, vbeg, vend):
+        if not self.names or self.names[-1] != seq_id:
+            self.names.append(seq_id)
+            self.refs.append(_RefIndex())
+        self.refs[-1].add(beg, end, vbeg, vend)
+
+    def write(self, fp):
+        names = b''.join(n.encode() + b'\0' for n in self.names)
+        with BgzfWriter(fp) as out:
+            out.write(b'TBI\1')
+            out.write(struct.pack('<i', len(self.refs)))
+            out.write(struct.pack('<6i', *_GFF_PRESET))
+            out.write(struct.pack('<i', len(names)))
+            out.write(names)
+            for ref in self.refs:
+                ref.finish()
+                out.write(struct.pack('<i', len(ref.bins)))
+                for b in sorted(ref.bins):
+                    chunks = ref.bins[b]
+                    out.write(struct.pack('<Ii', b, len(chunks)))
+                    out.write(struct.pack('<%dQ' % (2 * len(chunks)), *[v for c in chunks for v in c]))
+                out.write(struct.pack('<i', len(ref.linear)))
+                out.write(struct.pack('<%dQ' % len(ref.linear), *ref.linear))
+
+
+def read_tabix(fp):
+    '''Read a tabix index.
+
+    Returns
+    -------
+    dict
+        seq_id -> ``_RefIndex``
+    '''
+    with BgzfReader(fp) as fh:
+        data = fh.read()
+    if data[:4] != b'TBI\1':
+        raise ValueError('%s is not a tabix index.' % fp)
+    n_ref, = struct.unpack_from('<i', data, 4)
+    l_nm, = struct.unpack_from('<i', data, 32)
+    pos = 36 + l_nm
+    names = data[36:pos].split(b'\0')[:n_ref]
+    refs = {}
+    for name in names:
+        n_bin, = struct.unpack_from('<i', data, pos)
+        pos += 4
+        bins = {}
+        for _ in range(n_bin):
+            b, n_chunk = struct.unpack_from('<Ii', data, pos)
+            pos += 8
+            v = struct.unpack_from('<%dQ' % (2 * n_chunk), data, pos)
+            pos += 16 * n_chunk
+            bins[b] = [list(v[i:i + 2]) for i in range(0, len(v), 2)]
+        n_intv, = struct.unpack_from('<i', data, pos)
+        pos += 4
+        linear = list(struct.unpack_from('<%dQ' % n_intv, data, pos))
+        pos += 8 * n_intv
+        refs[name.decode()] = _RefIndex(bins, linear)
+    return refs
+
+
+class IndexedGFF3:
+    '''Random access to the features in an indexed GFF3 file.
+
+    Parameters
+    ----------
+    fp : str
+        the BGZF compressed GFF3 file with its ``.tbi`` and ``.ids``
+        indexes next to it.
+
+    Examples
+    --------
+    >>> import os, tempfile
+    >>> from skbio.metadata import IntervalMetadata
+    >>> from micronota.features import FeatureStore
+    >>> from micronota.output import write_gff3
+    >>> imd = IntervalMetadata(None)
+    >>> _ = imd.add([(0, 90)], metadata={'type': 'CDS', 'ID': 'seq1_1'})
+    >>> _ = imd.add([(100, 180)], metadata={'type': 'tRNA'})
+    >>> fp = os.path.join(tempfile.mkdtemp(), 'a.gff3.gz')
+    >>> write_gff3([('seq1', FeatureStore.from_interval_metadata(imd))], fp, index=True)
+    >>> with IndexedGFF3(fp) as gff:  # doctest: +NORMALIZE_WHITESPACE
+    ...     for line in gff.fetch('seq1', 95, 200):
+    ...         print(line)
+    ...     print(gff.get('seq1_1'))
+    seq1	.	tRNA	101	180	.	.	.
+    seq1	.	CDS	1	90	.	.	.	ID=seq1_1
+    '''
+    def __init__(self, fp):
+        self._fp = fp
+        self._refs = read_tabix(fp + '.tbi')
+        self._ids = None
+        self._fh = BgzfReader(fp)
+
+    @property
+    def seq_ids(self):
+        return list(self._refs)
+
+    def _chunks(self, seq_id, beg, end):
+        ref = self._refs.get(seq_id)
+        if ref is None:
+            return []
+        w = beg >> _LINEAR_SHIFT
+        if w >= len(ref.linear):
+            return []
+        # no feature overlapping the region is written before this offset
+        min_off = ref.linear[w]
+        chunks = sorted(c for b in reg2bins(beg, end) for c in ref.bins.get(b, ())
+                        if c[1] > min_off)
+        merged = []
+        for vbeg, vend in chunks:
+            vbeg = max(vbeg, min_off)
+            if merged and vbeg <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], vend)
+            else:
+                merged.append([vbeg, vend])
+        return merged
+
+    def fetch(self, seq_id, beg=0, end=None):
+        '''Yield the GFF3 lines of the features overlapping a region.
+
+        Parameters
+        ----------
+        seq_id : str
+            the sequence ID
+        beg, end : int
+            the 0-based region [beg, end). Default to the whole sequence.
+
+        Yields
+        ------
+        str
+            the GFF3 line without the line break
+        '''
+        if end is None:
+            end = 1 << 29
+        for vbeg, vend in self._chunks(seq_id, beg, end):
+            self._fh.seek(vbeg)
+            while self._fh.tell() < vend:
+                line = self._fh.readline()
+                if not line:
+                    break
+                items = line.decode().rstrip('\n').split('\t')
+                if items[0] != seq_id:
+                    continue
+                start, stop = int(items[3]) - 1, int(items[4])
+                if start >= end:
+                    # the features are sorted by start
+                    break
+                if stop > beg:
+                    yield '\t'.join(items)
+
+    def get(self, feature_id):
+        '''Return the GFF3 line of the feature with the ID or ``None``.'''
+        if self._ids is None:
+            self._ids = {}
+            with BgzfReader(self._fp + '.ids') as fh:
+                for line in fh:
+                    k, v = line.decode().rstrip('\n').split('\t')
+                    self._ids[k] = int(v)
+        voffset = self._ids.get(feature_id)
+        if voffset is None:
+            return None
+        self._fh.seek(voffset)
+        return self._fh.readline().decode().rstrip('\n')
+
+    def close(self):
+        self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,288 @@
+r'''
+Count matrices
+==============
+
+.. currentmodule:: micronota.matrix
+
+This module (:mod:`micronota.matrix`) aggregates the annotation of many
+genomes into two sparse count matrices with a row per genome:
+
+* the feature type matrix with a column per feature type (eg "CDS" and
+  "tRNA");
+* the function matrix with a column per cross reference of the features
+  (eg "KEGG:K00001" and "Pfam:PF00001").
+
+They are built from the GFF3 outputs of micronota (plain, gzip or BGZF
+compressed) or from its columnar dataset in one streaming pass per
+genome, with the genomes read in parallel. The matrices are stored as
+CSR matrices with their row and column labels and new genomes can be
+appended to them.
+'''
+
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, micronota development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from collections import Counter
+from multiprocessing import Pool
+from os import listdir
+from os.path import basename, join, isdir
+from urllib.parse import unquote
+from logging import getLogger
+
+import numpy as np
+from scipy import sparse
+
+from .compress import open_file
+
+
+logger = getLogger(__name__)
+
+
+class CountMatrix:
+    '''Sparse count matrix with row and column labels.
+
+    Parameters
+    ----------
+    matrix : ``scipy.sparse.csr_matrix``
+    rows : list of str
+        the row labels (eg genomes)
+    columns : list of str
+        the column labels (eg feature types)
+
+    Examples
+    --------
+    >>> m = CountMatrix.from_counts([('g1', {'CDS': 3, 'tRNA': 1}), ('g2', {'CDS': 2})])
+    >>> m.rows, m.columns
+    (['g1', 'g2'], ['CDS', 'tRNA'])
+    >>> m.matrix.toarray().tolist()
+    [[3, 1], [2, 0]]
+    >>> m.append([('g3', {'rRNA': 2})])
+    >>> m.columns, m.row('g3')
+    (['CDS', 'tRNA', 'rRNA'], {'rRNA': 2})
+    '''
+    def __init__(self, matrix, rows, columns):
+        if matrix.shape != (len(rows), len(columns)):
+            raise ValueError('The shape of the matrix %r does not match the labels.' % (matrix.shape,))
+        self.matrix = sparse.csr_matrix(matrix)
+        self.rows = list(rows)
+        self.columns = list(columns)
+        self._row_index = {k: i for i, k in enumerate(self.rows)}
+        self._column_index = {k: i for i, k in enumerate(self.columns)}
+
+    @classmethod
+    def from_counts(cls, counts):
+        '''Create it from an iterable of row label and dict of column label to count.'''
+        m = cls(sparse.csr_matrix((0, 0), dtype=np.int64), [], [])
+        m.append(counts)
+        return m
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, row):
+        return row in self._row_index
+
+    def row(self, label):
+        '''Return the non-zero counts of a row as dict.'''
+        r = self.matrix.getrow(self._row_index[label])
+        return {self.columns[j]: int(v) for j, v in zip(r.indices.tolist(), r.data.tolist())}
+
+    def append(self, counts):
+        '''Append rows from an iterable of row label and dict of column label to count.
+
+        The new columns are appended after the existing ones, so the
+        existing rows keep their column indices.
+
+        Raises
+        ------
+        ValueError
+            if a row label already exists.
+        '''
+        indptr, indices, data = [0], [], []
+        rows = []
+        for label, row in counts:
+            if label in self._row_index or label in rows:
+                raise ValueError('The row %r already exists.' % label)
+            rows.append(label)
+            for column, count in row.items():
+                j = self._column_index.get(column)
+                if j is None:
+                    j = self._column_index[column] = len(self.columns)
+                    self.columns.append(column)
+                indices.append(j)
+                data.append(count)
+            indptr.append(len(indices))
+        new = sparse.csr_matrix(
+            (np.array(data, dtype=np.int64), np.array(indices, dtype=np.int64), np.array(indptr)),
+            shape=(len(rows), len(self.columns)))
+        old = self.matrix
+        old.resize((old.shape[0], len(self.columns)))
+        self.matrix = sparse.vstack([old, new], format='csr')
+        self.matrix.sort_indices()
+        for label in rows:
+            self._row_index[label] = len(self.rows)
+            self.rows.append(label)
+
+    def save(self, fp):
+        '''Save it to a .npz file.'''
+        m = self.matrix
+        np.savez_compressed(fp, data=m.data, indices=m.indices, indptr=m.indptr,
+                            shape=np.array(m.shape), rows=np.array(self.rows, dtype=str),
+                            columns=np.array(self.columns, dtype=str))
+
+    @classmethod
+    def load(cls, fp):
+        '''Load it from the .npz file written by ``save``.'''
+        with np.load(fp) as f:
+            matrix = sparse.csr_matrix((f['data'], f['indices'], f['indptr']), shape=tuple(f['shape']))
+            return cls(matrix, f['rows'].tolist(), f['columns'].tolist())
+
+
+def _keep(xref, dbs):
+    return dbs is None or xref.split(':', 1)[0] in dbs
+
+
+def count_gff3(fp, dbs=None):
+    '''Count the feature types and cross references in a GFF3 file.
+
+    Parameters
+    ----------
+    fp : str
+        the GFF3 file. It can be gzip or bzip2 compressed.
+    dbs : set of str, optional
+        the databases of the cross references to count (eg "KEGG" and
+        "Pfam"). Default is all.
+
+    Returns
+    -------
+    tuple of ``Counter``
+        the counts of the feature types and of the cross references
+    '''
+    types = Counter()
+    functions = Counter()
+    with open_file(fp) as fh:
+        for line in fh:
+            if line.startswith('##FASTA'):
+                break
+            if line.startswith('#') or not line.strip():
+                continue
+            items = line.rstrip('\n').split('\t')
+            types[items[2]] += 1
+            if 'Dbxref=' not in items[8]:
+                continue
+            for attr in items[8].split(';'):
+                if attr.startswith('Dbxref='):
+                    functions.update(x for x in map(unquote, attr[7:].split(',')) if _keep(x, dbs))
+    return types, functions
+
+
+def count_columnar(out_dir, genome, dbs=None):
+    '''Count the feature types and cross references of a genome in the columnar dataset.
+
+    It only reads the "type" and "db_xref" columns of the genome
+    partition (see ``micronota.columnar``).
+    '''
+    from .columnar import _import_pyarrow
+    pa, pq = _import_pyarrow()
+    import pyarrow.compute as pc
+    d = join(out_dir, 'features', 'genome=%s' % genome)
+    table = pq.read_table(d, columns=['type', 'db_xref'])
+    types = Counter()
+    for item in pc.value_counts(table.column('type').cast(pa.string())).to_pylist():
+        types[item['values']] += item['counts']
+    functions = Counter()
+    xref = pc.list_flatten(table.column('db_xref'))
+    for item in pc.value_counts(xref).to_pylist():
+        if _keep(item['values'], dbs):
+            functions[item['values']] += item['counts']
+    return types, functions
+
+
+def genome_name(fp):
+    '''Return the genome name of a GFF3 file, ie its base name without suffixes.
+
+    >>> genome_name('out/GCF_000010365.1.gff3.gz')
+    'GCF_000010365.1'
+    '''
+    name = basename(fp)
+    for suffix in ('.gz', '.bz2', '.gff3', '.gff'):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    return name
+
+
+def _count(args):
+    kind, source, genome, dbs = args
+    if kind == 'columnar':
+        types, functions = count_columnar(source, genome, dbs)
+    else:
+        types, functions = count_gff3(source, dbs)
+    return genome, types, functions
+
+
+def _inputs(gff3=(), columnar=None):
+    '''Yield the kind, source and genome name of each input genome.'''
+    for fp in gff3:
+        yield 'gff3', fp, genome_name(fp)
+    if columnar is not None:
+        d = join(columnar, 'features')
+        for part in sorted(listdir(d)):
+            if part.startswith('genome=') and isdir(join(d, part)):
+                yield 'columnar', columnar, part[len('genome='):]
+
+
+def build_matrices(gff3=(), columnar=None, dbs=None, cpus=1, types=None, functions=None):
+    '''Build (or extend) the feature type and function count matrices.
+
+    Parameters
+    ----------
+    gff3 : Iterable of str
+        the GFF3 output files, one per genome
+    columnar : str, optional
+        the directory of the columnar dataset
+    dbs : set of str, optional
+        the databases of the cross references to count. Default is all.
+    cpus : int
+        the number of processes to read the genomes
+    types, functions : ``CountMatrix``, optional
+        the matrices to append the new genomes to. The genomes already in
+        them are skipped.
+
+    Returns
+    -------
+    tuple of ``CountMatrix``
+        the feature type matrix and the function matrix
+
+    Raises
+    ------
+    ValueError
+        if multiple inputs have the same genome name
+    '''
+    if types is None:
+        types = CountMatrix.from_counts([])
+    if functions is None:
+        functions = CountMatrix.from_counts([])
+    tasks = []
+    sources = {}
+    for kind, source, genome in _inputs(gff3, columnar):
+        # check the genome names before anything is counted
+        if genome in sources:
+            raise ValueError('The genome %s is both in %s and %s.' % (genome, sources[genome], source))
+        sources[genome] = source
+        if genome in types:
+            logger.info('skip %s that is already in the matrices' % genome)
+            continue
+        tasks.append((kind, source, genome, dbs))
+    if cpus > 1:
+        with Pool(cpus) as pool:
+            results = pool.map(_count, tasks, chunksize=max(len(tasks) // (cpus * 4), 1))
+    else:
+        results = [_count(i) for i in tasks]
+    types.append((g, t) for g, t, _ in results)
+    functions.append((g, f) for g, _, f in results)
+    return types, functions
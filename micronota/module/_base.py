@@ -13,6 +13,11 @@ import re
 
 
 class BaseMod(ABC):
+    # whether ``parse`` accepts ``lazy=True`` to keep heavy metadata on disk
+    lazy = False
+    # the keyword arguments of ``parse`` to filter the annotation with
+    filters = ()
+
     def __init__(self, directory, file_patterns):
         self.result = {}
         self.report = {}
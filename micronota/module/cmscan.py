@@ -12,13 +12,27 @@ from . import BaseMod
 
 
 class Module(BaseMod):
+    filters = ('evalue', 'score', 'types', 'seq_ids')
+
     def __init__(self, directory, file_patterns=None):
         if file_patterns is None:
             file_patterns = {'txt': 'cmscan.txt'}
         super().__init__(directory, file_patterns)
 
-    def parse(self):
-        '''Parse the annotation and add it to interval metadata. '''
-        for seqid, imd in read(self.files['txt'], format='cmscan'):
+    def parse(self, **kwargs):
+        '''Parse the annotation and add it to interval metadata.
+
+        Parameters
+        ----------
+        evalue : float, optional
+            only keep the hits with E-value not larger than this
+        score : float, optional
+            only keep the hits with bit score not smaller than this
+        types : Iterable of str, optional
+            only keep the hits of these feature types
+        seq_ids : Iterable of str, optional
+            only parse the hits on these sequences
+        '''
+        for seqid, imd in read(self.files['txt'], format='cmscan', **kwargs):
             self.result[seqid] = imd
 
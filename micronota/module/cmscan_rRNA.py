@@ -0,0 +1,16 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, micronota development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from . import cmscan
+
+
+class Module(cmscan.Module):
+    def __init__(self, directory, file_patterns=None):
+        if file_patterns is None:
+            file_patterns = {'txt': 'cmscan_rRNA.txt'}
+        super().__init__(directory, file_patterns)
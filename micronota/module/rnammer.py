@@ -12,12 +12,24 @@ from . import BaseMod
 
 
 class Module(BaseMod):
+    filters = ('score', 'types', 'seq_ids')
+
     def __init__(self, directory, file_patterns=None):
         if file_patterns is None:
             file_patterns = {'gff': 'rnammer.gff'}
         super().__init__(directory, file_patterns)
 
-    def parse(self):
-        '''Parse the annotation and add it to interval metadata. '''
-        for seqid, imd in read(self.files['gff'], format='rnammer'):
+    def parse(self, **kwargs):
+        '''Parse the annotation and add it to interval metadata.
+
+        Parameters
+        ----------
+        score : float, optional
+            only keep the predictions with score not smaller than this
+        types : Iterable of str, optional
+            only keep the predictions of these feature types
+        seq_ids : Iterable of str, optional
+            only parse the predictions on these sequences
+        '''
+        for seqid, imd in read(self.files['gff'], format='rnammer', **kwargs):
             self.result[seqid] = imd
@@ -12,12 +12,20 @@ from . import BaseMod
 
 
 class Module(BaseMod):
+    lazy = True
+
     def __init__(self, directory, file_patterns=None):
         if file_patterns is None:
             file_patterns = {'txt': 'tandem_repeats_finder.txt'}
         super().__init__(directory, file_patterns)
 
-    def parse(self):
-        '''Parse the annotation and add it to interval metadata. '''
-        for seqid, imd in read(self.files['txt'], format='tandem_repeats_finder'):
+    def parse(self, **kwargs):
+        '''Parse the annotation and add it to interval metadata.
+
+        Parameters
+        ----------
+        lazy : bool, optional
+            keep the repeat sequences on disk until they are written out
+        '''
+        for seqid, imd in read(self.files['txt'], format='tandem_repeats_finder', **kwargs):
             self.result[seqid] = imd
@@ -12,14 +12,27 @@ from . import BaseMod
 
 
 class Module(BaseMod):
+    lazy = True
+    filters = ('confidence', 'seq_ids')
+
     def __init__(self, directory, file_patterns=None):
         if file_patterns is None:
             file_patterns = {'txt': 'transtermhp.txt'}
         super().__init__(directory, file_patterns)
 
-    def parse(self):
-        '''Parse the annotation and add it to interval metadata. '''
-        for seqid, imd in read(self.files['txt'], format='transtermhp'):
+    def parse(self, **kwargs):
+        '''Parse the annotation and add it to interval metadata.
+
+        Parameters
+        ----------
+        confidence : int, optional
+            only keep the terminators with confidence not smaller than this
+        seq_ids : Iterable of str, optional
+            only parse the terminators on these sequences
+        lazy : bool, optional
+            keep the hairpin sequences on disk until they are written out
+        '''
+        for seqid, imd in read(self.files['txt'], format='transtermhp', **kwargs):
             self.result[seqid] = imd
 
 
@@ -0,0 +1,264 @@
+r'''
+Annotation output
+=================
+
+.. currentmodule:: micronota.output
+
+This module (:mod:`micronota.output`) writes the integrated annotation
+stored in ``FeatureStore`` objects to files.
+'''
+
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, micronota development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import io
+from collections.abc import Iterable
+from contextlib import contextmanager
+from copy import copy
+from itertools import repeat, islice
+from logging import getLogger
+from multiprocessing import Pool
+from time import gmtime, strftime
+
+import numpy as np
+from skbio import write
+
+from . import __version__
+from .bgzf import BgzfWriter
+from .compress import open_file
+from .index import TabixIndexer
+
+
+logger = getLogger(__name__)
+
+
+# the metadata written to GFF3 columns instead of the attribute column
+_GFF3_COLUMNS = ('source', 'type', 'score', 'strand', 'phase')
+# the metadata not written to GFF3
+_GFF3_SKIP = {'translation'}
+# the metadata keys renamed in GFF3 attributes
+_GFF3_KEYS = {'db_xref': 'Dbxref', 'note': 'Note'}
+# these characters have reserved meanings in column 9 and must be escaped
+_GFF3_ESCAPE = str.maketrans({';': '%3B', '=': '%3D', '&': '%26', ',': '%2C'})
+
+
+@contextmanager
+def open_output(out, mode='w'):
+    '''Open the output file, compressing it according to its suffix.
+
+    Parameters
+    ----------
+    out : str or file object
+        If it is a file path ending with ".gz" or ".bz2", the output
+        is compressed with gzip or bzip2 on multiple cores (see
+        ``micronota.compress``). A file object is yielded as is.
+    mode : str
+        "w" for text or "wb" for binary output
+    '''
+    if not isinstance(out, str):
+        yield out
+        return
+    with open_file(out, mode) as fh:
+        yield fh
+
+
+def _gff3_value(v):
+    if isinstance(v, str):
+        return v.translate(_GFF3_ESCAPE)
+    if isinstance(v, Iterable):
+        return ','.join(str(i).translate(_GFF3_ESCAPE) for i in v)
+    return str(v).translate(_GFF3_ESCAPE)
+
+
+def _gff3_lines(seq_id, fs):
+    '''Return the GFF3 lines (without line breaks) of the features on a sequence.'''
+    n = len(fs)
+    if n == 0:
+        return []
+    # format each distinct value only once and then pick it with the codes
+    columns = []
+    for k in _GFF3_COLUMNS:
+        codes, cat = fs.codes(k)
+        strs = np.array([str(v) for v in cat] + ['.'], dtype=object)
+        columns.append(strs[codes])
+    attrs = []
+    for k in sorted(fs.keys):
+        if k in _GFF3_SKIP or k in _GFF3_COLUMNS:
+            continue
+        codes, cat = fs.codes(k)
+        name = _GFF3_KEYS.get(k, k).translate(_GFF3_ESCAPE) + '='
+        strs = np.array([name + _gff3_value(v) for v in cat] + [None], dtype=object)
+        attrs.append(strs[codes].tolist())
+    start = map(str, (fs.start + 1).tolist())
+    end = map(str, fs.end.tolist())
+    source, type_, score, strand, phase = [c.tolist() for c in columns]
+    if len(attrs) == 1:
+        attr = [a or '' for a in attrs[0]]
+    elif attrs:
+        attr = [';'.join(filter(None, row)) for row in zip(*attrs)]
+    else:
+        attr = repeat('', n)
+    return list(map('\t'.join, zip(repeat(seq_id, n), source, type_, start, end,
+                                   score, strand, phase, attr)))
+
+
+def write_gff3(features, out, chunk_size=100000, index=False):
+    '''Write the features to a GFF3 file.
+
+    It produces the same output as writing the converted
+    ``IntervalMetadata`` with the skbio GFF3 writer, but formats each
+    distinct metadata value only once and writes the lines in chunks.
+    With ``index``, it writes a BGZF compressed file sorted by position
+    and indexed for random access (see :mod:`micronota.index`).
+
+    Parameters
+    ----------
+    features : Iterable of tuple of str and ``FeatureStore``
+        seq_id and the features on it
+    out : str or file object
+        output file. It is compressed if its name ends with ".gz" or ".bz2".
+    chunk_size : int
+        the minimal number of lines to buffer before each write
+    index : bool
+        whether to write the BGZF compressed and indexed file. ``out``
+        must be a file path then.
+
+    Examples
+    --------
+    >>> import io
+    >>> from skbio.metadata import IntervalMetadata
+    >>> from micronota.features import FeatureStore
+    >>> imd = IntervalMetadata(None)
+    >>> _ = imd.add([(0, 90)], metadata={'type': 'CDS', 'strand': '+', 'ID': 'seq1_1',
+    ...                                  'db_xref': ['KEGG:K00001', 'Pfam:PF00001']})
+    >>> _ = imd.add([(100, 180)], metadata={'type': 'tRNA', 'source': 'Aragorn',
+    ...                                     'product': 'tRNA-Ala'})
+    >>> f = io.StringIO()
+    >>> write_gff3([('seq1', FeatureStore.from_interval_metadata(imd))], f)
+    >>> print(f.getvalue(), end='')  # doctest: +NORMALIZE_WHITESPACE
+    ##gff-version 3
+    seq1	.	CDS	1	90	.	+	.	ID=seq1_1;Dbxref=KEGG:K00001,Pfam:PF00001
+    seq1	Aragorn	tRNA	101	180	.	.	.	product=tRNA-Ala
+    '''
+    if index:
+        _write_indexed_gff3(features, out)
+        return
+    with open_output(out) as fh:
+        fh.write('##gff-version 3\n')
+        chunk = []
+        for seq_id, fs in features:
+            chunk.extend(_gff3_lines(seq_id, fs))
+            if len(chunk) >= chunk_size:
+                _write_lines(fh, chunk)
+                chunk = []
+        _write_lines(fh, chunk)
+
+
+def _write_lines(fh, lines):
+    if lines:
+        fh.write('\n'.join(lines))
+        fh.write('\n')
+
+
+def _write_indexed_gff3(features, out):
+    tabix = TabixIndexer()
+    ids = []
+    with BgzfWriter(out) as fh:
+        fh.write(b'##gff-version 3\n')
+        for seq_id, fs in features:
+            if np.any(np.diff(fs.start) < 0):
+                fs = fs.sort()
+            for beg, end, fid, line in zip(fs.start.tolist(), fs.end.tolist(), fs.values('ID'),
+                                           _gff3_lines(seq_id, fs)):
+                vbeg = fh.tell()
+                fh.write(line.encode() + b'\n')
+                tabix.add(seq_id, beg, end, vbeg, fh.tell())
+                if fid is not None:
+                    ids.append((str(fid), vbeg))
+    tabix.write(out + '.tbi')
+    with BgzfWriter(out + '.ids') as fh:
+        fh.write(''.join('%s\t%d\n' % i for i in ids).encode())
+
+
+# the sequences of the seq IDs to format in this process
+_genbank_seqs = None
+
+
+def _init_genbank(seqs):
+    global _genbank_seqs
+    _genbank_seqs = seqs
+
+
+def _format_genbank(record):
+    '''Return the GenBank record of a sequence and its features as str.'''
+    seq, fs, date = record
+    if isinstance(seq, str):
+        seq = _genbank_seqs[seq]
+    seq_id = seq.metadata['id']
+    seq = copy(seq)
+    seq.metadata['LOCUS'] = {
+        'locus_name': seq_id,
+        'size': len(seq),
+        'unit': 'bp',
+        'mol_type': 'DNA',
+        'shape': 'linear',
+        'division': None,
+        'date': date}
+    seq.metadata['ACCESSION'] = ''
+    seq.metadata['VERSION'] = ''
+    seq.metadata['KEYWORDS'] = '.'
+    seq.metadata['SOURCE'] = {'ORGANISM': 'genus species', 'taxonomy': 'unknown'}
+    seq.metadata['COMMENT'] = 'Annotated with %s %s' % (__package__, __version__)
+    seq.interval_metadata = fs.to_interval_metadata()
+    with io.StringIO() as fh:
+        write(seq, into=fh, format='genbank')
+        return fh.getvalue()
+
+
+def write_genbank(records, out, cpus=1, chunksize=8, seqs=None):
+    '''Write the sequences and their features to a GenBank file.
+
+    The records are formatted in parallel and written in the input order.
+
+    Parameters
+    ----------
+    records : Iterable of tuple of ``Sequence`` (or seq ID) and ``FeatureStore``
+        the sequence and the features on it
+    out : str or file object
+        output file. It is compressed if its name ends with ".gz" or ".bz2".
+    cpus : int
+        the number of processes to format the records
+    chunksize : int
+        the number of records sent to a process at a time
+    seqs : ``PackedSeqs``, optional
+        the sequences of the seq IDs in ``records``. The processes read
+        them from its shared memory (or memory mapped file) instead of
+        the sequences being pickled to them.
+    '''
+    date = strftime("%d-%b-%Y", gmtime())
+    records = ((seq, fs, date) for seq, fs in records)
+    with open_output(out) as fh:
+        if cpus <= 1:
+            _init_genbank(seqs)
+            try:
+                for record in records:
+                    fh.write(_format_genbank(record))
+            finally:
+                _init_genbank(None)
+            return
+        with Pool(cpus, initializer=_init_genbank, initargs=(seqs,)) as pool:
+            # feed the pool batch by batch so that only a batch of
+            # records (and their formatted text) is in memory at a time
+            n = cpus * chunksize * 4
+            while True:
+                batch = list(islice(records, n))
+                if not batch:
+                    break
+                for text in pool.imap(_format_genbank, batch, chunksize):
+                    fh.write(text)
+                del batch
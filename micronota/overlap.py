@@ -0,0 +1,174 @@
+r'''
+Overlap resolution
+==================
+
+.. currentmodule:: micronota.overlap
+
+This module (:mod:`micronota.overlap`) finds the overlapping features
+predicted by different tools and resolves the conflicts among them, eg a
+CDS called over a tRNA or the same rRNA predicted by both cmscan and
+RNAmmer.
+'''
+
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, micronota development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from heapq import heappush, heappop
+from logging import getLogger
+
+import numpy as np
+
+
+logger = getLogger(__name__)
+
+
+def overlaps(start, end):
+    '''Find all the pairs of overlapping intervals with a sweep line.
+
+    It sorts the intervals by start and keeps a heap of the intervals
+    still open at the current start, so it takes O(n log n + k) for n
+    intervals with k overlapping pairs.
+
+    Parameters
+    ----------
+    start, end : 1-D ``numpy.ndarray`` of int
+        the start (inclusive) and end (exclusive) of the intervals
+
+    Yields
+    ------
+    tuple of int
+        the positions of the two overlapping intervals; the first one
+        starts before (or at the same position as) the second one.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> list(overlaps(np.array([0, 5, 20, 8]), np.array([10, 7, 30, 9])))
+    [(0, 1), (0, 3)]
+    '''
+    order = np.lexsort((end, start)).tolist()
+    start = start.tolist()
+    end = end.tolist()
+    active = []
+    for i in order:
+        s = start[i]
+        while active and active[0][0] <= s:
+            heappop(active)
+        for _, j in active:
+            yield j, i
+        heappush(active, (end[i], i))
+
+
+def _score(v):
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return -np.inf
+
+
+def resolve(fs, priority=(), dedup=(), min_overlap=0.5, sources=()):
+    '''Remove the features that conflict with better features.
+
+    Two overlapping features are in conflict if
+
+    1. they are of different types that are both in ``priority``. The
+       feature of the lower priority type is removed.
+    2. they are of the same type in ``dedup`` and on the same strand. The
+       one from the lower priority source in ``sources`` is removed; if
+       they are from the same source (or sources not in it), the one
+       with the lower score (or the shorter one if the scores are the
+       same or missing) is removed. The scores of different tools are
+       often not comparable, so give ``sources`` to dedup across tools.
+
+    and the overlap covers at least ``min_overlap`` of the shorter one.
+
+    The features are kept greedily from the best to the worst, so a
+    feature removed does not remove other features.
+
+    Parameters
+    ----------
+    fs : ``FeatureStore``
+        the features on a sequence
+    priority : list of str
+        feature types from the highest priority to the lowest, eg
+        ``['rRNA', 'tRNA', 'CDS']`` for "rRNA beats tRNA and CDS; tRNA
+        beats CDS".
+    dedup : Iterable of str
+        feature types to remove duplicates of, eg ``['rRNA']``
+    min_overlap : float
+        minimal fraction of the shorter feature overlapped to be in conflict
+    sources : list of str
+        the sources (eg ``['Rfam', 'RNAmmer-1.2']``) of the features from
+        the highest priority to the lowest. The sources not in it rank
+        after them.
+
+    Returns
+    -------
+    ``FeatureStore``
+        a new store of the features kept
+
+    Examples
+    --------
+    >>> from skbio.metadata import IntervalMetadata
+    >>> from micronota.features import FeatureStore
+    >>> imd = IntervalMetadata(None)
+    >>> _ = imd.add([(0, 90)], metadata={'type': 'CDS'})
+    >>> _ = imd.add([(10, 80)], metadata={'type': 'tRNA'})
+    >>> _ = imd.add([(200, 300)], metadata={'type': 'rRNA', 'score': '9'})
+    >>> _ = imd.add([(210, 300)], metadata={'type': 'rRNA', 'score': '100'})
+    >>> obs = resolve(FeatureStore.from_interval_metadata(imd),
+    ...               priority=['tRNA', 'CDS'], dedup=['rRNA'])
+    >>> obs.values('type'), obs.values('score')
+    (['tRNA', 'rRNA'], [None, '100'])
+    '''
+    n = len(fs)
+    if n == 0:
+        return fs
+    rank = {t: r for r, t in enumerate(priority)}
+    dedup = set(dedup)
+    types = fs.values('type')
+    # only the features of the types in the rules can be in conflict
+    candidates = np.array([t in rank or t in dedup for t in types], dtype=bool)
+    idx = np.flatnonzero(candidates)
+    if len(idx) < 2:
+        return fs
+
+    strands = fs.values('strand')
+    scores = np.array([_score(v) for v in fs.values('score')])
+    length = fs.end - fs.start
+    partners = {}
+    pos = idx.tolist()
+    for a, b in overlaps(fs.start[idx], fs.end[idx]):
+        i, j = pos[a], pos[b]
+        partners.setdefault(i, []).append(j)
+        partners.setdefault(j, []).append(i)
+
+    # the order from the best to the worst feature
+    ranks = np.array([rank.get(t, len(rank)) for t in types])
+    source_rank = {t: r for r, t in enumerate(sources)}
+    source_ranks = np.array([source_rank.get(t, len(source_rank)) for t in fs.values('source')])
+    order = np.lexsort((np.arange(n), -length, -scores, source_ranks, ranks))
+    kept = np.ones(n, dtype=bool)
+    accepted = np.zeros(n, dtype=bool)
+    for i in order.tolist():
+        for j in partners.get(i, ()):
+            # only the features accepted before (ie better) can remove it
+            if not accepted[j]:
+                continue
+            ti, tj = types[i], types[j]
+            if not ((ti != tj and ti in rank and tj in rank) or
+                    (ti == tj and ti in dedup and strands[i] == strands[j])):
+                continue
+            ov = min(fs.end[i], fs.end[j]) - max(fs.start[i], fs.start[j])
+            if ov >= min_overlap * min(length[i], length[j]):
+                kept[i] = False
+                break
+        else:
+            accepted[i] = True
+    logger.debug('removed %d conflicting features' % (n - kept.sum()))
+    return fs.take(np.flatnonzero(kept))
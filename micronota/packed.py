@@ -0,0 +1,310 @@
+r'''
+Packed sequences
+================
+
+.. currentmodule:: micronota.packed
+
+This module (:mod:`micronota.packed`) stores DNA sequences with 2 bits
+per base in shared memory or a memory mapped file, so worker processes
+can read them without copying or pickling them. The characters other
+than A, C, G and T (eg N and the other IUPAC codes) are stored as a
+list of runs of the same character, which is short for assembled
+sequences. It takes about a quarter of the memory of the sequences.
+
+A ``PackedSeqs`` object is pickled as the name of its shared memory or
+file, so it can be passed to a process pool and each worker attaches
+to the same memory.
+'''
+
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, micronota development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from collections.abc import Mapping
+from mmap import mmap, ACCESS_READ
+from os import remove
+from multiprocessing import shared_memory
+from logging import getLogger
+
+import numpy as np
+from skbio import DNA
+
+from .stats import SeqStats, CHARS, MIN_N_RUN
+
+
+logger = getLogger(__name__)
+
+
+_MAGIC = b'MNPACK01'
+# magic followed by the number of seqs, exception runs, bases and bytes of IDs
+_HEADER = np.dtype([('magic', 'S8'), ('n', '<i8'), ('m', '<i8'), ('total', '<i8'), ('ids', '<i8')])
+_BASES = b'ACGT'
+# byte -> 2 bit code; 4 for the characters stored as exceptions
+_PACK = np.full(256, 4, dtype=np.uint8)
+for _i, _c in enumerate(_BASES):
+    _PACK[_c] = _i
+    _PACK[ord(chr(_c).lower())] = _i
+# packed byte -> its 4 bases
+_UNPACK = np.array([[_BASES[(v >> (2 * k)) & 3] for k in range(4)] for v in range(256)], dtype=np.uint8)
+# packed byte -> the counts of A, C, G and T in it
+_BYTE_COUNTS = np.array([[sum((v >> (2 * k)) & 3 == b for k in range(4)) for b in range(4)]
+                         for v in range(256)], dtype=np.int64)
+_UPPER = np.frombuffer(bytes(range(256)).upper(), dtype=np.uint8)
+# exception character -> its column in the stats
+_STATS_LUT = np.full(256, len(CHARS), dtype=np.int64)
+for _i, _c in enumerate(CHARS):
+    _STATS_LUT[ord(_c)] = _i
+
+
+def _align(n):
+    return (n + 7) // 8 * 8
+
+
+def _layout(n, m, total, ids):
+    '''Return the byte offset of each array in the buffer.'''
+    layout = {}
+    pos = _align(_HEADER.itemsize)
+    for name, count, dtype in [('offsets', n + 1, '<i8'), ('exc_start', m, '<i8'),
+                               ('exc_end', m, '<i8'), ('exc_char', m, 'u1'),
+                               ('ids', ids, 'u1'), ('packed', (total + 3) // 4, 'u1')]:
+        layout[name] = (pos, count, np.dtype(dtype))
+        pos = _align(pos + count * np.dtype(dtype).itemsize)
+    return layout, pos
+
+
+def _exceptions(b, codes):
+    '''Return the runs of the same non-ACGT character.'''
+    mask = codes == 4
+    if not mask.any():
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint8)
+    idx = np.flatnonzero(mask)
+    chars = _UPPER[b[idx]]
+    # a new run starts where the position is not consecutive or the character changes
+    new = np.ones(len(idx), dtype=bool)
+    new[1:] = (np.diff(idx) != 1) | (chars[1:] != chars[:-1])
+    starts = np.flatnonzero(new)
+    ends = np.append(starts[1:], len(idx))
+    return idx[starts], idx[ends - 1] + 1, chars[starts]
+
+
+def _fill(buf, layout, arrays, header):
+    np.frombuffer(buf, dtype=_HEADER, count=1)[0] = header
+    for k, (pos, count, dtype) in layout.items():
+        np.frombuffer(buf, dtype=dtype, count=count, offset=pos)[:] = arrays[k]
+
+
+class PackedSeqs(Mapping):
+    '''DNA sequences packed with 2 bits per base, mapping seq ID to ``DNA``.
+
+    Create it with :meth:`from_seqs`; attach to an existing one with
+    :meth:`open` or by unpickling.
+
+    Examples
+    --------
+    >>> from skbio import DNA
+    >>> seqs = PackedSeqs.from_seqs([DNA('ACGTNNNA', metadata={'id': 'a'}),
+    ...                              DNA('GGRT', metadata={'id': 'b'})])
+    >>> seqs.lengths
+    {'a': 8, 'b': 4}
+    >>> seqs.fetch('a', 2, 7), str(seqs['b'])
+    ('GTNNN', 'GGRT')
+    >>> seqs.close()
+    >>> seqs.unlink()
+    '''
+    def __init__(self, buf, source, owner=False):
+        self._buf = buf
+        self._source = source
+        self._owner = owner
+        header = np.frombuffer(buf, dtype=_HEADER, count=1)[0]
+        if header['magic'] != _MAGIC:
+            raise ValueError('Not a packed sequence store.')
+        n, m, total, nids = (int(header[k]) for k in ('n', 'm', 'total', 'ids'))
+        layout, _ = _layout(n, m, total, nids)
+        arrays = {k: np.frombuffer(buf, dtype=dtype, count=count, offset=pos)
+                  for k, (pos, count, dtype) in layout.items()}
+        self._offsets = arrays['offsets']
+        self._exc_start = arrays['exc_start']
+        self._exc_end = arrays['exc_end']
+        self._exc_char = arrays['exc_char']
+        self._packed = arrays['packed']
+        ids = arrays['ids'].tobytes().decode()
+        self.ids = ids.split('\n') if n else []
+        self._index = {k: i for i, k in enumerate(self.ids)}
+
+    @classmethod
+    def from_seqs(cls, seqs, fp=None):
+        '''Pack the sequences.
+
+        Parameters
+        ----------
+        seqs : Iterable of ``Sequence``
+            the sequences; the IDs are taken from their metadata.
+        fp : str, optional
+            the file to store them in, eg when the shared memory (often
+            a small tmpfs in containers) cannot hold them. Default is to
+            store them in a new block of shared memory. Either should be
+            released with :meth:`unlink` by the creator.
+        '''
+        ids, lengths, chunks = [], [], []
+        exc = ([], [], [])
+        carry = np.zeros(0, dtype=np.uint8)
+        offset = 0
+        for seq in seqs:
+            ids.append(seq.metadata['id'])
+            b = seq.values.view(np.uint8)
+            codes = _PACK[b]
+            for lst, a in zip(exc, _exceptions(b, codes)):
+                lst.append(a + offset if a.dtype == np.int64 else a)
+            codes[codes == 4] = 0
+            codes = np.concatenate((carry, codes))
+            k = len(codes) // 4 * 4
+            c = codes[:k].reshape(-1, 4)
+            chunks.append(c[:, 0] | (c[:, 1] << 2) | (c[:, 2] << 4) | (c[:, 3] << 6))
+            carry = codes[k:]
+            lengths.append(len(b))
+            offset += len(b)
+        if len(carry):
+            c = np.zeros(4, dtype=np.uint8)
+            c[:len(carry)] = carry
+            chunks.append(np.array([c[0] | (c[1] << 2) | (c[2] << 4) | (c[3] << 6)], dtype=np.uint8))
+        arrays = {
+            'offsets': np.concatenate(([0], np.cumsum(lengths, dtype=np.int64))),
+            'exc_start': np.concatenate(exc[0]) if ids else np.zeros(0, dtype=np.int64),
+            'exc_end': np.concatenate(exc[1]) if ids else np.zeros(0, dtype=np.int64),
+            'exc_char': np.concatenate(exc[2]) if ids else np.zeros(0, dtype=np.uint8),
+            'ids': np.frombuffer('\n'.join(ids).encode(), dtype=np.uint8),
+            'packed': np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.uint8)}
+        n, m, nids = len(ids), len(arrays['exc_start']), len(arrays['ids'])
+        layout, size = _layout(n, m, offset, nids)
+        logger.debug('pack %d seqs of %d bp into %d bytes' % (n, offset, size))
+        if fp is None:
+            shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+            _fill(shm.buf, layout, arrays, (_MAGIC, n, m, offset, nids))
+            store = cls(shm.buf, ('shm', shm.name), owner=True)
+            store._shm = shm
+            return store
+        buf = bytearray(size)
+        _fill(buf, layout, arrays, (_MAGIC, n, m, offset, nids))
+        with open(fp, 'wb') as out:
+            out.write(buf)
+        store = cls.open(fp)
+        store._owner = True
+        return store
+
+    @classmethod
+    def open(cls, fp):
+        '''Memory map a store written to a file.'''
+        with open(fp, 'rb') as fh:
+            mm = mmap(fh.fileno(), 0, access=ACCESS_READ)
+        store = cls(mm, ('file', fp))
+        store._mm = mm
+        return store
+
+    @classmethod
+    def _attach(cls, kind, name):
+        if kind == 'file':
+            return cls.open(name)
+        shm = shared_memory.SharedMemory(name=name)
+        store = cls(shm.buf, (kind, name))
+        store._shm = shm
+        return store
+
+    def __reduce__(self):
+        return (PackedSeqs._attach, self._source)
+
+    def close(self):
+        '''Detach from the memory.'''
+        self._offsets = self._exc_start = self._exc_end = self._exc_char = self._packed = None
+        self._buf = None
+        if hasattr(self, '_shm'):
+            self._shm.close()
+        if hasattr(self, '_mm'):
+            self._mm.close()
+
+    def unlink(self):
+        '''Release the shared memory or remove the file; only its creator should call it.'''
+        if not self._owner:
+            return
+        if self._source[0] == 'shm':
+            self._shm.unlink()
+        else:
+            remove(self._source[1])
+
+    @property
+    def nbytes(self):
+        return len(self._buf)
+
+    @property
+    def lengths(self):
+        return dict(zip(self.ids, np.diff(self._offsets).tolist()))
+
+    def length(self, seq_id):
+        i = self._index[seq_id]
+        return int(self._offsets[i + 1] - self._offsets[i])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __contains__(self, seq_id):
+        return seq_id in self._index
+
+    def _range(self, seq_id, start, end):
+        i = self._index[seq_id]
+        beg, stop = int(self._offsets[i]), int(self._offsets[i + 1])
+        if end is None or end > stop - beg:
+            end = stop - beg
+        return beg + start, beg + max(end, start)
+
+    def codes(self, seq_id, start=0, end=None):
+        '''Return the ASCII codes of the subsequence [start, end) as uint8 array.'''
+        a, b = self._range(seq_id, start, end)
+        if a == b:
+            return np.zeros(0, dtype=np.uint8)
+        out = _UNPACK[self._packed[a // 4:(b - 1) // 4 + 1]].ravel()[a % 4:a % 4 + b - a].copy()
+        # the exception runs overlapping the range
+        i = np.searchsorted(self._exc_end, a, side='right')
+        j = np.searchsorted(self._exc_start, b, side='left')
+        for s, e, c in zip(self._exc_start[i:j].tolist(), self._exc_end[i:j].tolist(),
+                           self._exc_char[i:j].tolist()):
+            out[max(s, a) - a:min(e, b) - a] = c
+        return out
+
+    def fetch(self, seq_id, start=0, end=None):
+        '''Return the subsequence of 0-based [start, end) as str.'''
+        return self.codes(seq_id, start, end).tobytes().decode('ascii')
+
+    def __getitem__(self, seq_id):
+        if seq_id not in self._index:
+            raise KeyError(seq_id)
+        return DNA(self.fetch(seq_id), metadata={'id': seq_id})
+
+    def stats(self):
+        '''Compute the composition stats of all the seqs without unpacking them.'''
+        n = len(self.ids)
+        counts = np.zeros((n, len(CHARS) + 1), dtype=np.int64)
+        runs = np.zeros(n, dtype=np.int64)
+        offsets = self._offsets.tolist()
+        for i in range(n):
+            a, b = offsets[i], offsets[i + 1]
+            # the whole bytes are counted via their byte values
+            first, last = min((a + 3) // 4, b // 4), b // 4
+            if first < last:
+                counts[i, :4] = np.bincount(self._packed[first:last], minlength=256) @ _BYTE_COUNTS
+            # the bases in the partial bytes at both ends
+            for p in list(range(a, min(b, first * 4))) + list(range(max(a, last * 4, first * 4), b)):
+                counts[i, (int(self._packed[p // 4]) >> (2 * (p % 4))) & 3] += 1
+        # the exceptions were packed as A
+        seq_of = np.searchsorted(self._offsets, self._exc_start, side='right') - 1
+        size = self._exc_end - self._exc_start
+        np.subtract.at(counts[:, 0], seq_of, size)
+        np.add.at(counts, (seq_of, _STATS_LUT[self._exc_char]), size)
+        long_n = (self._exc_char == ord('N')) & (size >= MIN_N_RUN)
+        np.add.at(runs, seq_of[long_n], 1)
+        return SeqStats.from_arrays(self.ids, counts, runs)
@@ -7,42 +7,131 @@
 # ----------------------------------------------------------------------------
 
 from collections import defaultdict
+from multiprocessing import Pool
 from subprocess import run
-from os.path import join, dirname
 from tempfile import NamedTemporaryFile
 import logging
 
+import numpy as np
 from pkg_resources import resource_filename
 from skbio.io import write
 
+from .features import FeatureStore
+from .stats import SeqStats
+from .packed import PackedSeqs
+
 logger = logging.getLogger(__name__)
 
 
-def compute_gene_score(seq_fp):
-    '''Compute the quality score based on essential genes found on sequences.
+# the Pfam families of the essential genes; see ``compute_gene_score``
+MARKERS = resource_filename(__package__, 'data/pfam/102.hmm')
+N_MARKERS = 102
+
+
+def search_markers(seq_fp, out_fp, cpus=1, params=''):
+    '''Search the essential gene markers in the proteins with ``hmmsearch``.
 
     Parameters
     ----------
     seq_fp : str
         file path of proteins identified from the DNA sequences
+    out_fp : str
+        file path of the marker table (see ``write_markers``)
+    cpus : int
+        the number of threads of ``hmmsearch``
+    params : str
+        additional parameters of ``hmmsearch``
+    '''
+    with NamedTemporaryFile() as out:
+        cmd = ['hmmsearch', '--cpu', str(cpus), '--tblout', out.name, '-o', '/dev/null']
+        cmd.extend(params.split())
+        cmd.extend([MARKERS, seq_fp])
+        run(cmd, check=True)
+        write_markers(out.name, out_fp)
+
+
+def write_markers(tblout_fp, out_fp):
+    '''Parse the ``hmmsearch`` table output into the marker table.
+
+    The marker table is tab delimited with the columns of the Pfam
+    accession (without version) of the marker, and the ID, E-value and
+    bit score of the protein hit. It lists all the hit proteins of each
+    marker from the best, so the markers can be counted for any subset
+    of the sequences (eg each bin of a metagenome).
+
+    Examples
+    --------
+    >>> import os, tempfile
+    >>> d = tempfile.mkdtemp()
+    >>> tbl, tsv = os.path.join(d, 'hits.txt'), os.path.join(d, 'markers.tsv')
+    >>> with open(tbl, 'w') as f:
+    ...     _ = f.write('# comment\\n'
+    ...                 '1_1 - Ribosomal_L2 PF00181.20 1e-20 70.1 0.1 x\\n'
+    ...                 '1_9 - Ribosomal_L2 PF00181.20 1e-30 99.0 0.1 x\\n')
+    >>> write_markers(tbl, tsv)
+    >>> read_markers(tsv)
+    {'PF00181': [('1_9', 1e-30, 99.0), ('1_1', 1e-20, 70.1)]}
+    '''
+    hits = defaultdict(list)
+    with open(tblout_fp) as fh:
+        for line in fh:
+            if line.startswith('#'):
+                continue
+            items = line.split()
+            pid = items[3].split('.')[0]
+            hits[pid].append((items[0], float(items[4]), float(items[5])))
+    with open(out_fp, 'w') as out:
+        out.write('#marker\tprotein\tevalue\tscore\n')
+        for pid in sorted(hits):
+            for hit in sorted(hits[pid], key=lambda h: -h[2]):
+                out.write('%s\t%s\t%g\t%g\n' % ((pid,) + hit))
+
+
+def read_markers(fp):
+    '''Read the marker table written by ``write_markers``.
+
+    Returns
+    -------
+    dict
+        the marker as key and the list of its hits ``(protein, evalue,
+        score)`` from the best as value
+    '''
+    markers = defaultdict(list)
+    with open(fp) as fh:
+        for line in fh:
+            if line.startswith('#'):
+                continue
+            pid, protein, evalue, score = line.rstrip('\n').split('\t')
+            markers[pid].append((protein, float(evalue), float(score)))
+    return dict(markers)
+
+
+def compute_gene_score(seq_fp=None, marker_fp=None, cpus=1):
+    '''Compute the quality score based on essential genes found on sequences.
+
+    Parameters
+    ----------
+    seq_fp : str, optional
+        file path of proteins identified from the DNA sequences. The
+        markers are searched in it if ``marker_fp`` is not given.
+    marker_fp : str, optional
+        file path of the marker table already computed (eg by the
+        ``essential_genes`` rule of the workflow)
+    cpus : int
+        the number of threads to search the markers
 
     Returns
     -------
     float
         the score computed from sequence stats.
     '''
-    hmm_fp = resource_filename(__package__, 'data/pfam/102.hmm')
-    with NamedTemporaryFile() as out:
-        proc = run(["hmmscan", "--tblout", out.name, "-o", '/dev/null', hmm_fp, seq_fp])
-        p102 = set()
-        with open(out.name) as fh:
-            for line in fh:
-                if line.startswith('#'):
-                    continue
-                items = line.split()
-                pid = items[1].split('.')[0]
-                p102.add(pid)
-    score = max(1 - (102 - len(p102)) * 0.01, 0.1)
+    if marker_fp is None:
+        with NamedTemporaryFile() as out:
+            search_markers(seq_fp, out.name, cpus)
+            markers = read_markers(out.name)
+    else:
+        markers = read_markers(marker_fp)
+    score = max(1 - (N_MARKERS - len(markers)) * 0.01, 0.1)
     return score
 
 
@@ -51,8 +140,8 @@ def compute_seq_score(seqs, contigs=True):
 
     Parameters
     ----------
-    seqs : Iterable of ``skbio.Sequence`` or its child
-        input sequences
+    seqs : Iterable of ``skbio.Sequence`` or its child, ``PackedSeqs`` or ``SeqStats``
+        input sequences or their precomputed stats
     contigs : bool, optional
         whether the input seqs are contigs or chromosomes
 
@@ -61,20 +150,21 @@ def compute_seq_score(seqs, contigs=True):
     float
         the score computed from sequence stats.
     '''
-    ncontigs, ngood, nbad, n10N = 0, 0, 0, 0
-    for i, seq in enumerate(seqs, 1):
-        pattern = '(%s+)' % ('N' * 10)
-        n10N += len([_ for _ in seq.find_with_regex(pattern)])
-
-        freq = seq.frequencies()
-        ngood += sum(freq.pop(k, 0) for k in ('A', 'T', 'G', 'C', 'N'))
-
-        nbad += sum(v for _, v in freq.items())
+    if isinstance(seqs, SeqStats):
+        stats = seqs
+    elif isinstance(seqs, PackedSeqs):
+        stats = seqs.stats()
+    else:
+        stats = SeqStats.from_seqs(seqs)
+    # runs of 10 or more Ns
+    n10N = int(stats.n_runs.sum())
+    ngood = int(stats.valid.sum())
+    nbad = int(stats.invalid.sum())
 
     if contigs is False:
         ncontigs = 1
     else:
-        ncontigs = i
+        ncontigs = len(stats)
 
     score = ngood / (ngood + nbad + 10000 * (ncontigs - 1) + 10000 * n10N)
 
@@ -86,7 +176,7 @@ def compute_rrna_score(imds):
 
     Parameters
     ----------
-    imds : Iterable of ``skbio.metadata.IntervalMetadata``
+    imds : Iterable of ``skbio.metadata.IntervalMetadata`` or ``FeatureStore``
     contigs : bool, optional
         whether the input seqs are contigs or chromosomes
 
@@ -100,10 +190,13 @@ def compute_rrna_score(imds):
              '23s_rRNA': (2900, 3500)}
     scores = defaultdict(list)
     for imd in imds:
-        for rrna in imd.query(metadata={'type': 'rRNA'}):
-            start, end = rrna.bounds[0]
-            length = end - start
-            t = rrna.metadata['product']
+        fs = _as_store(imd)
+        idx = fs.where({'type': 'rRNA'})
+        lengths = (fs.end[idx] - fs.start[idx]).tolist()
+        for length, t in zip(lengths, fs.values('product', idx)):
+            # only the prokaryotic rRNAs are scored
+            if t not in rrnas:
+                continue
             lower, upper = rrnas[t]
             if lower <= length <= upper:
                 scores[t].append(0.3)
@@ -120,7 +213,7 @@ def compute_trna_score(imds):
 
     Parameters
     ----------
-    imds : Iterable of ``skbio.metadata.IntervalMetadata``
+    imds : Iterable of ``skbio.metadata.IntervalMetadata`` or ``FeatureStore``
     contigs : bool, optional
         whether the input seqs are contigs or chromosomes
 
@@ -132,9 +225,108 @@ def compute_trna_score(imds):
     aa = {'Ala', 'Arg', 'Asn', 'Asp', 'Cys', 'Gln', 'Glu', 'Gly', 'His', 'Ile',
           'Leu', 'Lys', 'Met', 'Phe', 'Pro', 'Ser', 'Thr', 'Trp', 'Tyr', 'Val'}
     for imd in imds:
-        for trna in imd.query(metadata={'type': 'tRNA'}):
-            a = trna.metadata['product'].split('-')[-1]
-            aa.discard(a)
+        fs = _as_store(imd)
+        for product in fs.values('product', fs.where({'type': 'tRNA'})):
+            aa.discard(product.split('-')[-1])
 
     score = max(0.1, 1 - len(aa) * 0.1)
     return score
+
+
+def read_bins(fp):
+    '''Read the tab delimited table of contig ID and bin ID.'''
+    bins = {}
+    with open(fp) as fh:
+        for line in fh:
+            if line.startswith('#') or not line.strip():
+                continue
+            contig, bin_id = line.rstrip('\n').split('\t')[:2]
+            bins[contig] = bin_id
+    return bins
+
+
+def compute_bin_scores(bins, stats, features, markers=None, cpus=1):
+    '''Compute the quality scores of each bin of a metagenome.
+
+    The scores are the same as those computed for each bin separately
+    with ``compute_seq_score``, ``compute_trna_score``,
+    ``compute_rrna_score`` and ``compute_gene_score``, but the sequence
+    and gene scores of all the bins are computed in one pass over the
+    sequence stats and the marker hits of the whole metagenome, and the
+    RNA scores are computed for the bins in parallel.
+
+    Parameters
+    ----------
+    bins : dict
+        contig ID as key and bin ID as value. The contigs not in it are
+        not scored.
+    stats : ``SeqStats``
+        the stats of the contigs
+    features : dict
+        contig ID as key and ``FeatureStore`` as value
+    markers : dict, optional
+        the marker hits as returned by ``read_markers``. The proteins are
+        named after their contig as "<contig ID>_<n>" as by Prodigal.
+        Default is not to compute the gene score.
+    cpus : int
+        the number of processes to compute the RNA scores
+
+    Returns
+    -------
+    dict
+        bin ID as key and dict of the scores (with keys "seq", "tRNA",
+        "rRNA" and "gene") as value
+    '''
+    names = sorted(set(bins.values()))
+    code = {b: i for i, b in enumerate(names)}
+    n = len(names)
+    # the seq scores from the per contig stats summed in each bin
+    bin_of = np.array([code.get(bins.get(sid), -1) for sid in stats.ids], dtype=np.int64)
+    keep = bin_of >= 0
+    bin_of = bin_of[keep]
+    ngood = np.bincount(bin_of, weights=stats.valid[keep], minlength=n)
+    nbad = np.bincount(bin_of, weights=stats.invalid[keep], minlength=n)
+    n10N = np.bincount(bin_of, weights=stats.n_runs[keep], minlength=n)
+    ncontigs = np.bincount(bin_of, minlength=n)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        seq_scores = ngood / (ngood + nbad + 10000 * (ncontigs - 1) + 10000 * n10N)
+
+    # the distinct markers hit in each bin
+    found = np.zeros(n, dtype=np.int64)
+    if markers is not None:
+        for hits in markers.values():
+            hit_bins = {code[bins[c]] for c in (p.rsplit('_', 1)[0] for p, _, _ in hits) if c in bins}
+            found[list(hit_bins)] += 1
+
+    # only the RNA features are sent to the workers
+    groups = [[] for _ in names]
+    for sid, fs in features.items():
+        b = bins.get(sid)
+        if b is None:
+            continue
+        rna = np.union1d(fs.where({'type': 'tRNA'}), fs.where({'type': 'rRNA'}))
+        if len(rna):
+            groups[code[b]].append(fs.take(rna))
+    if cpus > 1:
+        with Pool(cpus) as pool:
+            rna_scores = pool.map(_rna_scores, groups, chunksize=max(n // (cpus * 4), 1))
+    else:
+        rna_scores = [_rna_scores(g) for g in groups]
+
+    scores = {}
+    for i, b in enumerate(names):
+        trna, rrna = rna_scores[i]
+        scores[b] = {'seq': float(seq_scores[i]), 'tRNA': trna, 'rRNA': rrna,
+                     'gene': max(1 - (N_MARKERS - int(found[i])) * 0.01, 0.1)
+                     if markers is not None else np.nan}
+    return scores
+
+
+def _rna_scores(stores):
+    return compute_trna_score(stores), compute_rrna_score(stores)
+
+
+def _as_store(imd):
+    if isinstance(imd, FeatureStore):
+        return imd
+    return FeatureStore.from_interval_metadata(imd)
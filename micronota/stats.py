@@ -0,0 +1,231 @@
+r'''
+Sequence stats
+==============
+
+.. currentmodule:: micronota.stats
+
+This module (:mod:`micronota.stats`) computes the composition stats of
+the input sequences (length, character counts, long runs of N and GC
+content) in a single vectorized pass over the bytes of each sequence.
+They are computed once while the input is validated, saved as a per
+sequence table and reused by the summary and the quality scores.
+'''
+
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, micronota development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from logging import getLogger
+
+import numpy as np
+
+from .compress import open_file
+
+
+logger = getLogger(__name__)
+
+
+# the characters counted: the nucleotides, N and the other degenerate ones
+CHARS = 'ACGTNRYSWKMBDHV'
+# the number of characters that are valid for the quality score ("ACGTN")
+_VALID = 5
+_N = CHARS.index('N')
+# the minimal length of the runs of N counted
+MIN_N_RUN = 10
+# map the bytes to the column of their character; the others are invalid
+_LUT = np.full(256, len(CHARS), dtype=np.uint8)
+for _i, _c in enumerate(CHARS):
+    _LUT[ord(_c)] = _i
+    _LUT[ord(_c.lower())] = _i
+
+
+def composition(seq):
+    '''Compute the character counts and the number of long N runs of a sequence.
+
+    Parameters
+    ----------
+    seq : ``Sequence``, str or bytes
+        the sequence
+
+    Returns
+    -------
+    tuple of 1-D ``numpy.ndarray`` and int
+        the counts of ``CHARS`` followed by the count of the other
+        characters, and the number of runs of at least ``MIN_N_RUN`` Ns
+
+    Examples
+    --------
+    >>> counts, runs = composition('ACGTNNNNNNNNNNNAcgtRx')
+    >>> dict(zip(CHARS + '*', counts.tolist()))['N'], runs
+    (11, 1)
+    '''
+    if isinstance(seq, str):
+        seq = seq.encode('ascii')
+    if isinstance(seq, (bytes, bytearray, memoryview)):
+        b = np.frombuffer(seq, dtype=np.uint8)
+    else:
+        b = seq.values.view(np.uint8)
+    # count the bytes and then fold the 256 counts into the characters
+    counts = np.bincount(_LUT, weights=np.bincount(b, minlength=256),
+                         minlength=len(CHARS) + 1).astype(np.int64)
+    runs = 0
+    if counts[_N] >= MIN_N_RUN:
+        is_n = (b == ord('N')) | (b == ord('n'))
+        # the run starts and ends are where the N indicator changes
+        edges = np.flatnonzero(is_n[1:] != is_n[:-1]) + 1
+        if is_n[0]:
+            edges = np.concatenate(([0], edges))
+        if is_n[-1]:
+            edges = np.concatenate((edges, [len(b)]))
+        runs = int(np.count_nonzero(edges[1::2] - edges[::2] >= MIN_N_RUN))
+    return counts, runs
+
+
+class SeqStats:
+    '''The composition stats of a set of sequences.
+
+    Examples
+    --------
+    >>> from skbio import DNA
+    >>> stats = SeqStats.from_seqs([DNA('ACGGN', metadata={'id': 'a'}),
+    ...                             DNA('AT', metadata={'id': 'b'})])
+    >>> stats.ids, stats.length.tolist(), stats.gc.round(2).tolist()
+    (['a', 'b'], [5, 2], [0.75, 0.0])
+    >>> stats.frequencies('a')
+    {'A': 1, 'C': 1, 'G': 2, 'N': 1}
+    '''
+    def __init__(self):
+        self.ids = []
+        self._index = {}
+        self._rows = []
+        self._runs = []
+        self._counts = None
+
+    @classmethod
+    def from_seqs(cls, seqs):
+        stats = cls()
+        for seq in seqs:
+            stats.add(seq)
+        return stats
+
+    @classmethod
+    def from_arrays(cls, ids, counts, runs):
+        '''Create it from the counts array (as ``counts``) and the N runs.'''
+        stats = cls()
+        stats.ids = list(ids)
+        stats._index = {k: i for i, k in enumerate(stats.ids)}
+        stats._counts = np.asarray(counts, dtype=np.int64)
+        stats._rows = list(stats._counts)
+        stats._runs = [int(i) for i in runs]
+        return stats
+
+    def add(self, seq, seq_id=None):
+        '''Add the stats of a sequence.
+
+        ``seq_id`` defaults to the ID of the sequence or its position if
+        it has no ID.
+        '''
+        if seq_id is None:
+            seq_id = seq.metadata.get('id', str(len(self.ids)))
+        counts, runs = composition(seq)
+        self._index[seq_id] = len(self.ids)
+        self.ids.append(seq_id)
+        self._rows.append(counts)
+        self._runs.append(runs)
+        self._counts = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, seq_id):
+        return seq_id in self._index
+
+    def __getitem__(self, seq_id):
+        '''Return the counts of ``CHARS`` and the invalid characters of a sequence.'''
+        return self.counts[self._index[seq_id]]
+
+    @property
+    def counts(self):
+        '''2-D array of the counts of ``CHARS`` and the invalid characters.'''
+        if self._counts is None:
+            if self._rows:
+                self._counts = np.vstack(self._rows).astype(np.int64)
+            else:
+                self._counts = np.zeros((0, len(CHARS) + 1), dtype=np.int64)
+            self._rows = list(self._counts)
+        return self._counts
+
+    @property
+    def length(self):
+        return self.counts.sum(axis=1)
+
+    @property
+    def n_runs(self):
+        '''The number of runs of at least ``MIN_N_RUN`` Ns.'''
+        return np.array(self._runs, dtype=np.int64)
+
+    @property
+    def valid(self):
+        '''The number of A, C, G, T and N.'''
+        return self.counts[:, :_VALID].sum(axis=1)
+
+    @property
+    def invalid(self):
+        '''The number of the other characters.'''
+        return self.counts[:, _VALID:].sum(axis=1)
+
+    @property
+    def gc(self):
+        '''The GC content among the A, C, G and T.'''
+        counts = self.counts
+        acgt = counts[:, :4].sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            gc = (counts[:, 1] + counts[:, 2]) / acgt
+        return np.nan_to_num(gc)
+
+    def frequencies(self, seq_id, relative=False):
+        '''Return the character frequencies of a sequence.
+
+        It is the same as ``Sequence.frequencies`` of the sequence.
+        '''
+        counts = self[seq_id]
+        total = counts.sum()
+        freq = {}
+        for c, n in zip(CHARS, counts[:len(CHARS)].tolist()):
+            if n:
+                freq[c] = n / total if relative else n
+        return freq
+
+    def write(self, fp):
+        '''Write the stats table to a tab delimited file (compressed if it ends with ".gz").'''
+        counts = self.counts
+        with open_file(fp, 'w') as out:
+            out.write('#seq_id\tlength\tgc\tn_runs\tinvalid\t%s\n' % '\t'.join(CHARS))
+            for seq_id, length, gc, runs, invalid, row in zip(
+                    self.ids, self.length.tolist(), self.gc.tolist(), self._runs,
+                    self.invalid.tolist(), counts[:, :len(CHARS)].tolist()):
+                out.write('%s\t%d\t%.4f\t%d\t%d\t%s\n' % (
+                    seq_id, length, gc, runs, invalid, '\t'.join(map(str, row))))
+
+    @classmethod
+    def read(cls, fp):
+        '''Read the stats table written by ``write``.'''
+        stats = cls()
+        with open_file(fp) as fh:
+            header = fh.readline().rstrip('\n').split('\t')
+            if header[5:] != list(CHARS):
+                raise ValueError('%s is not a sequence stats table.' % fp)
+            for line in fh:
+                items = line.rstrip('\n').split('\t')
+                counts = np.array([int(i) for i in items[5:]], dtype=np.int64)
+                # the invalid characters other than the degenerate ones
+                other = int(items[4]) - counts[_VALID:].sum()
+                stats._index[items[0]] = len(stats.ids)
+                stats.ids.append(items[0])
+                stats._rows.append(np.append(counts, other))
+                stats._runs.append(int(items[3]))
+        return stats
@@ -6,9 +6,29 @@
 # The full license is in the file COPYING.txt, distributed with this software.
 # ----------------------------------------------------------------------------
 
+from functools import lru_cache
 
-def summarize(obj, types=('length', 'nuc_freq', 'CDS', 'ncRNA', 'rRNA', 'tRNA',
-                          'tandem_repeat', 'terminator', 'CRISPR')):
+import numpy as np
+from skbio import DNA
+
+from .features import FeatureStore
+from .stats import composition, CHARS
+
+
+# the feature types counted in the summary
+TYPES = ('CDS', 'ncRNA', 'rRNA', 'tRNA', 'tandem_repeat', 'terminator', 'CRISPR')
+
+
+def _frequencies(seq):
+    '''Return the character counts of a sequence, as ``frequencies``.'''
+    counts, _ = composition(seq)
+    if counts[-1]:
+        # the characters out of ``CHARS`` (eg gaps) are rare
+        return seq.frequencies()
+    return {c: n for c, n in zip(CHARS, counts.tolist()) if n}
+
+
+def summarize(obj, types=('length', 'nuc_freq') + TYPES, features=None):
     '''Summarize the sequence and its annotation in a genome or metagenome
     sample.
 
@@ -16,6 +36,9 @@ def summarize(obj, types=('length', 'nuc_freq', 'CDS', 'ncRNA', 'rRNA', 'tRNA',
     ----------
     obj : ``Sequence``
         sequence to summarize
+    features : ``FeatureStore``, optional
+        the annotation of the sequence. Default is to take it from the
+        interval metadata of the sequence.
 
     Returns
     -------
@@ -23,27 +46,36 @@ def summarize(obj, types=('length', 'nuc_freq', 'CDS', 'ncRNA', 'rRNA', 'tRNA',
         summary stat
     '''
     stats = []
+    counts = None
     for t in types:
         if t == 'length':
             stats.append(len(obj))
         elif t == 'nuc_freq':
-            stats.append(obj.frequencies())
+            stats.append(_frequencies(obj))
         else:
-            stats.append(sum(1 for x in obj.interval_metadata.query(
-                metadata={'type': t})))
+            if counts is None:
+                if features is None:
+                    features = FeatureStore.from_interval_metadata(obj.interval_metadata)
+                counts = features.count('type')
+            stats.append(counts.get(t, 0))
     return stats
 
 
-def summarize_iter(objs, types=('length', 'nuc_freq', 'CDS', 'ncRNA', 'rRNA',
-                                'tRNA', 'tandem_repeat', 'terminator',
-                                'CRISPR')):
+def summarize_iter(objs, types=('length', 'nuc_freq') + TYPES, features=None):
     '''Summarize the sequences and their annotations in a genome or metagenome
     sample.
 
+    It is a generator: each sequence is summarized when the summary is
+    consumed, so the sequences can be streamed from a file.
+
     Parameters
     ----------
     objs : iterable of ``Sequence``
         sequences to summarize
+    features : dict, optional
+        seq_id as key and ``FeatureStore`` as value. It is looked up as
+        each sequence is summarized. Default is to take the annotation
+        from the interval metadata of each sequence.
 
     Yields
     ------
@@ -51,7 +83,74 @@ def summarize_iter(objs, types=('length', 'nuc_freq', 'CDS', 'ncRNA', 'rRNA',
         summary stat
     '''
     for obj in objs:
-        yield summarize(obj, types)
+        fs = None if features is None else features[obj.metadata['id']]
+        yield summarize(obj, types, fs)
+
+
+class SummaryWriter:
+    '''Write the summary table one sequence at a time.
+
+    A row is written as soon as the annotation of a sequence is added,
+    so it can consume the annotation while it is being written out
+    instead of after all the sequences are annotated.
+
+    Parameters
+    ----------
+    out : file object
+        the file object to output to
+    stats : ``SeqStats``, optional
+        the precomputed stats of the seqs. The sequences in it are not
+        read again.
+    seqs : dict, optional
+        seq_id as key and ``Sequence`` as value (eg ``FastaIndex``) to
+        compute the stats of the sequences that are not in ``stats``.
+
+    Examples
+    --------
+    >>> from io import StringIO
+    >>> from skbio import DNA
+    >>> out = StringIO()
+    >>> summary = SummaryWriter(out)
+    >>> summary.add('a', FeatureStore.from_features([([(0, 3)], None, {'type': 'CDS'})]),
+    ...             DNA('AAAC'))
+    >>> out.getvalue().splitlines()[1].split('\\t')
+    ['a', '4', 'A:0.75;C:0.25', '1', '0', '0', '0', '0', '0', '0']
+    '''
+    def __init__(self, out, stats=None, seqs=None):
+        self.out = out
+        self.stats = stats
+        self.seqs = seqs
+        out.write('#seq_id\tlength\tnuc_freq\t')
+        out.write('\t'.join(TYPES))
+        out.write('\n')
+
+    def add(self, seq_id, features, seq=None):
+        '''Write the summary row of a sequence.
+
+        Parameters
+        ----------
+        seq_id : str
+            the seq ID
+        features : ``FeatureStore``
+            its annotation
+        seq : ``Sequence``, optional
+            the sequence. It is only needed if its stats are not
+            precomputed.
+        '''
+        if seq is None and self.stats is not None and seq_id in self.stats:
+            freq = self.stats.frequencies(seq_id)
+            length = int(self.stats[seq_id].sum())
+        else:
+            if seq is None:
+                seq = self.seqs[seq_id]
+            freq = _frequencies(seq)
+            length = len(seq)
+        items = [seq_id, str(length),
+                 ';'.join(['%s:%.2f' % (k, freq[k] / length) for k in sorted(freq)])]
+        counts = features.count('type')
+        items.extend(str(counts.get(t, 0)) for t in TYPES)
+        self.out.write('\t'.join(items))
+        self.out.write('\n')
 
 
 def compute_condon_usage(cds, genetic_code=11):
@@ -67,4 +166,216 @@ def compute_condon_usage(cds, genetic_code=11):
     Returns
     -------
     dict
+        the codon as key and its count and relative synonymous codon
+        usage (see ``rscu``) as value. The codons with degenerate
+        nucleotides are not counted.
+
+    Examples
+    --------
+    >>> from skbio import DNA
+    >>> usage = compute_condon_usage(DNA('ATGAAAAAAAAGTAA'))
+    >>> usage['AAA'], usage['AAG'], usage['ATG']
+    ((2, 1.3333333333333333), (1, 0.6666666666666666), (1, 1.0))
+    '''
+    codes = _encode(cds)
+    index = _codon_index(codes)[:len(codes) // 3 * 3:3]
+    counts = np.bincount(index, minlength=65)[:64]
+    values = rscu(counts, genetic_code)
+    return {c: (int(n), float(v)) for c, n, v in zip(CODONS, counts, values)}
+
+
+# the codons in the order of their index: the base-4 number of their
+# nucleotides with A=0, C=1, G=2 and T=3
+CODONS = [a + b + c for a in 'ACGT' for b in 'ACGT' for c in 'ACGT']
+# byte -> 2 bit code of the nucleotide; 4 for the others. U is read as T.
+_CODE = np.full(256, 4, dtype=np.uint8)
+for _i, _c in enumerate('ACGT'):
+    _CODE[ord(_c)] = _CODE[ord(_c.lower())] = _i
+_CODE[ord('U')] = _CODE[ord('u')] = 3
+# the complement of the codes; A <-> T and C <-> G
+_COMPLEMENT = np.array([3, 2, 1, 0, 4], dtype=np.uint8)
+
+
+def _encode(seq):
+    if isinstance(seq, str):
+        seq = seq.encode('ascii')
+    if isinstance(seq, (bytes, bytearray, memoryview)):
+        return _CODE[np.frombuffer(seq, dtype=np.uint8)]
+    return _CODE[seq.values.view(np.uint8)]
+
+
+def _codon_index(codes):
+    '''Return the index of the codon starting at each position.
+
+    The codons with any degenerate nucleotide have the index 64.
+    '''
+    first, second, third = codes[:-2], codes[1:-1], codes[2:]
+    index = (first.astype(np.int16) << 4) | (second.astype(np.int16) << 2) | third
+    index[(first | second | third) > 3] = 64
+    return index
+
+
+def _cds_stores(seqs, features=None):
+    '''Yield each seq with CDS, its ``FeatureStore`` and the positions of the CDS.'''
+    if features is None:
+        pairs = ((seq, FeatureStore.from_interval_metadata(seq.interval_metadata)) for seq in seqs)
+    else:
+        pairs = ((seqs.fetch(sid), fs) for sid, fs in features.items())
+    for seq, fs in pairs:
+        positions = fs.where({'type': 'CDS'})
+        if len(positions):
+            yield seq, fs, positions
+
+
+def _cds_codons(seq, fs, positions):
+    '''Return the codons of the CDS at the positions of the feature store.
+
+    Returns
+    -------
+    tuple of 1-D ``numpy.ndarray``
+        the codon indices of all the CDS concatenated, and the number of
+        codons of each CDS (without its incomplete last codon)
+    '''
+    codes = _encode(seq)
+    n = len(codes)
+    parts = [codes, _COMPLEMENT[codes[::-1]]]
+    minus = np.array(fs.values('strand', positions, '.')) == '-'
+    start, end = fs.start[positions], fs.end[positions]
+    # the CDS on the minus strand in the coordinates of the reverse complement
+    starts = np.where(minus, 2 * n - end, start)
+    lengths = end - start
+    size = 2 * n
+    for i in np.flatnonzero(np.isin(positions, fs.irregular)).tolist():
+        # join the segments of the CDS with multiple bounds after the seqs
+        bounds = fs.bounds(int(positions[i]))
+        if minus[i]:
+            bounds = [(2 * n - e, 2 * n - s) for s, e in reversed(bounds)]
+        part = np.concatenate([parts[0][s:e] if e <= n else parts[1][s - n:e - n] for s, e in bounds])
+        starts[i], lengths[i] = size, len(part)
+        parts.append(part)
+        size += len(part)
+    index = _codon_index(np.concatenate(parts))
+    ncodons = lengths // 3
+    # the position of each codon: the CDS start plus 3 times its rank in the CDS
+    pos = 3 * np.arange(ncodons.sum()) + np.repeat(starts - 3 * (np.cumsum(ncodons) - ncodons), ncodons)
+    return index[pos], ncodons
+
+
+def codon_counts(seqs, features=None):
+    '''Count the codons of every CDS.
+
+    The sequence is encoded once together with its reverse complement,
+    so a CDS on either strand is a range read forward. The codon index
+    at every position is computed with vectorized arithmetic and the
+    codons of all the CDS of a sequence are counted with a single
+    ``bincount``.
+
+    Parameters
+    ----------
+    seqs : iterable of ``Sequence``, or ``FastaIndex`` or ``PackedSeqs``
+        the DNA sequences. It is a mapping of seq ID to sequence with
+        ``fetch`` method if ``features`` is given.
+    features : dict, optional
+        seq_id as key and ``FeatureStore`` as value. Default is to take
+        the annotation from the interval metadata of each seq.
+
+    Returns
+    -------
+    tuple of list and 2-D ``numpy.ndarray``
+        the IDs of the CDS and the matrix of their codon counts, with a
+        row for each CDS and a column for each of ``CODONS``. The counts
+        of a genome are the sums of the columns.
+    '''
+    ids = []
+    counts = []
+    for seq, fs, positions in _cds_stores(seqs, features):
+        m = len(positions)
+        index, ncodons = _cds_codons(seq, fs, positions)
+        gene = np.repeat(np.arange(m), ncodons)
+        # the codons with degenerate nucleotides are in the extra column 64
+        found = np.bincount(gene * 65 + index, minlength=m * 65)
+        counts.append(found.reshape(m, 65)[:, :64])
+        ids.extend(fs.values('ID', positions))
+    if counts:
+        return ids, np.vstack(counts)
+    return ids, np.zeros((0, 64), dtype=np.int64)
+
+
+@lru_cache()
+def translation_table(genetic_code=11):
+    '''Return the amino acid of each codon index as uint8 array.
+
+    It has 65 items: the amino acids (and "*" for stop) of ``CODONS``
+    and "X" for the codons with degenerate nucleotides (index 64).
+
+    Examples
+    --------
+    >>> table = translation_table(11)
+    >>> chr(table[CODONS.index('ATG')]), chr(table[CODONS.index('TGA')]), chr(table[64])
+    ('M', '*', 'X')
+    >>> chr(translation_table(4)[CODONS.index('TGA')])
+    'W'
+    '''
+    aa = str(DNA(''.join(CODONS)).translate(genetic_code)) + 'X'
+    table = np.frombuffer(aa.encode('ascii'), dtype=np.uint8).copy()
+    table.flags.writeable = False
+    return table
+
+
+def rscu(counts, genetic_code=11):
+    '''Compute the relative synonymous codon usage.
+
+    It is the count of a codon divided by the mean count of the codons
+    of the same amino acid (or stop), so it is 1 for all the codons of
+    an amino acid without codon bias. It is NaN for the codons of the
+    amino acids that are not used.
+
+    Parameters
+    ----------
+    counts : 1-D or 2-D ``numpy.ndarray``
+        the codon counts (eg a row for each gene) as returned by
+        ``codon_counts``
+    genetic_code : int
+        genetic code/translation table
+
+    Returns
+    -------
+    ``numpy.ndarray`` of float of the same shape as ``counts``
+    '''
+    aa = translation_table(genetic_code)[:64].tobytes().decode()
+    groups = sorted(set(aa))
+    group = np.array([groups.index(a) for a in aa])
+    # the codons by the amino acids
+    member = np.zeros((64, len(groups)))
+    member[np.arange(64), group] = 1
+    counts = np.asarray(counts, dtype=float)
+    size = member.sum(axis=0)
+    mean = (counts @ member) / size
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return counts / mean[..., group]
+
+
+def write_codon_usage(ids, counts, out, genetic_code=11):
+    '''Write the codon counts of the CDS as a tab delimited table.
+
+    The table has a row for each CDS and a column for each of
+    ``CODONS``. It ends with the comment rows of the total counts of the
+    genome and their RSCU.
+
+    Parameters
+    ----------
+    ids : list of str
+        the CDS IDs
+    counts : 2-D ``numpy.ndarray``
+        the codon counts as returned by ``codon_counts``
+    out : file object
+        the file object to output to
+    genetic_code : int
+        genetic code/translation table
     '''
+    out.write('#ID\t%s\n' % '\t'.join(CODONS))
+    for i, row in zip(ids, counts.tolist()):
+        out.write('%s\t%s\n' % (i, '\t'.join(map(str, row))))
+    total = counts.sum(axis=0)
+    out.write('#genome\t%s\n' % '\t'.join(map(str, total.tolist())))
+    out.write('#RSCU\t%s\n' % '\t'.join('%.3f' % i for i in rscu(total, genetic_code)))
@@ -0,0 +1,74 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, micronota development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from unittest import TestCase, main, skipIf
+from tempfile import mkdtemp
+from shutil import rmtree
+from os.path import join
+
+from skbio import DNA
+from skbio.metadata import IntervalMetadata
+
+from micronota.features import FeatureStore
+from micronota.columnar import write_columnar
+
+try:
+    import pyarrow.dataset as ds
+except ImportError:
+    ds = None
+
+
+@skipIf(ds is None, 'pyarrow is not installed')
+class Tests(TestCase):
+    def setUp(self):
+        self.tmpd = mkdtemp()
+        imd = IntervalMetadata(None)
+        imd.add([(0, 9)], metadata={'type': 'CDS', 'ID': 'seq1_1', 'strand': '+',
+                                    'db_xref': ['Pfam:PF00001', 'KEGG:K00001']})
+        imd.add([(2, 5)], metadata={'type': 'terminator', 'confidence': 90, 'score': '.'})
+        imd.add([(0, 3), (6, 9)], metadata={'type': 'CDS', 'ID': 'seq1_2', 'score': '9.5',
+                                            'product': 'foo'})
+        self.seqs = [DNA('ATGAAATAA', metadata={'id': 'seq1'}),
+                     DNA('ATG', metadata={'id': 'seq2'})]
+        self.features = {'seq1': FeatureStore.from_interval_metadata(imd),
+                         'seq2': FeatureStore()}
+
+    def test_write_columnar(self):
+        write_columnar(self.seqs, self.features, self.tmpd, 'g1', batch_size=1)
+        write_columnar(self.seqs[:1], self.features, self.tmpd, 'g2')
+        features = ds.dataset(join(self.tmpd, 'features'), partitioning='hive')
+        # only the columns needed are read
+        obs = features.to_table(columns=['genome', 'ID', 'bounds', 'score'],
+                                filter=ds.field('genome') == 'g1').to_pylist()
+        exp = [{'genome': 'g1', 'ID': 'seq1_1', 'bounds': [{'start': 0, 'end': 9}], 'score': None},
+               {'genome': 'g1', 'ID': None, 'bounds': [{'start': 2, 'end': 5}], 'score': None},
+               {'genome': 'g1', 'ID': 'seq1_2', 'bounds': [{'start': 0, 'end': 3}, {'start': 6, 'end': 9}],
+                'score': 9.5}]
+        self.assertEqual(obs, exp)
+        row = features.to_table().to_pylist()[0]
+        self.assertEqual(row['db_xref'], ['Pfam:PF00001', 'KEGG:K00001'])
+        self.assertEqual(row['strand'], '+')
+        self.assertEqual(row['attributes'], [])
+        self.assertEqual(features.to_table(columns=['attributes']).to_pylist()[1],
+                         {'attributes': [('confidence', '90')]})
+        self.assertEqual(features.count_rows(), 6)
+
+        seqs = ds.dataset(join(self.tmpd, 'sequences'), partitioning='hive')
+        obs = seqs.to_table(filter=ds.field('genome') == 'g1').to_pylist()
+        self.assertEqual([r['seq_id'] for r in obs], ['seq1', 'seq2'])
+        self.assertEqual(obs[0]['length'], 9)
+        self.assertEqual(obs[0]['CDS'], 2)
+        self.assertEqual(obs[0]['terminator'], 1)
+        self.assertEqual(dict(obs[0]['nuc_freq']), {'A': 6, 'G': 1, 'T': 2})
+
+    def tearDown(self):
+        rmtree(self.tmpd)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, micronota development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from unittest import TestCase, main
+from tempfile import mkdtemp
+from shutil import rmtree
+from os.path import join
+import gzip
+import bz2
+
+from micronota.compress import open_file, is_bgzf
+from micronota.util import check_seq
+
+
+class Tests(TestCase):
+    def setUp(self):
+        self.tmpd = mkdtemp()
+        # larger than a few blocks of both formats
+        self.data = ''.join('>seq%d\n%s\n' % (i, 'ACGTTGCA' * (i % 500 + 80)) for i in range(2000))
+
+    def test_gzip(self):
+        fp = join(self.tmpd, 'a.fna.gz')
+        with open_file(fp, 'w', threads=3) as f:
+            f.write(self.data)
+        self.assertTrue(is_bgzf(fp))
+        with gzip.open(fp, 'rt') as f:
+            self.assertEqual(f.read(), self.data)
+        with open_file(fp, threads=3) as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_gzip_not_bgzf(self):
+        fp = join(self.tmpd, 'a.fna.gz')
+        with gzip.open(fp, 'wt') as f:
+            f.write(self.data)
+        self.assertFalse(is_bgzf(fp))
+        with open_file(fp, 'rb') as f:
+            self.assertEqual(f.read(), self.data.encode())
+        # close before reading to the end
+        with open_file(fp) as f:
+            self.assertEqual(f.readline(), '>seq0\n')
+
+    def test_bz2(self):
+        fp = join(self.tmpd, 'a.fna.bz2')
+        with open_file(fp, 'wb', threads=2) as f:
+            f.write(self.data.encode())
+        with bz2.open(fp, 'rt') as f:
+            self.assertEqual(f.read(), self.data)
+        with open_file(fp) as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_uncompressed(self):
+        fp = join(self.tmpd, 'a.fna')
+        with open_file(fp, 'w') as f:
+            f.write(self.data)
+        with open(fp) as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_check_seq(self):
+        fp = join(self.tmpd, 'a.fna.gz')
+        with open_file(fp, 'w') as f:
+            f.write(self.data)
+        seqs = list(check_seq(fp, 'fasta', lambda s: len(s) < 4000))
+        self.assertEqual(len(seqs), 2000 - 420 * 4)
+        self.assertEqual(seqs[0].metadata['id'], 'seq420')
+
+    def test_mode(self):
+        with self.assertRaises(ValueError):
+            open_file(join(self.tmpd, 'a.gz'), 'a')
+
+    def tearDown(self):
+        rmtree(self.tmpd)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, micronota development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from unittest import TestCase, main
+from tempfile import mkdtemp
+from shutil import rmtree
+from os.path import join
+from os import utime
+
+from skbio import read, DNA
+
+from micronota.faidx import FastaIndex, write_fai
+
+
+class Tests(TestCase):
+    def setUp(self):
+        self.tmpd = mkdtemp()
+        self.fp = join(self.tmpd, 'a.fna')
+        self.seqs = ['ACGT' * (i * 7 + 1) + 'A' * i for i in range(20)]
+        with open(self.fp, 'w') as f:
+            for i, s in enumerate(self.seqs):
+                f.write('>seq%d  contig %d\n' % (i, i))
+                f.write(''.join(s[j:j + 10] + '\n' for j in range(0, len(s), 10)))
+
+    def test_write_fai(self):
+        write_fai(self.fp)
+        with open(self.fp + '.fai') as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[0], 'seq0\t4\t16\t4\t5')
+        self.assertEqual(lines[1], 'seq1\t33\t37\t10\t11')
+
+    def test_inconsistent_lines(self):
+        with open(self.fp, 'w') as f:
+            f.write('>a\nACGT\nACGTAA\nA\n')
+        with self.assertRaisesRegex(ValueError, 'different lengths'):
+            write_fai(self.fp)
+
+    def test_fasta_index(self):
+        seqs = FastaIndex(self.fp)
+        self.assertEqual(list(seqs), ['seq%d' % i for i in range(20)])
+        self.assertEqual(seqs.lengths['seq3'], len(self.seqs[3]))
+        for i, s in enumerate(self.seqs):
+            for start, end in [(0, None), (3, 17), (9, 11), (len(s) - 1, len(s) + 9)]:
+                self.assertEqual(seqs.fetch('seq%d' % i, start, end), s[start:end])
+        self.assertEqual(list(seqs.values()), list(read(self.fp, format='fasta', constructor=DNA)))
+        with self.assertRaises(KeyError):
+            seqs['foo']
+
+    def test_stale_index(self):
+        FastaIndex(self.fp)
+        with open(self.fp, 'w') as f:
+            f.write('>b\nAC\n')
+        # make sure the index looks older than the file
+        utime(self.fp + '.fai', (0, 0))
+        self.assertEqual(FastaIndex(self.fp).lengths, {'b': 2})
+
+    def tearDown(self):
+        rmtree(self.tmpd)
+
+
+if __name__ == '__main__':
+    main()
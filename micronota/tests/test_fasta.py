@@ -0,0 +1,75 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, micronota development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from unittest import TestCase, main
+from tempfile import mkdtemp
+from shutil import rmtree
+from os.path import join
+import gzip
+
+from skbio import read, DNA
+
+from micronota.fasta import read_fasta
+from micronota.util import check_seq
+
+
+class Tests(TestCase):
+    def setUp(self):
+        self.tmpd = mkdtemp()
+        self.fp = join(self.tmpd, 'a.fna')
+        lines = ['\n']
+        for i in range(300):
+            seq = ('ACGTacgtN-' * (i % 37 + 1))
+            lines.append('>seq%d some description\r\n' % i)
+            lines.extend(seq[j:j + 13] + '\r\n' for j in range(0, len(seq), 13))
+        with open(self.fp, 'w', newline='') as f:
+            f.write(''.join(lines))
+
+    def _exp(self, min_len):
+        seqs = (s.degap() for s in read(self.fp, format='fasta', constructor=DNA, lowercase=True))
+        return [s for s in seqs if len(s) >= min_len]
+
+    def test_read_fasta(self):
+        for min_len in (0, 100, 1000):
+            exp = self._exp(min_len)
+            self.assertEqual(list(read_fasta(self.fp, min_len)), exp)
+            self.assertEqual(list(read_fasta(self.fp, min_len, cpus=2)), exp)
+        self.assertEqual(list(read_fasta(self.fp, 1))[0].metadata,
+                         {'id': 'seq0', 'description': 'some description'})
+
+    def test_read_fasta_gz(self):
+        with open(self.fp, 'rb') as f, gzip.open(self.fp + '.gz', 'wb') as out:
+            out.write(f.read())
+        self.assertEqual(list(read_fasta(self.fp + '.gz', 100)), self._exp(100))
+
+    def test_check_seq(self):
+        obs = list(check_seq(self.fp, 'fasta', lambda s: False, min_len=200))
+        self.assertEqual(obs, self._exp(200))
+
+    def test_empty(self):
+        fp = join(self.tmpd, 'empty.fna')
+        open(fp, 'w').close()
+        self.assertEqual(list(read_fasta(fp)), [])
+
+    def test_not_fasta(self):
+        fp = join(self.tmpd, 'b.fna')
+        with open(fp, 'w') as f:
+            f.write('ACGT\n>a\nACGT\n')
+        with self.assertRaisesRegex(ValueError, 'does not start'):
+            list(read_fasta(fp))
+        with open(fp, 'w') as f:
+            f.write('>a\nACGT\n>b\n\n>c\nA\n')
+        with self.assertRaisesRegex(ValueError, 'without sequence'):
+            list(read_fasta(fp, 10))
+
+    def tearDown(self):
+        rmtree(self.tmpd)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, micronota development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from unittest import TestCase, main
+
+import numpy as np
+import numpy.testing as npt
+from skbio.metadata import IntervalMetadata
+
+from micronota.features import FeatureStore
+from micronota.util import LazyString
+
+
+class Tests(TestCase):
+    def setUp(self):
+        self.imd1 = IntervalMetadata(1000)
+        self.imd1.add([(500, 600)], metadata={'type': 'tRNA', 'source': 'Aragorn',
+                                              'product': 'tRNA-Ala', 'strand': '+'})
+        self.imd1.add([(10, 20), (30, 90)], metadata={'type': 'CDS', 'ID': 'seq1_1',
+                                                      'db_xref': ['a', 'b']})
+        self.imd2 = IntervalMetadata(1000)
+        self.imd2.add([(100, 200)], [(True, False)],
+                      metadata={'type': 'tRNA', 'source': 'Aragorn', 'strand': '-',
+                                'product': 'tRNA-Ser'})
+        self.imd2.add([(0, 50)], metadata={'type': 'rRNA', 'score': 5.0})
+
+    def test_round_trip(self):
+        for imd in (self.imd1, self.imd2, IntervalMetadata(None)):
+            fs = FeatureStore.from_interval_metadata(imd)
+            self.assertEqual(fs.to_interval_metadata(), imd)
+
+    def test_interned(self):
+        fs = FeatureStore.from_interval_metadata(self.imd1)
+        fs.merge(FeatureStore.from_interval_metadata(self.imd2))
+        codes, cat = fs.codes('source')
+        npt.assert_array_equal(codes, [0, -1, 0, -1])
+        self.assertEqual(cat, ['Aragorn'])
+
+    def test_merge(self):
+        fs = FeatureStore.from_interval_metadata(self.imd1)
+        fs.merge(FeatureStore.from_interval_metadata(self.imd2))
+        self.assertEqual(len(fs), 4)
+        npt.assert_array_equal(fs.start, [500, 10, 100, 0])
+        npt.assert_array_equal(fs.end, [600, 90, 200, 50])
+        self.assertEqual(fs.count('type'), {'tRNA': 2, 'CDS': 1, 'rRNA': 1})
+        self.assertEqual(fs.values('strand'), ['+', None, '-', None])
+        self.assertEqual(fs.bounds(1), [(10, 20), (30, 90)])
+        self.assertEqual(fs.metadata(3), {'type': 'rRNA', 'score': 5.0})
+
+        exp = IntervalMetadata(1000)
+        exp.merge(self.imd1)
+        exp.merge(self.imd2)
+        self.assertEqual(fs.to_interval_metadata(), exp)
+
+    def test_where(self):
+        fs = FeatureStore.from_interval_metadata(self.imd1)
+        fs.merge(FeatureStore.from_interval_metadata(self.imd2))
+        npt.assert_array_equal(fs.where({'type': 'tRNA'}), [0, 2])
+        npt.assert_array_equal(fs.where({'type': 'tRNA', 'strand': '-'}), [2])
+        npt.assert_array_equal(fs.where({'type': 'foo'}), [])
+        npt.assert_array_equal(fs.where({'db_xref': ['a', 'b']}), [1])
+
+    def test_index(self):
+        fs = FeatureStore.from_interval_metadata(self.imd1)
+        fs.merge(FeatureStore.from_interval_metadata(self.imd2))
+        idx = fs.index('type')
+        self.assertEqual(len(idx), 3)
+        npt.assert_array_equal(idx[(str, 'tRNA')], [0, 2])
+        npt.assert_array_equal(idx[(str, 'CDS')], [1])
+        # the index is cached
+        self.assertIs(fs.index('type'), idx)
+        # and it is rebuilt after the store is modified
+        fs.merge(FeatureStore.from_interval_metadata(self.imd1))
+        npt.assert_array_equal(fs.index('type')[(str, 'tRNA')], [0, 2, 4])
+        self.assertEqual(fs.index('foo'), {})
+
+    def test_sort(self):
+        fs = FeatureStore.from_interval_metadata(self.imd1)
+        fs.merge(FeatureStore.from_interval_metadata(self.imd2))
+        obs = fs.sort()
+        npt.assert_array_equal(obs.start, [0, 10, 100, 500])
+        self.assertEqual(obs.bounds(1), [(10, 20), (30, 90)])
+        self.assertEqual(obs.values('type'), ['rRNA', 'CDS', 'tRNA', 'tRNA'])
+
+    def test_concat(self):
+        fs1 = FeatureStore.from_interval_metadata(self.imd1).sort()
+        fs2 = FeatureStore.from_interval_metadata(self.imd2).sort()
+        obs = FeatureStore.concat([fs1, fs2, FeatureStore()], sort=True)
+        self.assertEqual(obs.upper_bound, 1000)
+        npt.assert_array_equal(obs.start, [0, 10, 100, 500])
+        npt.assert_array_equal(obs.end, [50, 90, 200, 600])
+        self.assertEqual(obs.values('type'), ['rRNA', 'CDS', 'tRNA', 'tRNA'])
+        self.assertEqual(obs.bounds(1), [(10, 20), (30, 90)])
+        self.assertEqual(obs.to_interval_metadata(), fs1.merge(fs2).to_interval_metadata())
+        self.assertEqual(len(FeatureStore.concat([])), 0)
+
+    def test_lazy_not_read(self):
+        imd = IntervalMetadata(None)
+        imd.add([(0, 10)], metadata={'repeat': LazyString('/does/not/exist', 0, 2)})
+        fs = FeatureStore.from_interval_metadata(imd)
+        self.assertIsInstance(fs.metadata(0)['repeat'], LazyString)
+
+    def test_empty(self):
+        fs = FeatureStore(10)
+        self.assertEqual(len(fs), 0)
+        self.assertEqual(fs.count('type'), {})
+        npt.assert_array_equal(fs.where({'type': 'CDS'}), np.array([], dtype=int))
+
+
+if __name__ == '__main__':
+    main()
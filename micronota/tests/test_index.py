@@ -0,0 +1,95 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, micronota development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from unittest import TestCase, main
+from tempfile import mkdtemp
+from shutil import rmtree
+from os.path import join
+import gzip
+
+import numpy as np
+from skbio.metadata import IntervalMetadata
+
+from micronota.bgzf import BgzfWriter, BgzfReader
+from micronota.features import FeatureStore
+from micronota.index import IndexedGFF3, reg2bin, reg2bins
+from micronota.output import write_gff3
+
+
+class BgzfTests(TestCase):
+    def setUp(self):
+        self.tmpd = mkdtemp()
+
+    def test_blocks(self):
+        fp = join(self.tmpd, 'a.gz')
+        lines = [('%d\t%s\n' % (i, 'x' * (i % 300))).encode() for i in range(2000)]
+        offsets = []
+        with BgzfWriter(fp) as out:
+            for line in lines:
+                offsets.append(out.tell())
+                out.write(line)
+        # more than one block
+        self.assertGreater(offsets[-1] >> 16, 0)
+        with gzip.open(fp) as fh:
+            self.assertEqual(fh.read(), b''.join(lines))
+        with BgzfReader(fp) as fh:
+            for i in (1999, 0, 1000, 1001):
+                fh.seek(offsets[i])
+                self.assertEqual(fh.readline(), lines[i])
+            self.assertEqual(list(fh), lines[1002:])
+
+    def tearDown(self):
+        rmtree(self.tmpd)
+
+
+class IndexTests(TestCase):
+    def setUp(self):
+        self.tmpd = mkdtemp()
+        rng = np.random.RandomState(0)
+        self.features = []
+        for seq_id in ('seq1', 'seq2'):
+            imd = IntervalMetadata(None)
+            for i, s in enumerate(rng.randint(0, 500000, 3000).tolist()):
+                imd.add([(s, s + rng.randint(1, 5000))],
+                        metadata={'type': 'CDS', 'ID': '%s_%d' % (seq_id, i)})
+            # a long feature spanning many bins
+            imd.add([(1000, 300000)], metadata={'type': 'repeat_region'})
+            self.features.append((seq_id, FeatureStore.from_interval_metadata(imd)))
+        self.fp = join(self.tmpd, 'a.gff3.gz')
+        write_gff3(self.features, self.fp, index=True)
+
+    def test_bins(self):
+        for beg, end in [(0, 1), (16383, 16385), (100000, 900000)]:
+            self.assertIn(reg2bin(beg, end), reg2bins(beg, end))
+
+    def test_fetch(self):
+        with IndexedGFF3(self.fp) as gff:
+            self.assertEqual(gff.seq_ids, ['seq1', 'seq2'])
+            for seq_id, fs in self.features:
+                for beg, end in [(0, 10), (20000, 20100), (299999, 400000), (600000, 700000)]:
+                    obs = list(gff.fetch(seq_id, beg, end))
+                    exp = ((fs.start < end) & (fs.end > beg)).sum()
+                    self.assertEqual(len(obs), exp)
+                    for line in obs:
+                        items = line.split('\t')
+                        self.assertEqual(items[0], seq_id)
+                        self.assertTrue(int(items[3]) - 1 < end and int(items[4]) > beg)
+                self.assertEqual(len(list(gff.fetch(seq_id))), len(fs))
+            self.assertEqual(list(gff.fetch('foo', 0, 10)), [])
+
+    def test_get(self):
+        with IndexedGFF3(self.fp) as gff:
+            self.assertTrue(gff.get('seq2_10').endswith('ID=seq2_10'))
+            self.assertIsNone(gff.get('foo'))
+
+    def tearDown(self):
+        rmtree(self.tmpd)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, micronota development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import gzip
+import os
+from unittest import TestCase, main, skipIf
+from tempfile import mkdtemp
+from shutil import rmtree
+from os.path import join
+
+from skbio import DNA
+from skbio.metadata import IntervalMetadata
+
+from micronota.features import FeatureStore
+from micronota.matrix import CountMatrix, count_gff3, build_matrices
+
+try:
+    from micronota.columnar import write_columnar
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+GFF3 = '''##gff-version 3
+seq1\tprodigal\tCDS\t1\t9\t.\t+\t0\tID=seq1_1;Dbxref=Pfam:PF00001,KEGG:K00001
+seq1\taragorn\ttRNA\t20\t90\t.\t-\t.\tID=seq1_2
+seq2\tprodigal\tCDS\t1\t9\t.\t+\t0\tID=seq2_1;Dbxref=KEGG:K00001,GO:0000%3B1
+##FASTA
+>seq1
+ATGAAATAA
+'''
+
+
+class Tests(TestCase):
+    def setUp(self):
+        self.tmpd = mkdtemp()
+        self.gff3 = join(self.tmpd, 'g1.gff3')
+        with open(self.gff3, 'w') as out:
+            out.write(GFF3)
+        self.gff3_gz = join(self.tmpd, 'g2.gff3.gz')
+        with gzip.open(self.gff3_gz, 'wt') as out:
+            out.write(GFF3)
+
+    def tearDown(self):
+        rmtree(self.tmpd)
+
+    def test_count_gff3(self):
+        types, functions = count_gff3(self.gff3)
+        self.assertEqual(types, {'CDS': 2, 'tRNA': 1})
+        self.assertEqual(functions, {'Pfam:PF00001': 1, 'KEGG:K00001': 2, 'GO:0000;1': 1})
+        _, functions = count_gff3(self.gff3, dbs={'KEGG'})
+        self.assertEqual(functions, {'KEGG:K00001': 2})
+
+    def test_append(self):
+        m = CountMatrix.from_counts([('g1', {'a': 1, 'b': 2})])
+        m.append([('g2', {'c': 3, 'a': 4})])
+        self.assertEqual(m.columns, ['a', 'b', 'c'])
+        self.assertEqual(m.matrix.toarray().tolist(), [[1, 2, 0], [4, 0, 3]])
+        with self.assertRaisesRegex(ValueError, 'already exists'):
+            m.append([('g1', {})])
+
+    def test_save_load(self):
+        m = CountMatrix.from_counts([('g1', {'a': 1}), ('g2', {'b': 2})])
+        fp = join(self.tmpd, 'm.npz')
+        m.save(fp)
+        obs = CountMatrix.load(fp)
+        self.assertEqual(obs.rows, m.rows)
+        self.assertEqual(obs.columns, m.columns)
+        self.assertEqual((obs.matrix != m.matrix).nnz, 0)
+
+    def test_build_matrices(self):
+        types, functions = build_matrices([self.gff3], cpus=2)
+        self.assertEqual(types.rows, ['g1'])
+        # append a new genome and skip the one already in
+        types, functions = build_matrices([self.gff3, self.gff3_gz], types=types, functions=functions)
+        self.assertEqual(types.rows, ['g1', 'g2'])
+        self.assertEqual(types.row('g2'), {'CDS': 2, 'tRNA': 1})
+        self.assertEqual(functions.row('g2'), functions.row('g1'))
+        self.assertEqual(functions.matrix.shape, (2, 3))
+        # the same genome name from different files
+        other = join(self.tmpd, 'other')
+        os.makedirs(other)
+        dup = join(other, 'g1.gff3')
+        with open(dup, 'w') as out:
+            out.write(GFF3)
+        with self.assertRaisesRegex(ValueError, 'g1 is both in'):
+            build_matrices([self.gff3, dup], types=types, functions=functions)
+
+    @skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_build_matrices_columnar(self):
+        imd = IntervalMetadata(None)
+        imd.add([(0, 9)], metadata={'type': 'CDS', 'ID': 'seq1_1',
+                                    'db_xref': ['Pfam:PF00001', 'KEGG:K00001']})
+        imd.add([(2, 5)], metadata={'type': 'terminator'})
+        seqs = [DNA('ATGAAATAA', metadata={'id': 'seq1'})]
+        features = {'seq1': FeatureStore.from_interval_metadata(imd)}
+        d = join(self.tmpd, 'dataset')
+        write_columnar(seqs, features, d, 'g3')
+        types, functions = build_matrices([self.gff3], columnar=d, dbs={'Pfam'})
+        self.assertEqual(types.rows, ['g1', 'g3'])
+        self.assertEqual(types.row('g3'), {'CDS': 1, 'terminator': 1})
+        self.assertEqual(functions.row('g3'), {'Pfam:PF00001': 1})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, micronota development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from unittest import TestCase, main
+from tempfile import mkdtemp
+from shutil import rmtree
+from os.path import join
+from io import StringIO
+import gzip
+
+from skbio import read, write, DNA
+from skbio.util import get_data_path
+
+from micronota.features import FeatureStore
+from micronota.output import write_gff3, write_genbank
+from micronota.packed import PackedSeqs
+
+
+class GFF3Tests(TestCase):
+    def setUp(self):
+        self.tmpd = mkdtemp()
+        self.imds = list(read(get_data_path('summarize.gff'), format='gff3'))
+
+    def test_write_gff3(self):
+        exp = StringIO()
+        write((i for i in self.imds), into=exp, format='gff3')
+        obs = StringIO()
+        write_gff3(((sid, FeatureStore.from_interval_metadata(imd))
+                    for sid, imd in self.imds), obs, chunk_size=3)
+        self.assertEqual(obs.getvalue(), exp.getvalue())
+
+    def test_write_gff3_gz(self):
+        exp = StringIO()
+        write_gff3(((sid, FeatureStore.from_interval_metadata(imd))
+                    for sid, imd in self.imds), exp)
+        fp = join(self.tmpd, 'o.gff3.gz')
+        write_gff3(((sid, FeatureStore.from_interval_metadata(imd))
+                    for sid, imd in self.imds), fp)
+        with gzip.open(fp, 'rt') as obs:
+            self.assertEqual(obs.read(), exp.getvalue())
+
+    def tearDown(self):
+        rmtree(self.tmpd)
+
+
+class GenBankTests(TestCase):
+    def setUp(self):
+        self.tmpd = mkdtemp()
+        self.records = []
+        for sid, imd in read(get_data_path('summarize.gff'), format='gff3'):
+            fs = FeatureStore.from_interval_metadata(imd)
+            seq = DNA('ACGT' * (int(fs.end.max()) // 4 + 1), metadata={'id': sid})
+            self.records.append((seq, fs))
+
+    def test_write_genbank(self):
+        exp = StringIO()
+        write_genbank(self.records, exp)
+        self.assertEqual(exp.getvalue().count('LOCUS'), len(self.records))
+        # the records are written in the input order by the processes
+        fp = join(self.tmpd, 'o.gbk')
+        write_genbank(iter(self.records * 2), fp, cpus=2, chunksize=1)
+        with open(fp) as obs:
+            self.assertEqual(obs.read(), exp.getvalue() * 2)
+        # the input sequences are not modified
+        self.assertNotIn('LOCUS', self.records[0][0].metadata)
+
+    def test_write_genbank_packed(self):
+        exp = StringIO()
+        write_genbank(self.records, exp)
+        seqs = PackedSeqs.from_seqs(seq for seq, _ in self.records)
+        try:
+            records = [(seq.metadata['id'], fs) for seq, fs in self.records]
+            for cpus in (1, 2):
+                obs = StringIO()
+                write_genbank(records, obs, cpus=cpus, chunksize=1, seqs=seqs)
+                self.assertEqual(obs.getvalue(), exp.getvalue())
+        finally:
+            seqs.close()
+            seqs.unlink()
+
+    def tearDown(self):
+        rmtree(self.tmpd)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, micronota development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from unittest import TestCase, main
+
+import numpy as np
+from skbio.metadata import IntervalMetadata
+
+from micronota.features import FeatureStore
+from micronota.overlap import overlaps, resolve
+
+
+class OverlapsTests(TestCase):
+    def test_overlaps(self):
+        rng = np.random.RandomState(0)
+        start = rng.randint(0, 1000, 200)
+        end = start + rng.randint(1, 50, 200)
+        obs = {frozenset(p) for p in overlaps(start, end)}
+        exp = {frozenset((i, j)) for i in range(200) for j in range(i + 1, 200)
+               if start[i] < end[j] and start[j] < end[i]}
+        self.assertEqual(obs, exp)
+
+    def test_adjacent(self):
+        self.assertEqual(list(overlaps(np.array([0, 10]), np.array([10, 20]))), [])
+
+
+class ResolveTests(TestCase):
+    def setUp(self):
+        imd = IntervalMetadata(5000)
+        # CDS over a tRNA
+        imd.add([(0, 300)], metadata={'type': 'CDS', 'strand': '+'})
+        imd.add([(100, 180)], metadata={'type': 'tRNA', 'strand': '-'})
+        # CDS only slightly overlapping a tRNA
+        imd.add([(500, 800)], metadata={'type': 'CDS', 'strand': '+'})
+        imd.add([(790, 870)], metadata={'type': 'tRNA', 'strand': '+'})
+        # the same rRNA predicted by rnammer and cmscan
+        imd.add([(1000, 2500)], metadata={'type': 'rRNA', 'strand': '+', 'score': '1350.1',
+                                          'source': 'Rfam'})
+        imd.add([(1001, 2510)], metadata={'type': 'rRNA', 'strand': '+', 'score': '1984.2',
+                                          'source': 'RNAmmer-1.2'})
+        # a terminator is never removed
+        imd.add([(1100, 1120)], metadata={'type': 'terminator'})
+        self.fs = FeatureStore.from_interval_metadata(imd)
+
+    def test_priority(self):
+        obs = resolve(self.fs, priority=['tRNA', 'CDS'])
+        self.assertEqual(obs.values('type'),
+                         ['tRNA', 'CDS', 'tRNA', 'rRNA', 'rRNA', 'terminator'])
+
+    def test_dedup(self):
+        obs = resolve(self.fs, dedup=['rRNA'])
+        self.assertEqual(len(obs), 6)
+        self.assertEqual(obs.values('source', obs.where({'type': 'rRNA'})), ['RNAmmer-1.2'])
+        # the source priority comes before the scores of different tools
+        obs = resolve(self.fs, dedup=['rRNA'], sources=['Rfam', 'RNAmmer-1.2'])
+        self.assertEqual(obs.values('source', obs.where({'type': 'rRNA'})), ['Rfam'])
+
+    def test_min_overlap(self):
+        obs = resolve(self.fs, priority=['tRNA', 'CDS'], min_overlap=0.01)
+        self.assertEqual(obs.values('type'),
+                         ['tRNA', 'tRNA', 'rRNA', 'rRNA', 'terminator'])
+
+    def test_chain(self):
+        # the CDS removed by the rRNA does not remove the tRNA
+        imd = IntervalMetadata(None)
+        imd.add([(0, 100)], metadata={'type': 'rRNA'})
+        imd.add([(50, 150)], metadata={'type': 'CDS'})
+        imd.add([(120, 140)], metadata={'type': 'ncRNA'})
+        obs = resolve(FeatureStore.from_interval_metadata(imd),
+                      priority=['rRNA', 'CDS', 'ncRNA'])
+        self.assertEqual(obs.values('type'), ['rRNA', 'ncRNA'])
+
+    def test_empty(self):
+        self.assertEqual(len(resolve(FeatureStore(), priority=['CDS'])), 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, micronota development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from unittest import TestCase, main
+from tempfile import mkdtemp
+from shutil import rmtree
+from os.path import join, exists
+from multiprocessing import Pool
+from io import StringIO
+import pickle
+
+import numpy as np
+import numpy.testing as npt
+from skbio import DNA
+
+from micronota.packed import PackedSeqs
+from micronota.stats import SeqStats
+from micronota.features import FeatureStore
+from micronota.workflow import create_faa
+
+
+def _fetch(args):
+    seqs, seq_id, start, end = args
+    return seqs.fetch(seq_id, start, end)
+
+
+class Tests(TestCase):
+    def setUp(self):
+        self.tmpd = mkdtemp()
+        rng = np.random.RandomState(0)
+        self.seqs = []
+        for i in range(20):
+            s = ''.join(rng.choice(list('ACGTACGTNRYacgt'), rng.randint(1, 500)))
+            s = 'N' * (i % 13) + s + 'N' * 10
+            self.seqs.append(DNA(s, metadata={'id': 'seq%d' % i}, lowercase=True))
+        self.packed = PackedSeqs.from_seqs(self.seqs)
+
+    def tearDown(self):
+        self.packed.close()
+        self.packed.unlink()
+        rmtree(self.tmpd)
+
+    def test_fetch(self):
+        self.assertEqual(len(self.packed), 20)
+        self.assertEqual(list(self.packed), ['seq%d' % i for i in range(20)])
+        rng = np.random.RandomState(1)
+        for seq in self.seqs:
+            seq_id, exp = seq.metadata['id'], str(seq)
+            self.assertEqual(self.packed.length(seq_id), len(seq))
+            self.assertEqual(self.packed[seq_id], seq)
+            for _ in range(20):
+                start = rng.randint(0, len(exp) + 1)
+                end = rng.randint(start, len(exp) + 5)
+                self.assertEqual(self.packed.fetch(seq_id, start, end), exp[start:end])
+
+    def test_file(self):
+        fp = join(self.tmpd, 'seqs.pack')
+        packed = PackedSeqs.from_seqs(self.seqs, fp)
+        other = PackedSeqs.open(fp)
+        for seq in self.seqs:
+            self.assertEqual(other.fetch(seq.metadata['id']), str(seq))
+        self.assertEqual(other.nbytes, packed.nbytes)
+        # only the creator removes the file
+        other.close()
+        other.unlink()
+        self.assertTrue(exists(fp))
+        packed.close()
+        packed.unlink()
+        self.assertFalse(exists(fp))
+
+    def test_pickle(self):
+        # only the name of the shared memory is pickled
+        self.assertLess(len(pickle.dumps(self.packed)), 200)
+        args = [(self.packed, 'seq%d' % i, 3, 50) for i in range(20)]
+        with Pool(2) as pool:
+            obs = pool.map(_fetch, args)
+        self.assertEqual(obs, [str(seq)[3:50] for seq in self.seqs])
+
+    def test_stats(self):
+        obs = self.packed.stats()
+        exp = SeqStats.from_seqs(self.seqs)
+        self.assertEqual(obs.ids, exp.ids)
+        npt.assert_array_equal(obs.counts, exp.counts)
+        npt.assert_array_equal(obs.n_runs, exp.n_runs)
+
+    def test_create_faa(self):
+        seq = DNA('CCATGGTTAAAGTTTAATT', metadata={'id': 'a'})
+        packed = PackedSeqs.from_seqs([seq])
+        fs = FeatureStore.from_features(
+            [([(2, 17)], None, {'type': 'CDS', 'ID': 'a_1', 'product': 'foo'}),
+             ([(2, 17)], None, {'type': 'CDS', 'ID': 'a_2', 'strand': '-'}),
+             ([(0, 5)], None, {'type': 'tRNA'})])
+        out = StringIO()
+        create_faa(packed, out, features={'a': fs})
+        self.assertEqual(out.getvalue(), '>a_1 foo\nMVKV*\n>a_2\nLNFNH\n')
+        packed.close()
+        packed.unlink()
+
+
+if __name__ == '__main__':
+    main()
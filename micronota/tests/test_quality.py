@@ -16,7 +16,10 @@ from skbio.metadata import IntervalMetadata
 
 from micronota.quality import (
     compute_seq_score, compute_rrna_score,
-    compute_trna_score, compute_gene_score)
+    compute_trna_score, compute_gene_score, write_markers, read_markers,
+    compute_bin_scores)
+from micronota.features import FeatureStore
+from micronota.stats import SeqStats
 
 
 class ScoreTests(TestCase):
@@ -64,6 +67,12 @@ class ScoreTests(TestCase):
         obs = compute_rrna_score([])
         self.assertEqual(obs, 0.1)
 
+        # the eukaryotic rRNAs are not scored
+        imd4 = IntervalMetadata(None)
+        imd4.add([(0, 1800)], metadata={'type': 'rRNA', 'product': '18s_rRNA'})
+        imd4.add([(0, 150)], metadata={'type': 'rRNA'})
+        self.assertEqual(compute_rrna_score([imd4]), 0.1)
+
         obs = compute_rrna_score([imd2])
         self.assertEqual(obs, 0.5)
 
@@ -101,6 +110,50 @@ class ScoreTests(TestCase):
                 obs = compute_gene_score(faa.name)
                 self.assertEqual(obs, exp)
 
+    def test_compute_gene_score_markers(self):
+        with NamedTemporaryFile('w') as tbl, NamedTemporaryFile() as tsv:
+            tbl.write('#                                                          --- full sequence ----\n')
+            for i in range(60):
+                # two hits of each marker
+                for j in range(2):
+                    tbl.write('%d_%d - fam%d PF%05d.1 1e-10 %d 0.0 x\n' % (i, j, i, i, 50 + j))
+            tbl.flush()
+            write_markers(tbl.name, tsv.name)
+            markers = read_markers(tsv.name)
+            self.assertEqual(len(markers), 60)
+            self.assertEqual(markers['PF00007'], [('7_1', 1e-10, 51), ('7_0', 1e-10, 50)])
+            self.assertAlmostEqual(compute_gene_score(marker_fp=tsv.name), 0.58)
+
+    def test_compute_bin_scores(self):
+        seqs = [DNA('A' * 9990 + 'N' * 10, metadata={'id': 'c1'}),
+                DNA('A' * 9000 + 'N' * 1000, metadata={'id': 'c2'}),
+                DNA('A' * 5000 + 'Y' * 5000, metadata={'id': 'c3'}),
+                DNA('A' * 100, metadata={'id': 'c4'})]
+        bins = {'c1': 'b1', 'c2': 'b1', 'c3': 'b2'}
+        features = {}
+        for sid, md in [('c1', {'type': 'tRNA', 'product': 'tRNA-Ala'}),
+                        ('c2', {'type': 'rRNA', 'product': '16s_rRNA'}),
+                        ('c3', {'type': 'rRNA', 'product': '5s_rRNA'}),
+                        ('c4', {'type': 'tRNA', 'product': 'tRNA-Cys'})]:
+            features[sid] = FeatureStore.from_features(
+                [([(0, 1500)], None, md), ([(0, 300)], None, {'type': 'CDS'})])
+        markers = {'PF1': [('c1_1', 1e-10, 50), ('c3_2', 1e-10, 40)],
+                   'PF2': [('c2_1', 1e-10, 50), ('c1_3', 1e-10, 40)],
+                   'PF3': [('c4_1', 1e-10, 50)]}
+        for cpus in (1, 2):
+            obs = compute_bin_scores(bins, SeqStats.from_seqs(seqs), features, markers, cpus)
+            self.assertEqual(obs.keys(), {'b1', 'b2'})
+            for b, contigs, genes in [('b1', ['c1', 'c2'], 2), ('b2', ['c3'], 1)]:
+                stores = [features[c] for c in contigs]
+                self.assertAlmostEqual(obs[b]['seq'], compute_seq_score([s for s in seqs if s.metadata['id'] in contigs]))
+                self.assertEqual(obs[b]['tRNA'], compute_trna_score(stores))
+                self.assertEqual(obs[b]['rRNA'], compute_rrna_score(stores))
+                self.assertAlmostEqual(obs[b]['gene'], 0.1)
+        obs = compute_bin_scores({'c%d' % i: 'all' for i in range(1, 5)}, SeqStats.from_seqs(seqs),
+                                 features, {'PF%d' % i: [('c1_%d' % i, 1, 1)] for i in range(102)})
+        self.assertAlmostEqual(obs['all']['gene'], 1)
+        self.assertEqual(obs['all']['rRNA'], compute_rrna_score(list(features.values())))
+
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,70 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, micronota development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import gzip
+from unittest import TestCase, main
+from tempfile import mkdtemp
+from shutil import rmtree
+from os.path import join
+
+import numpy as np
+import numpy.testing as npt
+from skbio import DNA
+
+from micronota.stats import SeqStats, composition
+
+
+class Tests(TestCase):
+    def setUp(self):
+        self.tmpd = mkdtemp()
+        rng = np.random.RandomState(0)
+        self.seqs = []
+        for i in range(20):
+            s = ''.join(rng.choice(list('ACGTNNNNNNRY'), rng.randint(1, 2000)))
+            s = 'N' * (i % 12) + s + 'N' * 10
+            self.seqs.append(DNA(s, metadata={'id': 'seq%d' % i}))
+
+    def test_composition(self):
+        for seq in self.seqs:
+            counts, runs = composition(seq)
+            self.assertEqual(runs, len(list(seq.find_with_regex('(N{10,})'))))
+            self.assertEqual(counts.sum(), len(seq))
+            self.assertEqual(counts[-1], 0)
+
+    def test_stats(self):
+        stats = SeqStats.from_seqs(self.seqs)
+        self.assertEqual(len(stats), 20)
+        self.assertIn('seq3', stats)
+        npt.assert_array_equal(stats.length, [len(s) for s in self.seqs])
+        for seq in self.seqs:
+            self.assertEqual(stats.frequencies(seq.metadata['id']), seq.frequencies())
+            obs = stats.frequencies(seq.metadata['id'], relative=True)
+            exp = seq.frequencies(relative=True)
+            self.assertEqual(obs.keys(), exp.keys())
+            for k in obs:
+                self.assertAlmostEqual(obs[k], exp[k])
+        self.assertEqual(stats.invalid.sum(), sum(s.count('R') + s.count('Y') for s in self.seqs))
+
+    def test_write_read(self):
+        stats = SeqStats.from_seqs(self.seqs)
+        for fp in (join(self.tmpd, 'stats.tsv'), join(self.tmpd, 'stats.tsv.gz')):
+            stats.write(fp)
+            obs = SeqStats.read(fp)
+            self.assertEqual(obs.ids, stats.ids)
+            npt.assert_array_equal(obs.counts, stats.counts)
+            npt.assert_array_equal(obs.n_runs, stats.n_runs)
+            npt.assert_almost_equal(obs.gc, stats.gc)
+        with gzip.open(fp, 'rt') as fh:
+            self.assertTrue(fh.readline().startswith('#seq_id'))
+
+    def tearDown(self):
+        rmtree(self.tmpd)
+
+
+if __name__ == '__main__':
+    main()
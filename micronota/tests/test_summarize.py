@@ -8,14 +8,21 @@
 
 from unittest import TestCase, main
 from os.path import join
+from io import StringIO
 from tempfile import mkdtemp
 from shutil import rmtree
 
-from skbio import write, read, Sequence
+import numpy as np
+import numpy.testing as npt
+from skbio import write, read, Sequence, DNA
 from skbio.metadata import IntervalMetadata
 from skbio.util import get_data_path
 
-from micronota.summarize import summarize, summarize_iter
+from micronota.summarize import (
+    summarize, summarize_iter, codon_counts, compute_condon_usage, rscu, CODONS,
+    SummaryWriter)
+from micronota.features import FeatureStore
+from micronota.stats import SeqStats
 
 
 class Tests(TestCase):
@@ -52,6 +59,61 @@ class Tests(TestCase):
         exp = [[159662]] * 3
         self.assertListEqual(obs, exp)
 
+    def test_summarize_iter_stream(self):
+        def seqs():
+            for i in range(3):
+                # the features of a seq are only final when the seq is yielded
+                features[str(i)] = FeatureStore.from_features([([(0, 2)], None, {'type': 'tRNA'})] * i)
+                yield DNA('ACGT' * (i + 1), metadata={'id': str(i)})
+        features = {}
+        obs = summarize_iter(seqs(), types=('length', 'nuc_freq', 'tRNA'), features=features)
+        self.assertEqual(next(obs), [4, {'A': 1, 'C': 1, 'G': 1, 'T': 1}, 0])
+        self.assertEqual(len(features), 1)
+        self.assertEqual([i[2] for i in obs], [1, 2])
+
+    def test_summary_writer(self):
+        seqs = [DNA('ACGTNN', metadata={'id': 'a'}), DNA('AAYA', metadata={'id': 'b'})]
+        fs = FeatureStore.from_features([([(0, 2)], None, {'type': 'CDS'})])
+        exp = StringIO()
+        summary = SummaryWriter(exp)
+        for seq in seqs:
+            summary.add(seq.metadata['id'], fs, seq)
+        obs = StringIO()
+        summary = SummaryWriter(obs, stats=SeqStats.from_seqs(seqs))
+        for seq in seqs:
+            summary.add(seq.metadata['id'], fs)
+        self.assertEqual(obs.getvalue(), exp.getvalue())
+        self.assertEqual(obs.getvalue().splitlines()[2].split('\t')[:3], ['b', '4', 'A:0.75;Y:0.25'])
+
+    def test_codon_counts(self):
+        gb = Sequence.read(self.input_genbank_fp, format='genbank')
+        ids, obs = codon_counts([gb])
+        cds = list(gb.interval_metadata.query(metadata={'type': 'CDS'}))
+        self.assertEqual(obs.shape, (175, 64))
+        for i, f in enumerate(cds):
+            fna = DNA.concat([DNA(gb[s:e]) for s, e in f.bounds])
+            if f.metadata.get('strand') == '-':
+                fna = fna.reverse_complement()
+            exp = [0] * 64
+            for j in range(0, len(fna) // 3 * 3, 3):
+                exp[CODONS.index(str(fna[j:j + 3]))] += 1
+            self.assertListEqual(obs[i].tolist(), exp)
+            # the CDS are complete
+            self.assertEqual(len(fna) % 3, 0)
+
+    def test_rscu(self):
+        counts = np.zeros((2, 64))
+        counts[0, CODONS.index('AAA')] = 3
+        counts[0, CODONS.index('AAG')] = 1
+        counts[1, CODONS.index('TGG')] = 5
+        obs = rscu(counts)
+        npt.assert_array_equal(obs[:, CODONS.index('AAA')], [1.5, np.nan])
+        npt.assert_array_equal(obs[:, CODONS.index('AAG')], [0.5, np.nan])
+        npt.assert_array_equal(obs[:, CODONS.index('TGG')], [np.nan, 1])
+        # the 6 codons of Leu
+        obs = compute_condon_usage(DNA('CTACTCCTGCTTTTATTGNNN'))
+        self.assertTrue(all(obs[c] == (1, 1) for c in ['CTA', 'CTC', 'CTG', 'CTT', 'TTA', 'TTG']))
+
     def tearDown(self):
         rmtree(self.tmpd)
 
@@ -0,0 +1,116 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, micronota development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from unittest import TestCase, main
+from tempfile import mkdtemp
+from shutil import rmtree
+from os.path import join, exists
+
+from skbio import read
+from skbio.metadata import IntervalMetadata
+
+from micronota.tiling import (
+    windows, write_tiles, scan_tiles, rescale_evalues, setup_tiling, untile)
+
+
+class Tests(TestCase):
+    def setUp(self):
+        self.tmpd = mkdtemp()
+        self.seq = join(self.tmpd, 'in.fna')
+        with open(self.seq, 'w') as out:
+            out.write('>s1\nAAAACCCCGG\nGGTT\n>s2\nACG\n')
+
+    def tearDown(self):
+        rmtree(self.tmpd)
+
+    def test_windows(self):
+        self.assertEqual(windows(14, 6, 2), [(0, 6), (4, 10), (8, 14)])
+        self.assertEqual(windows(6, 6, 2), [(0, 6)])
+        with self.assertRaises(ValueError):
+            windows(14, 2, 2)
+
+    def test_write_tiles(self):
+        out_fps = [join(self.tmpd, '%d.fna' % i) for i in range(2)]
+        self.assertEqual(write_tiles(self.seq, out_fps, 6, 2), 4)
+        obs = {i.metadata['id']: str(i) for fp in out_fps for i in read(fp, format='fasta')}
+        self.assertEqual(obs, {'s1:0-6': 'AAAACC', 's1:4-10': 'CCCCGG',
+                               's1:8-14': 'GGGGTT', 's2:0-3': 'ACG'})
+
+    def test_scan_tiles(self):
+        out_fp = join(self.tmpd, 'out.txt')
+        log = join(self.tmpd, 'out.log')
+        scan_tiles("(echo '##gff-version 3'; grep '>' {input}) > {output}; echo {input} > {log}",
+                   self.seq, out_fp, 6, 2, threads=3, log=log)
+        with open(out_fp) as fh:
+            obs = fh.read().split('\n')
+        self.assertEqual(obs[0], '##gff-version 3')
+        self.assertEqual(sorted(obs[1:-1]), ['>s1:0-6', '>s1:4-10', '>s1:8-14', '>s2:0-3'])
+        with open(log) as fh:
+            self.assertEqual(len(fh.readlines()), 3)
+        self.assertFalse(exists(out_fp + '.tiles'))
+
+    def test_rescale_evalues(self):
+        fp = join(self.tmpd, 'cmscan.txt')
+        lines = ['#target name accession query name\n',
+                 'tRNA RF00005 s1:0-6 - cm 1 71 1 6 + no 1 0.55 0.0 50.5 1e-10 ! transfer RNA\n',
+                 'tRNA RF00005 s1:4-10 - cm 1 71 1 6 + no 1 0.55 0.0 10.5 6 ? transfer RNA\n',
+                 'tRNA RF00005 s2 - cm 1 71 1 3 + no 1 0.55 0.0 50.5 2 ! transfer RNA\n']
+        with open(fp, 'w') as out:
+            out.writelines(lines)
+        rescale_evalues(fp, self.seq)
+        with open(fp) as fh:
+            obs = fh.readlines()
+        # the 2nd hit is dropped as its E-value on s1 (14) is above 10
+        self.assertEqual(len(obs), 3)
+        self.assertEqual(obs[1].split()[15], '2.3e-10')
+        self.assertEqual(obs[1].split()[16], '!')
+        self.assertEqual(obs[1].split(None, 17)[17], 'transfer RNA\n')
+        self.assertEqual(obs[2], lines[3])
+        # not included any more on the whole sequence
+        with open(fp, 'w') as out:
+            out.write('tRNA RF00005 s1:0-6 - cm 1 71 1 6 + no 1 0.55 0.0 20.5 0.005 ! -\n')
+        rescale_evalues(fp, self.seq, '-E 1')
+        with open(fp) as fh:
+            self.assertEqual(fh.read().split()[15:17], ['0.012', '?'])
+        # the E-values are kept if the search space is set
+        with open(fp, 'w') as out:
+            out.writelines(lines)
+        rescale_evalues(fp, self.seq, '--cut_tc -Z 10')
+        with open(fp) as fh:
+            self.assertEqual(fh.readlines(), lines)
+
+    def test_setup_tiling(self):
+        tile = {'size': 6, 'overlap': 2}
+        # a multi-contig genome with a long contig
+        rules = {'cmscan': {'params': '--cut_tc', 'threads': 1}, 'prodigal': {'threads': 1}}
+        self.assertIs(setup_tiling(rules, tile, 4, [14, 3]), tile)
+        # the search space is not set over all the sequences
+        self.assertEqual(rules, {'cmscan': {'params': '--cut_tc', 'threads': 4},
+                                 'prodigal': {'threads': 1}})
+        self.assertIsNone(setup_tiling(rules, tile, 4, [6, 3]))
+        self.assertIsNone(setup_tiling(rules, tile, 1, [14, 3]))
+        self.assertIsNone(setup_tiling(rules, None, 4, [14, 3]))
+
+    def test_untile(self):
+        # the same tRNA on the overlap of 2 windows and a truncated one
+        w1, w2, w3 = IntervalMetadata(None), IntervalMetadata(None), IntervalMetadata(None)
+        w1.add([(4, 6)], metadata={'type': 'tRNA', 'strand': '+'})
+        w1.add([(5, 6)], metadata={'type': 'tRNA', 'strand': '-'})
+        w2.add([(0, 2)], metadata={'type': 'tRNA', 'strand': '+'})
+        w2.add([(1, 3)], metadata={'type': 'tRNA', 'strand': '-'})
+        w3.add([(0, 3)], metadata={'type': 'tRNA'})
+        other = IntervalMetadata(None)
+        obs = untile({'s1:0-6': w1, 's1:4-10': w2, 's2:0-3': w3, 's3': other}, {'s1', 's2', 's3'})
+        self.assertEqual([(i.bounds, i.metadata['strand']) for i in obs['s1']._intervals],
+                         [([(4, 6)], '+'), ([(5, 7)], '-')])
+        self.assertEqual([i.bounds for i in obs['s2']._intervals], [[(0, 3)]])
+        self.assertIs(obs['s3'], other)
+
+
+if __name__ == '__main__':
+    main()
@@ -14,7 +14,8 @@ from shutil import rmtree
 from skbio import write, read, Sequence, DNA
 from skbio.metadata import IntervalMetadata
 
-from micronota.util import _filter_sequence_ids, filter_partial_genes, check_seq
+from micronota.util import (_filter_sequence_ids, filter_partial_genes, check_seq,
+                            split_fasta, merge_prodigal, LazyString, close_mmaps)
 
 
 class Tests(TestCase):
@@ -84,6 +85,58 @@ class Tests(TestCase):
     def tearDown(self):
         rmtree(self.tmpd)
 
+    def test_lazy_string_rewritten(self):
+        fp = join(self.tmpd, 'repeats.txt')
+        with open(fp, 'w') as f:
+            f.write('ACGT')
+        s = LazyString(fp, 0, 4)
+        self.assertEqual(str(s), 'ACGT')
+        # the file rewritten in the same process is mapped again
+        with open(fp, 'w') as f:
+            f.write('TTTTGG')
+        self.assertEqual(str(LazyString(fp, 2, 4)), 'TTGG')
+        close_mmaps()
+        self.assertEqual(str(s), 'TTTT')
+
+    def test_split_fasta(self):
+        fp = join(self.tmpd, 'in.fna')
+        with open(fp, 'w') as out:
+            out.write('>s1\nAAAA\nAA\n>s2\nAA\n>s3\nAAAAAA\n>s4\nA\n')
+        out_fps = [join(self.tmpd, '%d.fna' % i) for i in range(3)]
+        self.assertEqual(split_fasta(fp, out_fps), [1, 2, 1])
+        obs = [str(i) for f in out_fps for i in read(f, format='fasta')]
+        self.assertEqual(''.join(obs), 'AAAAAAAAAAAAAAA')
+        # more shards than sequences
+        out_fps = [join(self.tmpd, '%d.fna' % i) for i in range(6)]
+        self.assertEqual(split_fasta(fp, out_fps), [1, 1, 1, 1, 0, 0])
+
+    def test_merge_prodigal(self):
+        shards = []
+        for i, seq_ids in enumerate([['s1'], ['s2', 's3']]):
+            files = [join(self.tmpd, '%d.%s' % (i, ext)) for ext in ('gff', 'faa', 'ffn')]
+            with open(files[0], 'w') as gff, open(files[1], 'w') as faa, open(files[2], 'w') as ffn:
+                gff.write('##gff-version  3\n')
+                for n, seq_id in enumerate(seq_ids, 1):
+                    gff.write('# Sequence Data: seqnum=%d;seqlen=9;seqhdr="%s"\n' % (n, seq_id))
+                    gff.write('%s\tProdigal_v2.6.3\tCDS\t1\t9\t.\t+\t0\tID=%d_1;partial=00;\n' % (seq_id, n))
+                    faa.write('>%s_1 # 1 # 9 # 1 # ID=%d_1;partial=00\nMK*\n' % (seq_id, n))
+                    ffn.write('>%s_1 # 1 # 9 # 1 # ID=%d_1;partial=00\nATGAAATAA\n' % (seq_id, n))
+            shards.append(files)
+        out = [join(self.tmpd, 'prodigal.%s' % ext) for ext in ('gff', 'faa', 'fna')]
+        merge_prodigal(shards, *out)
+        with open(out[0]) as fh:
+            gff = fh.read().split('\n')
+        self.assertEqual(gff[0], '##gff-version  3')
+        self.assertEqual(sum(line.startswith('##gff') for line in gff), 1)
+        self.assertEqual([line.split('ID=')[1][:3] for line in gff if 'ID=' in line],
+                         ['1_1', '2_1', '3_1'])
+        self.assertIn('seqnum=3;', gff[5])
+        with open(out[1]) as fh:
+            self.assertEqual([line.split('ID=')[1][:3] for line in fh if line.startswith('>')],
+                             ['1_1', '2_1', '3_1'])
+        obs = [i.metadata['id'] for i in read(out[2], format='fasta')]
+        self.assertEqual(obs, ['s1_1', 's2_1', 's3_1'])
+
 
 if __name__ == '__main__':
     main()
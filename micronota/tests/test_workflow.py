@@ -7,17 +7,27 @@
 # ----------------------------------------------------------------------------
 
 from unittest import TestCase, main
+from unittest.mock import patch
 from tempfile import mkdtemp
-from os.path import join, splitext, exists
-from shutil import rmtree
+from os.path import join, splitext, exists, dirname, abspath
+from shutil import rmtree, copyfile
 from io import StringIO
+import gzip
+import os
 
 import yaml
 from skbio import DNA, read, write
 from skbio.metadata import IntervalMetadata
 from skbio.util import get_data_path
 
-from micronota.workflow import annotate, summarize, create_faa
+from micronota.workflow import annotate, summarize, create_faa, select_cm_db, integrate, check_filter
+from micronota.module import cmscan
+from micronota.summarize import SummaryWriter
+from micronota.packed import PackedSeqs
+from micronota.fasta import read_fasta
+from micronota.faidx import FastaIndex
+from micronota.stats import SeqStats
+from micronota.database.rfam import CMLibrary
 
 
 class Tests(TestCase):
@@ -50,6 +60,111 @@ class Tests(TestCase):
         self.assertTrue(exists(output + '.fna'))
         self.assertTrue(exists(output + '.gff3'))
 
+    def test_integrate_unindexed(self):
+        # the input given to integrate is not necessarily indexable
+        annot_dir = join(self.tmpd, 'annot')
+        os.makedirs(annot_dir)
+        open(join(annot_dir, 'minced.ok'), 'w').close()
+        with open(join(annot_dir, 'minced.gff'), 'w') as f:
+            f.write('##gff-version 3\n'
+                    's1\tminCED\trepeat_region\t2\t5\t2\t.\t.\tID=CRISPR1\n')
+        fasta = '>s1\nACGTAC\nGT\nACG\n>s2\nAC\n'
+        wrapped = join(self.tmpd, 'wrapped.fna')
+        with open(wrapped, 'w') as f:
+            f.write(fasta)
+        gz = join(self.tmpd, 'in.fna.gz')
+        with gzip.open(gz, 'wt') as f:
+            f.write(fasta)
+        for fp in (wrapped, gz):
+            out_fp = join(self.tmpd, 'out.gff3')
+            summary = StringIO()
+            seqs, features = integrate(fp, annot_dir, None, out_fp, summary=SummaryWriter(summary))
+            self.assertEqual(seqs.lengths, {'s1': 11, 's2': 2})
+            self.assertEqual(str(seqs['s1']), 'ACGTACGTACG')
+            self.assertEqual(features['s1'].count('type'), {'repeat_region': 1})
+            self.assertEqual([line.split('\t')[:2] for line in summary.getvalue().splitlines()[1:]],
+                             [['s1', '11'], ['s2', '2']])
+            self.assertFalse(exists(fp + '.fai'))
+        # the packed seqs are read by the processes formatting the GenBank records
+        packed = PackedSeqs.from_seqs(read_fasta(wrapped))
+        try:
+            out_fp = join(self.tmpd, 'out.gbk')
+            integrate(wrapped, annot_dir, None, out_fp, out_fmt='genbank', cpus=2, seqs=packed)
+            with open(out_fp) as f:
+                obs = f.read()
+            self.assertEqual(obs.count('LOCUS'), 2)
+            self.assertIn('repeat_region', obs)
+        finally:
+            packed.close()
+            packed.unlink()
+
+    def test_integrate_gff3_lazy(self):
+        # the GFF3 output of indexed seqs does not load any seq
+        annot_dir = join(self.tmpd, 'annot')
+        os.makedirs(annot_dir)
+        open(join(annot_dir, 'minced.ok'), 'w').close()
+        with open(join(annot_dir, 'minced.gff'), 'w') as f:
+            f.write('##gff-version 3\n'
+                    's1\tminCED\trepeat_region\t2\t5\t2\t.\t.\tID=CRISPR1\n')
+        fp = join(self.tmpd, 'in.fna')
+        with open(fp, 'w') as f:
+            f.write('>s1\nACGTACGTACG\n>s2\nAC\n')
+        stats = SeqStats.from_seqs(read(fp, format='fasta', constructor=DNA))
+        out_fp = join(self.tmpd, 'out.gff3')
+        summary = StringIO()
+        loaded = AssertionError('a seq is loaded')
+        with patch('micronota.faidx.DNA', side_effect=loaded), \
+                patch('micronota.workflow.read', side_effect=loaded), \
+                patch('micronota.workflow.read_fasta', side_effect=loaded), \
+                patch.object(PackedSeqs, 'from_seqs', side_effect=loaded):
+            seqs, features = integrate(fp, annot_dir, None, out_fp, seqs=FastaIndex(fp),
+                                       summary=SummaryWriter(summary, stats))
+        self.assertEqual(features['s1'].count('type'), {'repeat_region': 1})
+        with open(out_fp) as f:
+            self.assertIn('CRISPR1', f.read())
+        self.assertEqual(len(summary.getvalue().splitlines()), 3)
+
+    def test_check_filter(self):
+        check_filter('cmscan', cmscan.Module, {'evalue': 0.01, 'types': ['rRNA']})
+        with self.assertRaisesRegex(ValueError, 'Unknown filter confidence for rule cmscan. It supports evalue'):
+            check_filter('cmscan', cmscan.Module, {'confidence': 90})
+        # the filter is checked before the output is parsed
+        annot_dir = join(self.tmpd, 'annot')
+        os.makedirs(annot_dir)
+        open(join(annot_dir, 'minced.ok'), 'w').close()
+        open(join(annot_dir, 'minced.gff'), 'w').close()
+        with open(self.i, 'w') as f:
+            f.write('>s1\nACGT\n')
+        with self.assertRaisesRegex(ValueError, 'rule minced. Its output can not be filtered'):
+            integrate(self.i, annot_dir, None, None, out_fmt=None, filters={'minced': {'score': 1}})
+
+    def test_select_cm_db(self):
+        rfam = join(self.tmpd, 'rfam.cm')
+        copyfile(join(dirname(abspath(__file__)), '..', 'database', 'tests', 'data', 'rfam.cm'), rfam)
+        for kingdom, exp in [('bacteria', ['RF00001']), ('eukarya', ['RF00001', 'RF00002'])]:
+            rules = {'cmscan': {'params': ''}, 'cmscan_rRNA': {'params': ''},
+                     'aragorn': {'params': ''}}
+            select_cm_db(rules, rfam, kingdom, press=False)
+            self.assertEqual([i[0] for i in CMLibrary(rules['cmscan']['db']).models], ['RF00003'])
+            self.assertEqual([i[0] for i in CMLibrary(rules['cmscan_rRNA']['db']).models], exp)
+        # the db given in the config is kept
+        rules = {'cmscan': {'db': 'foo.cm'}}
+        select_cm_db(rules, rfam, 'bacteria', press=False)
+        self.assertEqual(rules, {'cmscan': {'db': 'foo.cm'}})
+
+    def test_select_cm_db_dry_run(self):
+        d = join(self.tmpd, 'rfam')
+        os.makedirs(d)
+        rfam = join(d, 'rfam.cm')
+        copyfile(join(dirname(abspath(__file__)), '..', 'database', 'tests', 'data', 'rfam.cm'), rfam)
+        rules = {'cmscan': {'params': ''}, 'cmscan_rRNA': {'params': ''}}
+        select_cm_db(rules, rfam, 'bacteria', dry_run=True)
+        # nothing is written next to the library
+        self.assertEqual(os.listdir(d), ['rfam.cm'])
+        self.assertEqual(rules['cmscan_rRNA']['db'], rfam)
+        with self.assertRaisesRegex(ValueError, 'does not exist'):
+            select_cm_db({'cmscan': {'params': ''}}, join(d, 'foo.cm'), 'bacteria')
+
     def test_summarize(self):
         gff = get_data_path('summarize.gff')
         seqs = [DNA('A' * 5000000, metadata={'id': 'gi|556503834|ref|NC_000913.3|'}),
@@ -89,6 +204,24 @@ class Tests(TestCase):
             obs = out.read()
             self.assertEqual(exp, obs)
 
+    def test_create_faa_batch(self):
+        imd = IntervalMetadata(None)
+        imd.add([(0, 12)], metadata={'type': 'CDS', 'ID': 'a', 'transl_table': 4})
+        imd.add([(0, 6), (9, 15)], metadata={'type': 'CDS', 'ID': 'b', 'strand': '-'})
+        imd.add([(12, 18)], metadata={'type': 'CDS', 'ID': 'c'})
+        imd.add([(0, 9)], metadata={'type': 'CDS', 'ID': 'd'})
+        seq = DNA('ATGTGATAAGGGTTTNCA', interval_metadata=imd)
+        with self.assertLogs('micronota.workflow', 'WARNING'):
+            create_faa([seq], self.o)
+        with open(self.o) as out:
+            # "c" has a degenerate nucleotide
+            self.assertEqual(out.read(), '>a\nMW*G\n>b\nKPSH\n>d\nM**\n')
+        # compressed according to the suffix
+        with self.assertLogs('micronota.workflow', 'WARNING'):
+            create_faa([seq], self.o + '.gz')
+        with gzip.open(self.o + '.gz', 'rt') as out:
+            self.assertEqual(out.read(), '>a\nMW*G\n>b\nKPSH\n>d\nM**\n')
+
     def tearDown(self):
         rmtree(self.tmpd)
 
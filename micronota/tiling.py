@@ -0,0 +1,328 @@
+r'''
+Sequence tiling
+===============
+
+.. currentmodule:: micronota.tiling
+
+This module (:mod:`micronota.tiling`) cuts long sequences into
+overlapping windows so a sequence scanner (eg cmscan or aragorn) runs on
+the windows in parallel even if the genome is a single chromosome.
+
+Each window is named "<seq ID>:<start>-<end>" with its 0-based start
+and its end on the sequence. After the scanner outputs of the windows
+are parsed, the features are shifted back to the sequence coordinates.
+The duplicate and truncated features in the overlap of 2 adjacent
+windows are dropped: a feature is only kept from the window that owns
+its midpoint, ie the overlap is split in half between the 2 windows.
+So a feature is found once and in full as long as it is not longer than
+the overlap.
+'''
+
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, micronota development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import re
+import subprocess
+from multiprocessing.pool import ThreadPool
+from os import makedirs
+from os.path import join
+from shutil import rmtree, copyfileobj
+from logging import getLogger
+
+from skbio.metadata import IntervalMetadata
+
+from .faidx import FastaIndex
+
+
+logger = getLogger(__name__)
+
+
+# the rules of the sequence scanners that can run on the windows
+TILED = ('cmscan', 'cmscan_rRNA', 'aragorn', 'minced', 'tandem_repeats_finder')
+
+_TILE = re.compile(r'^(.*):(\d+)-(\d+)$')
+
+
+def windows(length, size, overlap):
+    '''Return the (start, end) of the windows tiling a sequence.
+
+    Examples
+    --------
+    >>> windows(10, 4, 1)
+    [(0, 4), (3, 7), (6, 10)]
+    >>> windows(3, 4, 1)
+    [(0, 3)]
+    '''
+    if overlap >= size:
+        raise ValueError('The overlap (%d) must be shorter than the window (%d).' % (overlap, size))
+    step = size - overlap
+    tiles = []
+    start = 0
+    while True:
+        end = min(start + size, length)
+        tiles.append((start, end))
+        if end == length:
+            return tiles
+        start += step
+
+
+def write_tiles(fp, out_fps, size, overlap, width=60):
+    '''Write the windows of the sequences in a FASTA file into shards.
+
+    The windows are dealt to the shards in turn, so the shards are of
+    similar total length.
+
+    Parameters
+    ----------
+    fp : str
+        the uncompressed FASTA file
+    out_fps : list of str
+        the shard files
+    size : int
+        the window length
+    overlap : int
+        the overlap length between adjacent windows
+
+    Returns
+    -------
+    int
+        the number of windows
+    '''
+    seqs = FastaIndex(fp)
+    outs = [open(i, 'w') for i in out_fps]
+    n = 0
+    try:
+        for seq_id, length in seqs.lengths.items():
+            for start, end in windows(length, size, overlap):
+                s = seqs.fetch(seq_id, start, end)
+                out = outs[n % len(outs)]
+                out.write('>%s:%d-%d\n' % (seq_id, start, end))
+                for i in range(0, len(s), width):
+                    out.write(s[i:i + width])
+                    out.write('\n')
+                n += 1
+    finally:
+        for out in outs:
+            out.close()
+    return n
+
+
+def _concat(fps, out_fp):
+    '''Concatenate the scanner outputs of the shards.
+
+    The repeated GFF3 header of minced and the summary line closing the
+    output of aragorn are dropped from the shards except the first and
+    last ones respectively.
+    '''
+    end = re.compile(r'>end\s+\d+ sequences')
+    with open(out_fp, 'w') as out:
+        for i, fp in enumerate(fps):
+            with open(fp) as fh:
+                for line in fh:
+                    if i > 0 and line.startswith('##gff-version'):
+                        continue
+                    if i < len(fps) - 1 and end.match(line):
+                        continue
+                    out.write(line)
+
+
+def scan_tiles(cmd, seq, out_fp, size, overlap, threads=1, log=None):
+    '''Run a sequence scanner on the windows of the sequences in parallel.
+
+    Parameters
+    ----------
+    cmd : str
+        the shell command with the placeholders "{input}", "{output}" and
+        "{log}" for the FASTA file of windows, the output file and the
+        log file of each run.
+    seq : str
+        the uncompressed FASTA file
+    out_fp : str
+        the output file, ie the outputs of all the runs concatenated
+    size, overlap : int
+        the window length and the overlap between adjacent windows
+    threads : int
+        the number of runs at the same time
+    log : str, optional
+        the file to concatenate the logs of the runs into
+    '''
+    d = out_fp + '.tiles'
+    makedirs(d, exist_ok=True)
+    shards = [join(d, '%d.fna' % i) for i in range(max(threads, 1))]
+    n = write_tiles(seq, shards, size, overlap)
+    shards = shards[:n]
+    outs = [i + '.out' for i in shards]
+    logs = [i + '.log' for i in shards]
+    logger.debug('scan %d windows of %s in %d shards' % (n, seq, len(shards)))
+
+    def run(args):
+        subprocess.run(cmd.format(input=args[0], output=args[1], log=args[2]),
+                       shell=True, check=True, executable='/bin/bash')
+
+    try:
+        with ThreadPool(len(shards)) as pool:
+            pool.map(run, zip(shards, outs, logs))
+        _concat(outs, out_fp)
+    finally:
+        if log is not None:
+            with open(log, 'w') as out:
+                for fp in logs:
+                    try:
+                        with open(fp) as fh:
+                            copyfileobj(fh, out)
+                    except FileNotFoundError:
+                        pass
+        rmtree(d)
+
+
+def rescale_evalues(fp, seq, params=''):
+    '''Rescale the E-values of cmscan on the windows to their sequences.
+
+    cmscan computes the E-values of the hits on a query sequence for a
+    search space of twice its length (both strands), unless it is set
+    with ``-Z``. So the E-value of a hit on a window is rescaled by the
+    ratio of the sequence length to the window length, which gives the
+    E-value of the hit as if the whole sequence were scanned. The hits
+    that would not have been reported on the whole sequence (with the
+    E-value threshold ``-E``, 10 by default) are dropped, and the
+    inclusion column ("!" or "?") is set again with the E-value
+    threshold ``--incE`` (0.01 by default). It is kept as it is if the
+    inclusion is by score (``--incT`` or ``--cut_*``).
+
+    Parameters
+    ----------
+    fp : str
+        the tabular output (``--tblout``) of cmscan on the windows. It is
+        rewritten in place.
+    seq : str
+        the FASTA file of the sequences
+    params : str
+        the params of cmscan. Nothing is rescaled if they set ``-Z``.
+    '''
+    opts = params.split()
+    if '-Z' in opts:
+        return
+    if '-E' in opts:
+        max_evalue = float(opts[opts.index('-E') + 1])
+    elif '-T' in opts or any(i.startswith('--cut_') for i in opts):
+        # reported by score
+        max_evalue = None
+    else:
+        max_evalue = 10
+    if '--incE' in opts:
+        inc_evalue = float(opts[opts.index('--incE') + 1])
+    elif '--incT' in opts or any(i.startswith('--cut_') for i in opts):
+        inc_evalue = None
+    else:
+        inc_evalue = 0.01
+    lengths = FastaIndex(seq).lengths
+    with open(fp) as fh:
+        lines = fh.readlines()
+    with open(fp, 'w') as out:
+        for line in lines:
+            if line.startswith('#'):
+                out.write(line)
+                continue
+            # the description of the target can have spaces
+            items = line.rstrip('\n').split(None, 17)
+            m = _TILE.match(items[2])
+            if m is not None and m.group(1) in lengths:
+                start, end = int(m.group(2)), int(m.group(3))
+                evalue = float(items[15]) * lengths[m.group(1)] / (end - start)
+                if max_evalue is not None and evalue > max_evalue:
+                    continue
+                items[15] = '%.2g' % evalue
+                if inc_evalue is not None:
+                    items[16] = '!' if evalue <= inc_evalue else '?'
+                line = ' '.join(items) + '\n'
+            out.write(line)
+
+
+def setup_tiling(rules, tile, cpus, lengths):
+    '''Set the sequence scanner rules to run on the windows of the sequences.
+
+    The scanners are only tiled if there are multiple cpus and a
+    sequence is longer than the window.
+
+    Parameters
+    ----------
+    rules : dict
+        the config of the rules to run. The threads of the scanner rules
+        are set to ``cpus``.
+    tile : dict or None
+        the window "size" and "overlap"
+    cpus : int
+    lengths : Iterable of int
+        the lengths of the sequences
+
+    Returns
+    -------
+    dict or None
+        ``tile`` or ``None`` if the sequences are not tiled
+    '''
+    tiled = [r for r in TILED if r in rules]
+    if tile is None or cpus <= 1 or not tiled or max(lengths, default=0) <= tile['size']:
+        return None
+    logger.debug('tile the sequences for %s' % ', '.join(tiled))
+    for r in tiled:
+        rules[r]['threads'] = cpus
+    return tile
+
+
+def untile(result, seq_ids):
+    '''Shift the features on the windows back to the sequences.
+
+    Parameters
+    ----------
+    result : dict
+        the parsed scanner output of seq or window ID to ``IntervalMetadata``.
+    seq_ids : set of str
+        the IDs of the sequences. The keys of ``result`` that are not
+        windows of these sequences are kept as they are.
+
+    Returns
+    -------
+    dict
+        seq ID to ``IntervalMetadata``
+
+    Examples
+    --------
+    >>> imd1, imd2 = IntervalMetadata(None), IntervalMetadata(None)
+    >>> _ = imd1.add([(1, 3)], metadata={'type': 'tRNA'})
+    >>> _ = imd1.add([(5, 9)], metadata={'type': 'tRNA'})
+    >>> _ = imd2.add([(1, 5)], metadata={'type': 'tRNA'})
+    >>> merged = untile({'s1:0-10': imd1, 's1:4-14': imd2}, {'s1'})
+    >>> [i.bounds for i in merged['s1']._intervals]
+    [[(1, 3)], [(5, 9)]]
+    '''
+    out = {}
+    tiles = {}
+    for key, imd in result.items():
+        m = _TILE.match(key)
+        if m is None or m.group(1) not in seq_ids:
+            out[key] = imd
+            continue
+        tiles.setdefault(m.group(1), []).append((int(m.group(2)), int(m.group(3)), imd))
+    for seq_id, ws in tiles.items():
+        ws.sort(key=lambda w: w[0])
+        imd = out.get(seq_id)
+        if imd is None:
+            imd = out[seq_id] = IntervalMetadata(None)
+        for i, (start, end, wimd) in enumerate(ws):
+            # the window owns the midpoints up to the middle of its overlaps
+            # with its neighbours. A window without any feature is missing
+            # here, but then its neighbours do not have features in
+            # common with it to drop.
+            lo = (start + ws[i - 1][1]) / 2 if i > 0 else float('-inf')
+            hi = (ws[i + 1][0] + end) / 2 if i < len(ws) - 1 else float('inf')
+            for intvl in wimd._intervals:
+                bounds = [(b + start, e + start) for b, e in intvl.bounds]
+                mid = (bounds[0][0] + bounds[-1][1]) / 2
+                if lo <= mid < hi:
+                    imd.add(bounds, intvl.fuzzy, intvl.metadata)
+    return out
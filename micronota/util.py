@@ -15,12 +15,21 @@ This module (:mod:`micronota.util`) provides various utility functionality,
 # The full license is in the file COPYING.txt, distributed with this software.
 # ----------------------------------------------------------------------------
 
+import re
 from unittest import TestCase
 from sqlite3 import connect
 from logging import getLogger
+from collections import OrderedDict
+from os import stat
+from mmap import mmap, ACCESS_READ
 
+import numpy as np
 from skbio import read, write, Sequence, DNA
 
+from .compress import open_file
+from .faidx import _scan
+from .fasta import read_fasta
+
 
 logger = getLogger(__name__)
 
@@ -90,7 +99,7 @@ def filter_ident_overlap(df, pident=90, overlap=80):
     return df_filtered
 
 
-def check_seq(in_seq, in_fmt=None, discard=lambda s: len(s) < 500):
+def check_seq(in_seq, in_fmt=None, discard=lambda s: len(s) < 500, min_len=0, cpus=1):
     '''Validate and filter input seq file.
 
     1. filter seq;
@@ -100,11 +109,18 @@ def check_seq(in_seq, in_fmt=None, discard=lambda s: len(s) < 500):
     Parameters
     ----------
     in_seq : str or Iterable of ``Sequence`` objects
-        input seq file path if it is a str
+        input seq file path if it is a str. If it is compressed and
+        ``in_fmt`` is given, it is decompressed on multiple cores.
     in_fmt : str
         the format of seq file
     discard : callable
         a callable that applies on a ``Sequence`` and return a boolean
+    min_len : int
+        the sequences shorter than this are dropped before being
+        decoded if ``in_seq`` is a FASTA file path. It saves the cost of
+        creating the ``Sequence`` objects of the short contigs.
+    cpus : int
+        the number of processes to scan the FASTA file
 
     Yields
     ------
@@ -117,27 +133,39 @@ def check_seq(in_seq, in_fmt=None, discard=lambda s: len(s) < 500):
     logger.info('Filter and validate input sequences')
     ids = set()
 
+    fh = None
     if isinstance(in_seq, str):
-        # allow lowercase in DNA seq
-        in_seq = read(in_seq, format=in_fmt, constructor=DNA, lowercase=True)
-
-    for seq in in_seq:
-        seq = seq.degap()
-        if discard(seq):
-            continue
-
-        if in_fmt == 'genbank':
-            seq.metadata['id'] = seq.metadata['LOCUS']['locus_name']
-        try:
-            ident = seq.metadata['id']
-        except KeyError:
-            raise KeyError('Ill input file format: at least one sequences do not have IDs.')
-        if ident in ids:
-            raise ValueError(
-                'Duplicate seq IDs in your input file: {}'.format(ident))
+        if in_fmt == 'fasta':
+            in_seq = read_fasta(in_seq, min_len, cpus)
+        elif in_fmt is not None and in_seq.endswith(('.gz', '.bz2')):
+            # the stream is not seekable for skbio to verify the format
+            fh = open_file(in_seq)
+            in_seq = read(fh, format=in_fmt, verify=False, constructor=DNA, lowercase=True)
         else:
-            ids.add(ident)
-            yield seq
+            # allow lowercase in DNA seq
+            in_seq = read(in_seq, format=in_fmt, constructor=DNA, lowercase=True)
+
+    try:
+        for seq in in_seq:
+            seq = seq.degap()
+            if discard(seq):
+                continue
+
+            if in_fmt == 'genbank':
+                seq.metadata['id'] = seq.metadata['LOCUS']['locus_name']
+            try:
+                ident = seq.metadata['id']
+            except KeyError:
+                raise KeyError('Ill input file format: at least one sequences do not have IDs.')
+            if ident in ids:
+                raise ValueError(
+                    'Duplicate seq IDs in your input file: {}'.format(ident))
+            else:
+                ids.add(ident)
+                yield seq
+    finally:
+        if fh is not None:
+            fh.close()
 
 
 def filter_partial_genes(in_fp, out_fp, out_fmt='gff3'):
@@ -162,6 +190,214 @@ def filter_partial_genes(in_fp, out_fp, out_fmt='gff3'):
             imd.write(out, seq_id=seq_id, format='gff3')
 
 
+def split_fasta(fp, out_fps):
+    '''Split a FASTA file into shards of consecutive sequences of similar total length.
+
+    The sequences keep their order: the shards concatenated in order
+    are the input file. Each shard has at least a sequence if there are
+    enough sequences.
+
+    Parameters
+    ----------
+    fp : str
+        the uncompressed FASTA file
+    out_fps : list of str
+        the shard files
+
+    Returns
+    -------
+    list of int
+        the number of sequences in each shard
+    '''
+    lengths = np.array([row[1] for row in _scan(fp)], dtype=np.int64)
+    n = len(out_fps)
+    cum = np.cumsum(lengths)
+    # the index of the first sequence of each shard after the first
+    cuts = []
+    prev = 0
+    for k in range(1, n):
+        i = int(np.searchsorted(cum, cum[-1] * k / n)) + 1 if len(cum) else 0
+        # leave a sequence for each of the following shards if possible
+        i = min(max(min(i, len(lengths) - (n - k)), prev + 1), len(lengths))
+        cuts.append(i)
+        prev = i
+    sizes = np.diff([0] + cuts + [len(lengths)]).tolist()
+    outs = [open(i, 'w') for i in out_fps]
+    try:
+        shard, left = 0, sizes[0]
+        with open(fp) as fh:
+            for line in fh:
+                if line.startswith('>'):
+                    while left == 0:
+                        shard += 1
+                        left = sizes[shard]
+                    left -= 1
+                outs[shard].write(line)
+    finally:
+        for out in outs:
+            out.close()
+    return sizes
+
+
+# prodigal gene IDs are "<ordinal of the seq>_<ordinal of the gene on the seq>"
+_PRODIGAL_ID = re.compile(r'(ID=|seqnum=)(\d+)')
+
+
+def merge_prodigal(shards, gff, faa, fna):
+    '''Merge the outputs of prodigal run on the shards of the input sequences.
+
+    Prodigal numbers the sequences from 1 in each shard, so the sequence
+    ordinal in the gene IDs (eg "1_1") and the "seqnum" of the sequence
+    comments is shifted by the number of sequences in the previous
+    shards. The merged output is the same as running prodigal on the
+    whole input at once.
+
+    Parameters
+    ----------
+    shards : list of tuple of str
+        the gff, faa and fna output files of each shard, in order
+    gff, faa, fna : str
+        the merged output files
+    '''
+    offset = 0
+    with open(gff, 'w') as gff_out, open(faa, 'w') as faa_out, open(fna, 'w') as fna_out:
+        for i, (gff_in, faa_in, fna_in) in enumerate(shards):
+            def shift(m):
+                return '%s%d' % (m.group(1), int(m.group(2)) + offset)
+            n = 0
+            with open(gff_in) as fh:
+                for line in fh:
+                    if line.startswith('##gff-version'):
+                        if i == 0:
+                            gff_out.write(line)
+                        continue
+                    if line.startswith('# Sequence Data:'):
+                        n += 1
+                    gff_out.write(_PRODIGAL_ID.sub(shift, line))
+            for fp, out in ((faa_in, faa_out), (fna_in, fna_out)):
+                with open(fp) as fh:
+                    for line in fh:
+                        if line.startswith('>'):
+                            line = _PRODIGAL_ID.sub(shift, line)
+                        out.write(line)
+            offset += n
+
+
+class LazyString:
+    r'''A string stored as a reference into a file and read on demand.
+
+    It is used to keep heavy metadata (eg the repeat of a tandem repeat)
+    out of memory until a writer emits it.
+
+    Parameters
+    ----------
+    fp : str
+        file path
+    offset : int
+        byte offset of the string in the file
+    length : int
+        byte length of the string
+    sep : str, optional
+        if given, the whitespace-separated fields of the string are
+        joined with it when materialized.
+
+    Examples
+    --------
+    >>> from tempfile import NamedTemporaryFile
+    >>> with NamedTemporaryFile('w') as f:
+    ...     _ = f.write('ATGC  TTAA\n')
+    ...     f.flush()
+    ...     s = LazyString(f.name, 0, 10, sep='/')
+    ...     str(s)
+    'ATGC/TTAA'
+    '''
+    __slots__ = ('fp', 'offset', 'length', 'sep')
+
+    def __init__(self, fp, offset, length, sep=None):
+        self.fp = fp
+        self.offset = offset
+        self.length = length
+        self.sep = sep
+
+    def __str__(self):
+        s = _mmap_file(self.fp)[self.offset:self.offset + self.length].decode()
+        if self.sep is not None:
+            s = self.sep.join(s.split())
+        return s
+
+    def __repr__(self):
+        return '%s(%r, %d, %d)' % (type(self).__name__, self.fp, self.offset, self.length)
+
+    def __eq__(self, other):
+        return str(self) == str(other)
+
+    def __hash__(self):
+        return hash(str(self))
+
+    def translate(self, table):
+        # skbio GFF3 writer escapes the attribute values with ``str.translate``
+        return str(self).translate(table)
+
+
+# the memory maps of the files of lazy strings, keyed by their path and
+# the mtime and size when mapped, from the least to the most recently used
+_MMAPS = OrderedDict()
+_MAX_MMAPS = 32
+
+
+def _mmap_file(fp):
+    st = stat(fp)
+    key = (fp, st.st_mtime_ns, st.st_size)
+    mm = _MMAPS.get(key)
+    if mm is not None:
+        _MMAPS.move_to_end(key)
+        return mm
+    # a rewritten file is mapped again
+    for k in [k for k in _MMAPS if k[0] == fp]:
+        _MMAPS.pop(k).close()
+    with open(fp, 'rb') as fh:
+        mm = mmap(fh.fileno(), 0, access=ACCESS_READ)
+    _MMAPS[key] = mm
+    while len(_MMAPS) > _MAX_MMAPS:
+        _MMAPS.popitem(last=False)[1].close()
+    return mm
+
+
+def close_mmaps():
+    '''Close the memory maps of the files of lazy strings.
+
+    They are mapped again when a lazy string is read after it.
+    '''
+    while _MMAPS:
+        _MMAPS.popitem()[1].close()
+
+
+class _Line(str):
+    '''A line that knows its byte offset in the file.'''
+
+
+def offset_lines(fh):
+    '''Yield the lines of a text file with their byte offsets attached.
+
+    The lines are yielded as ``str`` with an extra ``offset`` attribute.
+    It assumes the file has "\\n" line endings.
+
+    Parameters
+    ----------
+    fh : file object
+
+    Yields
+    ------
+    str
+    '''
+    offset = 0
+    for line in fh:
+        line = _Line(line)
+        line.offset = offset
+        offset += len(line.encode())
+        yield line
+
+
 class _DBTest(TestCase):
     def _test_eq_db(self, db1, db2):
         '''Test if two database files have the same contents.'''
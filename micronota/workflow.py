@@ -10,7 +10,6 @@ import os
 from os.path import join, exists, basename, splitext, expanduser, abspath
 from logging import getLogger
 from importlib import import_module
-from time import gmtime, strftime
 
 from pkg_resources import resource_filename
 from snakemake import snakemake
@@ -19,9 +18,21 @@ import yaml
 import numpy as np
 
 from . import module
-from .util import _add_cds_metadata, check_seq
-from .quality import compute_gene_score, compute_trna_score, compute_rrna_score, compute_seq_score
-from . import __version__
+from .util import _add_cds_metadata, check_seq, close_mmaps
+from .tiling import TILED, setup_tiling, untile
+from .database.rfam import CMLibrary, kingdom_subset
+from .fasta import read_fasta
+from .stats import SeqStats
+from .packed import PackedSeqs
+from .faidx import FastaIndex, write_fai
+from .features import FeatureStore
+from .overlap import resolve
+from .output import write_gff3, write_genbank, open_output
+from .compress import open_file
+from .columnar import write_columnar
+from .summarize import SummaryWriter, codon_counts, write_codon_usage, translation_table, _cds_stores, _cds_codons
+from .quality import (compute_gene_score, compute_trna_score, compute_rrna_score, compute_seq_score,
+                      compute_bin_scores, read_bins, read_markers)
 
 
 logger = getLogger(__name__)
@@ -29,7 +40,7 @@ logger = getLogger(__name__)
 
 def annotate(in_fp, in_fmt, min_len, out_dir, out_fmt,
              gcode, kingdom, mode, task,
-             cpus, force, dry_run, quality, config):
+             cpus, force, dry_run, quality, config, bins=None):
     '''Annotate the sequences in the input file.
 
     Parameters
@@ -56,6 +67,9 @@ def annotate(in_fp, in_fmt, min_len, out_dir, out_fmt,
         Force to overwrite.
     dry_run : bool
     config : config file for snakemake
+    bins : str, optional
+        the tab delimited file of contig ID and bin ID. If it is given
+        with ``quality``, the quality scores are computed for each bin.
     '''
     logger.debug('working dir: %s' % out_dir)
     if force:
@@ -71,28 +85,45 @@ def annotate(in_fp, in_fmt, min_len, out_dir, out_fmt,
     out_prefix = join(out_dir, prefix)
     seq_fp = abspath(out_prefix + '.fna')
 
+    ## read the config
+    if config is None:
+        config = resource_filename(__package__, kingdom + '.yaml')
+        if not exists(config):
+            # the kingdom only differs in the models and params set below
+            config = resource_filename(__package__, 'bacteria.yaml')
+    logger.debug('set annotation in %s mode.' % mode)
+    logger.debug('set annotation as %s.' % kingdom)
+    logger.debug('use config file: %s.' % config)
+    with open(config) as fh:
+        cfg = yaml.load(fh)
+
+    general = cfg.pop('general', {})
+    # compress all the final outputs
+    gz = '.gz' if general.get('compress_output', False) else ''
+    stats_fp = out_prefix + '.stats.tsv' + gz
+
     ## validate and filter the input seq file
     if exists(seq_fp):
         # do not overwrite because all the snakemake steps will be rerun when
         # this file is updated.
         logger.debug('the filtered sequence file already exists. skip validating step.')
+        if exists(stats_fp):
+            stats = SeqStats.read(stats_fp)
+        else:
+            stats = SeqStats.from_seqs(read_fasta(seq_fp))
+            stats.write(stats_fp)
     else:
-        ids = set()
+        # compute the composition stats in the same pass
+        stats = SeqStats()
         with open(seq_fp, 'w') as out:
-            for seq in check_seq(in_fp, in_fmt, lambda s: len(s) < min_len):
+            for seq in check_seq(in_fp, in_fmt, lambda s: len(s) < min_len, min_len=min_len, cpus=cpus):
                 write(seq, format='fasta', into=out)
+                stats.add(seq)
+        stats.write(stats_fp)
+        write_fai(seq_fp)
 
     ## prepare snakemake workflow
     snakefile = resource_filename(__package__, 'Snakefile')
-    if config is None:
-        config = resource_filename(__package__, kingdom + '.yaml')
-    logger.debug('set annotation in %s mode.' % mode)
-    logger.debug('set annotation as %s.' % kingdom)
-    logger.debug('use config file: %s.' % config)
-    with open(config) as fh:
-        cfg = yaml.load(fh)
-
-    general = cfg.pop('general', {})
     rules = {}
     if not task:
         task = [i for i in cfg]
@@ -115,10 +146,41 @@ def annotate(in_fp, in_fmt, min_len, out_dir, out_fmt,
         elif mode == 'metagenome':
             param = '-p meta ' + param
         rules['prodigal']['params'] = param
+        # train once on the whole genome and then predict on the contig shards
+        # in parallel with the same params. A shard holds whole contigs, so a
+        # genome of a single chromosome is predicted by a single process.
+        shards = min(cpus, len(stats))
+        if mode != 'metagenome' and shards > 1:
+            closed = '-c ' if mode == 'finished' else ''
+            rules['prodigal']['train'] = '-p single %s-g %d' % (closed, gcode)
+            rules['prodigal']['shards'] = shards
     if 'aragorn' in rules:
         rules['aragorn']['params'] = '%s -gc%d' % (rules['aragorn']['params'], gcode)
+    gene_quality = (mode != 'metagenome' or bins is not None) and quality is True and 'prodigal' in rules
+    if gene_quality:
+        # search the essential genes as part of the workflow, in parallel with the other rules
+        rules['essential_genes'] = general.get(
+            'essential_genes', {'params': '', 'priority': 50, 'threads': cpus})
     if 'rnammer' in rules:
         rules['rnammer']['params'] = '-S %s %s' % (kingdom[:3], rules['rnammer']['params'])
+    rfam = general.get('rfam')
+    if rfam is not None:
+        select_cm_db(rules, expanduser(rfam), kingdom, general.get('rfam_cache'),
+                     press=not dry_run, dry_run=dry_run)
+    for r in ('cmscan', 'cmscan_rRNA'):
+        if r in rules and not rules[r].get('db'):
+            raise ValueError('No CM DB for %s. Set its db or the Rfam library (rfam) in the config.' % r)
+    # tile the long sequences so the sequence scanners run on all the cpus
+    tile = setup_tiling(rules, general.get('tile'), cpus, stats.length.tolist())
+
+    # the thresholds to filter the annotations while parsing tool outputs
+    filters = {k: v.pop('filter') for k, v in rules.items() if v and 'filter' in v}
+    for rule, kwargs in filters.items():
+        try:
+            mod = import_module('.%s' % rule, module.__name__)
+        except ImportError:
+            raise ValueError('The output of rule %s can not be filtered.' % rule)
+        check_filter(rule, mod.Module, kwargs)
 
     # only run the targets specified in the yaml file
     targets = list(rules.keys())
@@ -126,6 +188,8 @@ def annotate(in_fp, in_fmt, min_len, out_dir, out_fmt,
         logger.warning('No annotation task to run')
         return
     rules['seq'] = seq_fp
+    if tile is not None:
+        rules['tile'] = tile
 
     cfg_file = join(out_dir, 'snakemake.yaml')
     with open(cfg_file, 'w') as out:
@@ -152,38 +216,163 @@ def annotate(in_fp, in_fmt, min_len, out_dir, out_fmt,
 
     if success:
         # if snakemake finishes successfully
-        out_fp = '%s.%s' % (out_prefix, out_fmt)
-        protein_xref = general.get('protein_xref')
-        if protein_xref is not None:
-            protein_xref = expanduser(protein_xref)
-        seqs = integrate(seq_fp, out_prefix, protein_xref, out_fp, out_fmt)
-
-        logger.info('Write summary of the annotation')
-        with open(out_prefix + '.summary.txt', 'w') as out:
-            summarize(seqs.values(), out)
-        if mode != 'metagenome' and quality is True:
-            with open(out_prefix + '.quality.txt', 'w') as out:
-                if mode == 'finish':
-                    contigs = False
-                else:
-                    contigs = True
-                seq_score = compute_seq_score(seqs.values(), contigs)
-                trna_score = rrna_score = gene_score = np.nan
-                if 'tRNA' in task:
-                    trna_score = compute_trna_score((i.interval_metadata for i in seqs.values()))
-                if 'rRNA' in task:
-                    rrna_score = compute_rrna_score((i.interval_metadata for i in seqs.values()))
-                if 'CDS' in task:
-                    gene_score = compute_gene_score(faa_fp)
-                out.write('# seq_score: %.2f  tRNA_score: %.2f  rRNA_score: %.2f  gene_score: %.2f\n' % (
-                    seq_score, trna_score, rrna_score, gene_score))
+        codon_usage = general.get('codon_usage', False)
+        if out_fmt == 'genbank' or codon_usage:
+            # the whole seqs are needed; pack them into a memory mapped file
+            # that the GenBank output processes share
+            seqs = PackedSeqs.from_seqs(read_fasta(seq_fp), out_prefix + '.packed')
+        else:
+            # the seqs are only loaded when they are needed for output
+            seqs = FastaIndex(seq_fp)
+        try:
+            out_fp = '%s.%s' % (out_prefix, out_fmt)
+            index = general.get('index_output', False) and out_fmt == 'gff3'
+            if index:
+                out_fp += '.gz'
+            else:
+                out_fp += gz
+            protein_xref = general.get('protein_xref')
+            if protein_xref is not None:
+                protein_xref = expanduser(protein_xref)
+            # the summary is written while the annotation is written out
+            with open_file(out_prefix + '.summary.txt' + gz, 'w') as out:
+                seqs, features = integrate(seq_fp, out_prefix, protein_xref, out_fp,
+                                           out_fmt=out_fmt, filters=filters,
+                                           lazy=general.get('lazy_metadata', False),
+                                           conflict=general.get('conflict'), cpus=cpus, index=index,
+                                           columnar=general.get('columnar'),
+                                           summary=SummaryWriter(out, stats),
+                                           seqs=seqs)
+
+            if codon_usage:
+                with open_file(out_prefix + '.codon_usage.txt' + gz, 'w') as out:
+                    write_codon_usage(*codon_counts(seqs, features), out, gcode)
+            if mode != 'metagenome' and quality is True:
+                with open_file(out_prefix + '.quality.txt' + gz, 'w') as out:
+                    if mode == 'finished':
+                        contigs = False
+                    else:
+                        contigs = True
+                    seq_score = compute_seq_score(stats, contigs)
+                    trna_score = rrna_score = gene_score = np.nan
+                    if 'tRNA' in task:
+                        trna_score = compute_trna_score(features.values())
+                    if 'rRNA' in task:
+                        rrna_score = compute_rrna_score(features.values())
+                    if gene_quality:
+                        gene_score = compute_gene_score(marker_fp=join(out_prefix, 'essential_genes.tsv'))
+                    out.write('# seq_score: %.2f  tRNA_score: %.2f  rRNA_score: %.2f  gene_score: %.2f\n' % (
+                        seq_score, trna_score, rrna_score, gene_score))
+            if bins is not None and quality is True:
+                markers = None
+                if gene_quality:
+                    markers = read_markers(join(out_prefix, 'essential_genes.tsv'))
+                scores = compute_bin_scores(read_bins(bins), stats, features, markers, cpus)
+                with open_file(out_prefix + '.bin_quality.txt' + gz, 'w') as out:
+                    out.write('#bin\tseq_score\ttRNA_score\trRNA_score\tgene_score\n')
+                    for b, score in scores.items():
+                        # the scores of the tasks not run are not available
+                        for t in ('tRNA', 'rRNA'):
+                            if t not in task:
+                                score[t] = np.nan
+                        out.write('%s\t%.2f\t%.2f\t%.2f\t%.2f\n' % (
+                            b, score['seq'], score['tRNA'], score['rRNA'], score['gene']))
+        finally:
+            if isinstance(seqs, PackedSeqs):
+                seqs.close()
+                seqs.unlink()
     else:
         logger.error('The snakemake run failed.')
 
     logger.info('Done with annotation')
 
 
-def integrate(seq_fp, annot_dir, protein_xref, out_fp, quality=False, out_fmt='gff3'):
+def select_cm_db(rules, rfam, kingdom, cache_dir=None, press=True, dry_run=False):
+    '''Set the CM DB of the cmscan rules without one to the Rfam subset they need.
+
+    The ncRNA rule (cmscan) scans all the Rfam models except the tRNA,
+    tmRNA and rRNA ones, which are predicted by the other rules; the rRNA
+    rule (cmscan_rRNA) only scans the rRNA models of the kingdom. The
+    subsets are extracted from the Rfam library, pressed and cached (see
+    ``micronota.database.rfam.CMLibrary``).
+
+    Parameters
+    ----------
+    rules : dict
+        the config of the rules to run. It is updated in place.
+    rfam : str
+        the Rfam CM library (Rfam.cm)
+    kingdom : str
+        bacteria, archaea or eukarya
+    cache_dir : str, optional
+        the directory of the cached subsets. Default is the directory of
+        the library.
+    press : bool
+        whether to ``cmpress`` the subsets
+    dry_run : bool
+        do not write anything to the database directory: the library is
+        not indexed and the subsets are not extracted. The rules are set
+        to scan the whole library instead.
+
+    Raises
+    ------
+    ValueError
+        if a rule needs a subset and the library does not exist
+    '''
+    lib = None
+    for rule, operation in (('cmscan', 'default'), ('cmscan_rRNA', kingdom)):
+        if rule not in rules or rules[rule].get('db'):
+            continue
+        if not exists(rfam):
+            raise ValueError('The Rfam CM library %s does not exist. Set rfam in the config '
+                             'or the db of %s.' % (rfam, rule))
+        if dry_run:
+            rules[rule]['db'] = rfam
+            logger.debug('dry run: the subset of the CM DB for %s is not extracted' % rule)
+            continue
+        if lib is None:
+            lib = CMLibrary(rfam)
+        rules[rule]['db'] = kingdom_subset(lib, operation, cache_dir, press)
+        logger.debug('use the CM DB %s for %s' % (rules[rule]['db'], rule))
+
+
+def check_filter(rule, mod, kwargs):
+    '''Check the filter of a rule is supported by the parser of its output.
+
+    Parameters
+    ----------
+    rule : str
+    mod : ``BaseMod``
+        the module (or its class) parsing the output of the rule
+    kwargs : dict
+        the filter, ie the keyword arguments passed to ``mod.parse``
+
+    Raises
+    ------
+    ValueError
+        if the parser does not take a filter parameter
+    '''
+    unknown = sorted(set(kwargs) - set(mod.filters))
+    if unknown:
+        if mod.filters:
+            supported = 'It supports %s.' % ', '.join(mod.filters)
+        else:
+            supported = 'Its output can not be filtered.'
+        raise ValueError('Unknown filter %s for rule %s. %s' % (', '.join(unknown), rule, supported))
+
+
+class _SeqDict(dict):
+    '''seq_id to ``Sequence`` in memory, with the lengths as in ``FastaIndex``.'''
+    @property
+    def lengths(self):
+        return {k: len(v) for k, v in self.items()}
+
+    def length(self, seq_id):
+        return len(self[seq_id])
+
+
+def integrate(seq_fp, annot_dir, protein_xref, out_fp, quality=False, out_fmt='gff3', filters=None, lazy=False,
+              conflict=None, cpus=1, index=False, columnar=None, summary=None, seqs=None):
     '''integrate all the annotations and write to disk.
 
     Parameters
@@ -192,18 +381,53 @@ def integrate(seq_fp, annot_dir, protein_xref, out_fp, quality=False, out_fmt='g
         input seq file name.
     out_dir : str
         annotation output directory.
-    out_fmt : str
-        output format
+    out_fmt : str or None
+        output format. ``None`` to only write the columnar dataset.
+    filters : dict, optional
+        key is the rule name and value is the dict of keyword arguments
+        (eg ``{'evalue': 0.01}``) passed to the ``parse`` method of its
+        module to filter the annotations while parsing.
+    lazy : bool, optional
+        keep the heavy metadata (eg repeat and hairpin sequences) on disk
+        and only read them when the output is written.
+    conflict : dict, optional
+        the keyword arguments (``priority``, ``dedup`` and ``min_overlap``)
+        of ``micronota.overlap.resolve`` to remove the conflicting features.
+        Default is not to check the overlaps between features.
+    cpus : int, optional
+        the number of processes to format the GenBank output
+    index : bool, optional
+        write the GFF3 output BGZF compressed with the region and ID
+        indexes for random access (see ``micronota.index``).
+    columnar : str, optional
+        the directory of the Parquet dataset to also write the annotation
+        to (see ``micronota.columnar``). The genome is named after the
+        input seq file.
+    summary : ``SummaryWriter``, optional
+        the summary table to write the row of each seq to, as soon as
+        its annotation is final. The seqs are given to it if it has no
+        seqs to compute the stats from.
+    seqs : ``PackedSeqs`` or ``FastaIndex``, optional
+        the packed or indexed seqs of ``seq_fp``, which are only unpacked
+        or loaded when they are needed for output. Default is to read
+        ``seq_fp`` (which can be compressed) into memory.
 
     Returns
     -------
-    dict
-        key is the str of seq_id and ``Sequence`` objects
+    tuple of dict
+        The first maps seq_id to ``Sequence`` object; the second has
+        seq_id as key and ``FeatureStore`` of its annotation as value.
     '''
     logger.info('Integrate annotation for output')
-    seqs = {}
-    for seq in read(seq_fp, format='fasta'):
-        seqs[seq.metadata['id']] = seq
+    if filters is None:
+        filters = {}
+    if seqs is None:
+        seqs = _SeqDict((seq.metadata['id'], seq)
+                        for seq in read(seq_fp, format='fasta', constructor=DNA, lowercase=True))
+    if summary is not None and summary.seqs is None:
+        summary.seqs = seqs
+    # the features from each tool for each seq
+    parts = {seq_id: [] for seq_id in seqs}
 
     rules = {splitext(f)[0] for f in os.listdir(annot_dir) if f.endswith('.ok')}
     if 'diamond' in rules:
@@ -218,43 +442,67 @@ def integrate(seq_fp, annot_dir, protein_xref, out_fp, quality=False, out_fmt='g
         logger.debug('parse the result from %s output' % rule)
         mod = import_module('.%s' % rule, module.__name__)
         obj = mod.Module(directory=annot_dir)
-        obj.parse()
-        for seq_id, imd in obj.result.items():
-            seq = seqs[seq_id]
-            imd._upper_bound = len(seq)
+        kwargs = dict(filters.get(rule, {}))
+        check_filter(rule, obj, kwargs)
+        if lazy and obj.lazy:
+            kwargs['lazy'] = True
+        obj.parse(**kwargs)
+        result = obj.result
+        if rule in TILED:
+            # the outputs on the windows of the long sequences
+            result = untile(result, parts)
+        for seq_id, imd in result.items():
             if rule == 'prodigal':
                 cds_metadata = protein.get(seq_id, {})
                 _add_cds_metadata(seq_id, imd, cds_metadata)
-            seq.interval_metadata.merge(imd)
+            parts[seq_id].append(FeatureStore.from_interval_metadata(imd))
+        # release the parsed intervals of this tool
+        del obj
+
+    features = {}
+
+    def finalize():
+        '''Merge the features of each seq as it is written out.'''
+        for sid in seqs:
+            # merge the features from all the tools into position order
+            fs = FeatureStore.concat(parts.pop(sid), seqs.length(sid), sort=True)
+            if conflict is not None:
+                fs = resolve(fs, **conflict)
+            # index the features once so the summaries and quality scores
+            # are lookups instead of scans over all the features
+            for key in ('type', 'product', 'source'):
+                fs.index(key)
+            features[sid] = fs
+            if summary is not None:
+                summary.add(sid, fs)
+            yield sid, fs
 
     # write out the annotation
-    if out_fmt == 'genbank':
-        with open(out_fp, 'w') as out:
-            for sid, seq in seqs.items():
-                seq.metadata['LOCUS'] = {
-                    'locus_name': sid,
-                    'size': len(seq),
-                    'unit': 'bp',
-                    'mol_type': 'DNA',
-                    'shape': 'linear',
-                    'division': None,
-                    'date': strftime("%d-%b-%Y", gmtime())}
-                seq.metadata['ACCESSION'] = ''
-                seq.metadata['VERSION'] = ''
-                seq.metadata['KEYWORDS'] = '.'
-                seq.metadata['SOURCE'] = {'ORGANISM': 'genus species', 'taxonomy': 'unknown'}
-                seq.metadata['COMMENT'] = 'Annotated with %s %s' % (__package__, __version__)
-                write(seq, into=out, format=out_fmt)
-    elif out_fmt == 'gff3':
-        write(((sid, seq.interval_metadata) for sid, seq in seqs.items()),
-              into=out_fp, format=out_fmt)
-    else:
-        raise ValueError('Unknown specified output format: %r' % out_fmt)
-
-    return seqs
-
-
-def summarize(seqs, out):
+    try:
+        if out_fmt == 'genbank':
+            if isinstance(seqs, PackedSeqs):
+                # the processes read the seqs from the shared store
+                write_genbank(finalize(), out_fp, cpus, seqs=seqs)
+            else:
+                write_genbank(((seqs[sid], fs) for sid, fs in finalize()), out_fp, cpus)
+        elif out_fmt == 'gff3':
+            write_gff3(finalize(), out_fp, index=index)
+        elif out_fmt is None:
+            for _ in finalize():
+                pass
+        else:
+            raise ValueError('Unknown specified output format: %r' % out_fmt)
+        if columnar is not None:
+            genome = splitext(basename(seq_fp))[0]
+            write_columnar(seqs.values(), features, expanduser(columnar), genome)
+    finally:
+        # the lazy metadata have been written out
+        close_mmaps()
+
+    return seqs, features
+
+
+def summarize(seqs, out, features=None, stats=None):
     '''Summarize the sequences and their annotations.
 
     Parameters
@@ -262,53 +510,83 @@ def summarize(seqs, out):
     seqs : list of ``Sequence`` objects
     out : file object
         the file object to output to
+    features : dict, optional
+        seq_id as key and ``FeatureStore`` as value. If it is not given,
+        the annotation is taken from the interval metadata of each seq.
+    stats : ``SeqStats``, optional
+        the precomputed stats of the seqs. If it is given with
+        ``features``, the seqs are not read again. They are computed
+        from the packed bases if ``seqs`` is ``PackedSeqs``.
     '''
-    types = ['CDS', 'ncRNA', 'rRNA', 'tRNA',
-             'tandem_repeat', 'terminator', 'CRISPR']
-
-    out.write('#seq_id\tlength\tnuc_freq\t')
-    out.write('\t'.join(types))
-    out.write('\n')
+    if stats is None and isinstance(seqs, PackedSeqs):
+        stats = seqs.stats()
+    summary = SummaryWriter(out, stats)
+    if features is not None and stats is not None:
+        for seq_id in stats.ids:
+            summary.add(seq_id, features[seq_id])
+        return
     for seq in seqs:
-        freq = seq.frequencies(relative=True)
-        items = [seq.metadata['id'], str(len(seq)),
-                 ';'.join(['%s:%.2f' % (k, freq[k]) for k in sorted(freq)])]
-        imd = seq.interval_metadata
-        for t in types:
-            feature = imd.query(metadata={'type': t})
-            items.append(str(len([i for i in feature])))
-        out.write('\t'.join(items))
-        out.write('\n')
-
-
-def create_faa(seqs, out, genetic_code=11):
+        seq_id = seq.metadata['id']
+        if features is None:
+            fs = FeatureStore.from_interval_metadata(seq.interval_metadata)
+        else:
+            fs = features[seq_id]
+        summary.add(seq_id, fs, None if stats is not None and seq_id in stats else seq)
+
+
+def create_faa(seqs, out, genetic_code=11, features=None):
     '''Create protein sequence file.
 
     It creates protein sequences based on the interval features
-    with type of "CDS".
+    with type of "CDS". The codons of all the CDS of a sequence are
+    translated at once through the lookup table of their genetic code,
+    and the proteins are written in large blocks.
 
     Parameters
     ----------
-    seqs : iterable of ``Sequence``
-        The list of DNA/RNA sequences
-    out : file object
-        File object for output
+    seqs : iterable of ``Sequence``, or ``PackedSeqs`` or ``FastaIndex``
+        The list of DNA/RNA sequences. It is a mapping of seq ID to
+        sequence with ``fetch`` method if ``features`` is given.
+    out : str or file object
+        File path or object for output
     genetic_code : int
         The fallback genetic code to use
+    features : dict, optional
+        seq_id as key and ``FeatureStore`` as value. If it is given, only
+        the CDS regions are fetched from ``seqs`` instead of the annotation
+        being taken from the interval metadata of each seq.
     '''
-    for seq in seqs:
-        for cds in seq.interval_metadata.query(metadata={'type': 'CDS'}):
-            fna = DNA.concat([seq[start:end] for start, end in cds.bounds])
-            if cds.metadata.get('strand', '.') == '-':
-                fna = fna.reverse_complement()
-            try:
-                # if translation table is not available in metadata, fallback
-                # to what is specified in the func parameter
-                faa = fna.translate(cds.metadata.get('transl_table', genetic_code))
-                faa.metadata['description'] = cds.metadata.get('product', '')
-                # CDS metadata must have key of 'ID'
-                faa.metadata['id'] = cds.metadata['ID']
-                write(faa, into=out, format='fasta')
-            except NotImplementedError:
+    if isinstance(out, str):
+        with open_output(out) as fh:
+            return create_faa(seqs, fh, genetic_code, features)
+    block = []
+    for seq, fs, positions in _cds_stores(seqs, features):
+        m = len(positions)
+        index, ncodons = _cds_codons(seq, fs, positions)
+        # if translation table is not available in metadata, fallback
+        # to what is specified in the func parameter
+        tables = [int(i) for i in fs.values('transl_table', positions, genetic_code)]
+        uniq = sorted(set(tables))
+        lut = np.vstack([translation_table(i) for i in uniq])
+        table = np.repeat(np.searchsorted(uniq, tables), ncodons)
+        protein = lut[table, index].tobytes().decode('ascii')
+        gene = np.repeat(np.arange(m), ncodons)
+        degenerate = (np.bincount(gene[index == 64], minlength=m) > 0).tolist()
+        ends = np.cumsum(ncodons).tolist()
+        # CDS metadata must have key of 'ID'
+        ids = fs.values('ID', positions)
+        products = fs.values('product', positions, '')
+        for i in range(m):
+            if degenerate[i]:
                 logger.warning('This gene has degenerate nucleotide and will not be translated.')
+                continue
+            if ids[i] is None:
+                raise KeyError('ID')
+            block.append('>%s %s\n' % (ids[i], products[i]) if products[i] else '>%s\n' % ids[i])
+            block.append(protein[ends[i] - int(ncodons[i]):ends[i]])
+            block.append('\n')
+        if len(block) >= 30000:
+            out.write(''.join(block))
+            block = []
+    out.write(''.join(block))
 
@@ -65,10 +65,12 @@ setup(name='micronota',
       install_requires=[
           'click > 6',
           'scikit-bio >= 0.5.0',
+          'scipy',
       ],
       extras_require={'test': ["nose", "pep8", "flake8"],
                       'coverage': ["coverage"],
-                      'doc': ["Sphinx >= 1.5"]},
+                      'doc': ["Sphinx >= 1.5"],
+                      'columnar': ["pyarrow"]},
       entry_points={
           'console_scripts': ['micronota=micronota.cli:cmd'],
       })